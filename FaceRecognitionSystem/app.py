@@ -1,7 +1,7 @@
 import cv2
-import dlib
 import numpy as np
 import os
+import sys
 import pickle
 import base64
 import json
@@ -10,6 +10,14 @@ from flask import Flask, render_template, Response, request, jsonify, redirect,
 from playsound import playsound # For playing alarm sound (ensure it's installed: pip install playsound)
 import logging # Import logging module
 from functools import wraps # For creating a decorator
+from datetime import datetime
+
+# Modules shared with cloud_mall_surveillance_system live in the repository-level common package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.metrics import MetricsRegistry, PROMETHEUS_CONTENT_TYPE
+from common.profiling import SlowFrameTracker, SamplingProfiler
+from common.startup import StartupTasks
+from common.face_quality import QualityGate
 
 # Flask App Initialization
 app = Flask(__name__)
@@ -26,7 +34,9 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 MODELS_DIR = os.path.join(BASE_DIR, "models")
 ENCODINGS_FILE = os.path.join(BASE_DIR, "encodings.pkl")
-TOLERANCE = 0.36
+TOLERANCE = 0.36  # default; calibrate_tolerance.py writes a calibrated one to RECOGNITION_CONFIG_FILE
+IDENTITY_TOLERANCES = {}  # per-person overrides from the same file
+RECOGNITION_CONFIG_FILE = os.path.join(BASE_DIR, "recognition_config.json")
 ALARM_SOUND_FILE = r"C:\Users\hp\.vscode\FinalProjectFolder\police-siren-sound-effect-317645.mp3"
 
 # Global Variables for Face Recognition Models and Data
@@ -41,6 +51,30 @@ alarm_playing = False
 last_alarm_time = 0
 ALARM_COOLDOWN = 5 # seconds before alarm can be triggered again
 
+# Metrics exposed on /metrics in the Prometheus text format
+metrics = MetricsRegistry()
+metric_request_seconds = metrics.histogram(
+    'face_recognition_request_seconds', 'Time spent in each stage of a /process_frame request.', ('stage',)
+)
+metric_faces = metrics.counter('face_recognition_faces_total', 'Faces recognized, by result.', ('result',))
+metric_alarms = metrics.counter('face_recognition_alarms_total', 'Requests that raised the unknown-face alarm.')
+metric_descriptors_saved = metrics.counter(
+    'face_recognition_descriptors_saved_total', 'Descriptor computations skipped by the face quality gate, by reason.', ('reason',)
+)
+
+# Faces too small, blurred or turned to recognize reliably skip the descriptor (see common/face_quality.py)
+quality_gate = QualityGate(
+    min_face_size=int(os.environ.get('FACE_MIN_SIZE', 60)),
+    min_sharpness=float(os.environ.get('FACE_MIN_SHARPNESS', 40)),
+    max_yaw_degrees=float(os.environ.get('FACE_MAX_YAW', 35)),
+    enabled=os.environ.get('FACE_QUALITY_GATE', '1') == '1',
+)
+
+# Opt-in tracing of the slowest /process_frame requests, plus on-demand sampling profiles
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '0') == '1'
+slow_requests = SlowFrameTracker(int(os.environ.get('PROFILING_SLOW_FRAMES', 50)), PROFILING_ENABLED)
+sampling_profiler = SamplingProfiler()
+
 # User Management (Basic for Project - In real app, use a database)
 USERS = {
     "admin": {"password": "admin123", "role": "admin"},
@@ -69,46 +103,79 @@ def login_required(role=None):
     return decorator
 
 # Load Models and Encodings on App Startup
-def load_models_and_encodings():
-    global detector, predictor, face_recognizer, known_face_encodings, known_face_names
+def load_models():
+    """Loads the dlib models and runs one warm-up pass so the first request is not slow."""
+    global detector, predictor, face_recognizer
+    import dlib  # imported here so importing app.py does not require dlib
 
     app.logger.info("Loading dlib models...")
     try:
-        detector = dlib.get_frontal_face_detector()
+        face_detector = dlib.get_frontal_face_detector()
         predictor_path = os.path.join(MODELS_DIR, "shape_predictor_68_face_landmarks.dat")
-        predictor = dlib.shape_predictor(predictor_path)
+        shape_predictor = dlib.shape_predictor(predictor_path)
         face_recognizer_path = os.path.join(MODELS_DIR, "dlib_face_recognition_resnet_model_v1.dat")
-        face_recognizer = dlib.face_recognition_model_v1(face_recognizer_path)
-        app.logger.info("dlib models loaded successfully.")
+        recognizer = dlib.face_recognition_model_v1(face_recognizer_path)
     except Exception as e:
-        app.logger.error(f"Error loading dlib models: {e}")
         app.logger.error(f"Make sure '{MODELS_DIR}' directory exists and contains the .dat files.")
-        exit()
+        raise RuntimeError(f"Error loading dlib models: {e}")
+
+    # Warm-up: one detection and one descriptor on a blank frame
+    blank = np.zeros((480, 640, 3), dtype=np.uint8)
+    face_detector(blank, 0)
+    recognizer.compute_face_descriptor(blank, shape_predictor(blank, dlib.rectangle(0, 0, 150, 150)))
+
+    detector, predictor, face_recognizer = face_detector, shape_predictor, recognizer
+    app.logger.info("dlib models loaded successfully.")
+
+def load_encodings():
+    global known_face_encodings, known_face_names
 
     app.logger.info(f"Loading known face encodings from '{ENCODINGS_FILE}'...")
     try:
         with open(ENCODINGS_FILE, 'rb') as f:
             data = pickle.load(f)
-            known_face_encodings = data["encodings"]
-            known_face_names = data["names"]
-        app.logger.info(f"Loaded {len(known_face_encodings)} known faces for {len(set(known_face_names))} unique individuals.")
-        if not known_face_encodings:
-            app.logger.warning("Warning: No known faces loaded. The system will identify everyone as 'Unknown'.")
     except FileNotFoundError:
-        app.logger.error(f"Error: '{ENCODINGS_FILE}' not found. Please run the model_evaluation script first.")
-        exit()
+        raise RuntimeError(f"'{ENCODINGS_FILE}' not found. Please run enroll_faces.py first.")
+    except Exception as e:
+        raise RuntimeError(f"Error loading encodings from '{ENCODINGS_FILE}': {e}")
+    known_face_encodings = data["encodings"]
+    known_face_names = data["names"]
+    app.logger.info(f"Loaded {len(known_face_encodings)} known faces for {len(set(known_face_names))} unique individuals.")
+    if not known_face_encodings:
+        app.logger.warning("Warning: No known faces loaded. The system will identify everyone as 'Unknown'.")
+
+def load_recognition_config():
+    """Applies the tolerances written by calibrate_tolerance.py, if it has been run."""
+    global TOLERANCE, IDENTITY_TOLERANCES
+    if not os.path.exists(RECOGNITION_CONFIG_FILE):
+        app.logger.info(f"No '{RECOGNITION_CONFIG_FILE}'; using the default tolerance {TOLERANCE}.")
+        return
+    try:
+        with open(RECOGNITION_CONFIG_FILE, 'r') as f:
+            config = json.load(f)
+        TOLERANCE = float(config.get('tolerance', TOLERANCE))
+        IDENTITY_TOLERANCES = {name: float(value) for name, value in config.get('identity_tolerances', {}).items()}
+        app.logger.info(f"Loaded calibrated tolerance {TOLERANCE} ({len(IDENTITY_TOLERANCES)} per-identity overrides).")
     except Exception as e:
-        app.logger.error(f"Error loading encodings from '{ENCODINGS_FILE}': {e}")
-        exit()
+        app.logger.error(f"Error loading '{RECOGNITION_CONFIG_FILE}', using the default tolerance {TOLERANCE}: {e}")
+
+load_recognition_config()
 
-with app.app_context():
-    load_models_and_encodings()
+# Models and encodings load in the background so the server starts immediately;
+# /health/ready reports when recognition is available
+startup = StartupTasks()
+startup.add('models', load_models)
+startup.add('encodings', load_encodings)
 
 # Helper Function for Face Recognition
-def recognize_face(rgb_image):
+def recognize_face(rgb_image, trace=None):
     global alarm_playing, last_alarm_time
 
+    detect_start = time.perf_counter()
     faces_in_frame = detector(rgb_image, 0)
+    if trace is not None:
+        trace.span('detect', time.perf_counter() - detect_start)
+    landmarks_time = quality_time = descriptor_time = match_time = 0.0
 
     results = []
     unknown_face_detected_in_this_frame = False
@@ -116,9 +183,30 @@ def recognize_face(rgb_image):
     if not faces_in_frame:
         return [], False
 
+    gray_image = cv2.cvtColor(rgb_image, cv2.COLOR_RGB2GRAY) if quality_gate.enabled else None
     for face_rect in faces_in_frame:
-        shape = predictor(rgb_image, face_rect)
+        x1, y1, x2, y2 = face_rect.left(), face_rect.top(), face_rect.right(), face_rect.bottom()
+        stage_start = time.perf_counter()
+        skip_reason, _ = quality_gate.check_box(gray_image, face_rect)
+        landmarks_start = time.perf_counter()
+        quality_time += landmarks_start - stage_start
+        if skip_reason is None:
+            shape = predictor(rgb_image, face_rect)
+            landmarks_end = time.perf_counter()
+            landmarks_time += landmarks_end - landmarks_start
+            skip_reason, _ = quality_gate.check_pose(shape)
+            quality_time += time.perf_counter() - landmarks_end
+
+        if skip_reason:
+            # Not an alarm: the face is retried on later frames once it is recognizable
+            metric_descriptors_saved.labels(skip_reason).inc()
+            results.append({"name": "Unverified", "box": [x1, y1, x2, y2], "distance": None, "quality": skip_reason})
+            continue
+
+        descriptor_start = time.perf_counter()
         face_encoding = np.array(face_recognizer.compute_face_descriptor(rgb_image, shape))
+        descriptor_end = time.perf_counter()
+        descriptor_time += descriptor_end - descriptor_start
 
         name = "Unknown"
         
@@ -127,21 +215,27 @@ def recognize_face(rgb_image):
             min_distance_idx = np.argmin(distances)
             min_distance = distances[min_distance_idx]
 
-            if min_distance < TOLERANCE:
-                name = known_face_names[min_distance_idx]
+            candidate = known_face_names[min_distance_idx]
+            if min_distance < IDENTITY_TOLERANCES.get(candidate, TOLERANCE):
+                name = candidate
             else:
                 unknown_face_detected_in_this_frame = True
         else:
             unknown_face_detected_in_this_frame = True
+        match_time += time.perf_counter() - descriptor_end
 
-        x1, y1, x2, y2 = face_rect.left(), face_rect.top(), face_rect.right(), face_rect.bottom()
-        
         results.append({
             "name": name,
             "box": [x1, y1, x2, y2],
             "distance": float(min_distance) if known_face_encodings else None
         })
 
+    if trace is not None:
+        trace.span('quality', quality_time)
+        trace.span('landmarks', landmarks_time)
+        trace.span('descriptor', descriptor_time)
+        trace.span('match', match_time)
+
     if unknown_face_detected_in_this_frame:
         current_time = time.time()
         if not alarm_playing and (current_time - last_alarm_time) > ALARM_COOLDOWN:
@@ -262,6 +356,10 @@ def process_frame():
     Receives a base64 encoded image frame, processes it for face recognition,
     and returns recognition results and alarm status.
     """
+    if not startup.ready():
+        return jsonify({"error": "Face recognition is still starting up", "startup": startup.status()}), 503
+
+    request_start = time.perf_counter()
     data = request.json
     if 'image' not in data:
         app.logger.error("No image data provided in process_frame request.")
@@ -276,17 +374,102 @@ def process_frame():
         return jsonify({"error": "Could not decode image"}), 400
 
     rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    recognize_start = time.perf_counter()
+    metric_request_seconds.labels('decode').observe(recognize_start - request_start)
+    trace = slow_requests.begin(session.get('username'))
+    if trace is not None:
+        trace.span('decode', recognize_start - request_start)
 
     try:
-        recognition_results, trigger_alarm = recognize_face(rgb_frame)
+        recognition_results, trigger_alarm = recognize_face(rgb_frame, trace)
     except Exception as e:
         app.logger.error(f"Error during face recognition in process_frame: {e}")
         return jsonify({"error": "Error during face recognition"}), 500
 
+    request_end = time.perf_counter()
+    metric_request_seconds.labels('recognize').observe(request_end - recognize_start)
+    metric_request_seconds.labels('total').observe(request_end - request_start)
+    slow_requests.finish(trace, request_end - request_start)
+    for result in recognition_results:
+        metric_faces.labels('unverified' if 'quality' in result else 'unknown' if result['name'] == "Unknown" else 'known').inc()
+    if trigger_alarm:
+        metric_alarms.inc()
+
     return jsonify({
         "results": recognition_results,
         "alarm": trigger_alarm
     })
 
+@app.route('/admin/profiling', methods=['GET', 'POST'])
+@login_required(role='admin')
+def handle_profiling():
+    """Slow-request tracing: GET returns the slowest traced requests, POST toggles/resizes/clears tracing."""
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        try:
+            capacity = int(data['capacity']) if 'capacity' in data else None
+        except (TypeError, ValueError):
+            return jsonify({"error": "capacity must be an integer"}), 400
+        if capacity is not None and capacity < 1:
+            return jsonify({"error": "capacity must be at least 1"}), 400
+        slow_requests.configure(bool(data['enabled']) if 'enabled' in data else None, capacity)
+        if data.get('clear'):
+            slow_requests.clear()
+        app.logger.info(f"Request tracing {'enabled' if slow_requests.enabled else 'disabled'} by {session['username']}")
+
+    return jsonify({
+        **slow_requests.stats(),
+        'profile_running': sampling_profiler.busy(),
+        'slowest_requests': slow_requests.slowest()
+    })
+
+@app.route('/admin/profile')
+@login_required(role='admin')
+def download_profile():
+    """Samples the running process for ?seconds= (default 10) and downloads collapsed stacks for flamegraph tools."""
+    try:
+        seconds = float(request.args.get('seconds', 10))
+        interval = float(request.args.get('interval_ms', 5)) / 1000
+    except ValueError:
+        return jsonify({"error": "seconds and interval_ms must be numbers"}), 400
+
+    result = sampling_profiler.profile(seconds, max(interval, 0.001))
+    if result is None:
+        return jsonify({"error": "A profile is already running"}), 409
+    collapsed, samples = result
+    filename = f"profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}.folded"
+    return Response(collapsed, mimetype='text/plain', headers={
+        'Content-Disposition': f'attachment; filename={filename}',
+        'X-Profile-Samples': str(samples)
+    })
+
+@app.route('/health/live')
+def liveness_check():
+    """Liveness probe: the server is up, even while models are still loading."""
+    return jsonify({"live": True})
+
+@app.route('/health/ready')
+def readiness_check():
+    """Readiness probe: 200 once the dlib models and known encodings are loaded, 503 until then."""
+    status = startup.status()
+    return jsonify(status), 200 if status['ready'] else 503
+
+@app.route('/health')
+def health_check():
+    """Liveness and readiness together with what is loaded."""
+    return jsonify({
+        "live": True,
+        "ready": startup.ready(),
+        "known_faces": len(known_face_encodings),
+        "known_identities": len(set(known_face_names)),
+        "quality_gate": quality_gate.stats(),
+        "startup": startup.status()
+    })
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus scrape endpoint."""
+    return Response(metrics.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True, threaded=True)
\ No newline at end of file
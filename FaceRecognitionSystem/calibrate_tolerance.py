@@ -0,0 +1,184 @@
+import os
+import sys
+import json
+import time
+import pickle
+import argparse
+import numpy as np
+from datetime import datetime
+
+from enroll_faces import BASE_DIR, ENCODINGS_FILE, list_photos, encode_photos
+
+# Picks the match tolerance app.py uses from labelled test photos instead of by hand.
+#
+# test_dataset/ has one folder per enrolled person plus Unknown_people. Each test photo's
+# descriptor is computed once and cached by content hash (as in enroll_faces.py). The distance
+# from every test face to every gallery face is one matrix product. Thresholds are then swept
+# with sorted distances and searchsorted, so thousands of them take milliseconds. A threshold
+# is chosen globally and for each identity, and the result goes to recognition_config.json,
+# which app.py loads at startup.
+#
+#   python calibrate_tolerance.py
+#   python calibrate_tolerance.py --max-false-accept-rate 0.01
+
+TEST_DATASET_DIR = os.path.join(BASE_DIR, "test_dataset")
+CONFIG_FILE = os.path.join(BASE_DIR, "recognition_config.json")
+CACHE_FILE = os.path.join(BASE_DIR, ".calibration_cache.pkl")
+UNKNOWN_FOLDER = "unknown_people"
+
+THRESHOLDS = np.linspace(0.2, 0.8, 6001)
+MIN_IDENTITY_SAMPLES = 5  # below this many test faces an identity keeps the global tolerance
+
+
+def distance_matrix(test_encodings, gallery_encodings):
+    """Euclidean distances, shape (tests, gallery), from one matrix product."""
+    test_sq = np.einsum('ij,ij->i', test_encodings, test_encodings)[:, None]
+    gallery_sq = np.einsum('ij,ij->i', gallery_encodings, gallery_encodings)[None, :]
+    squared = test_sq + gallery_sq - 2.0 * test_encodings @ gallery_encodings.T
+    return np.sqrt(np.clip(squared, 0, None))
+
+
+def count_below(sorted_distances, thresholds):
+    """How many distances fall below each threshold (a match needs distance < tolerance)."""
+    return np.searchsorted(sorted_distances, thresholds, side='left')
+
+
+def sweep(nearest_distance, correct, known, thresholds=THRESHOLDS):
+    """Outcome counts at every threshold for faces whose nearest gallery match is at nearest_distance.
+
+    correct: the nearest gallery face has the true identity. known: the person is enrolled.
+    """
+    genuine = np.sort(nearest_distance[correct])
+    wrong = np.sort(nearest_distance[~correct])  # impostors, and enrolled people matched to someone else
+    accepted_genuine = count_below(genuine, thresholds)
+    accepted_wrong = count_below(wrong, thresholds)
+    unknown = np.sort(nearest_distance[~known])
+    rejected_unknown = len(unknown) - count_below(unknown, thresholds)
+    total = len(nearest_distance)
+    return {
+        'accuracy': (accepted_genuine + rejected_unknown) / max(total, 1),
+        'false_accept_rate': accepted_wrong / max(len(wrong), 1),
+        'false_reject_rate': (len(genuine) - accepted_genuine) / max(len(genuine), 1),
+        'samples': total,
+    }
+
+
+def pick_threshold(curves, max_false_accept_rate=None, thresholds=THRESHOLDS):
+    """The threshold with the best accuracy (within the false-accept limit, if given).
+
+    Accuracy is flat between observed distances; the middle of the best plateau is taken so the
+    tolerance sits as far as possible from the faces on either side of it.
+    """
+    score = curves['accuracy'].copy()
+    if max_false_accept_rate is not None:
+        score[curves['false_accept_rate'] > max_false_accept_rate] = -1
+    best = np.flatnonzero(score == score.max())
+    # Middle of the first contiguous run of best thresholds
+    run_end = np.flatnonzero(np.diff(best) > 1)
+    run = best[:run_end[0] + 1] if len(run_end) else best
+    i = run[len(run) // 2]
+    return float(round(thresholds[i], 4)), {
+        'accuracy': round(float(curves['accuracy'][i]), 4),
+        'false_accept_rate': round(float(curves['false_accept_rate'][i]), 4),
+        'false_reject_rate': round(float(curves['false_reject_rate'][i]), 4),
+        'samples': int(curves['samples']),
+    }
+
+
+def load_test_encodings(test_dir, cache_path, workers, preprocess, upsample, use_cache):
+    photos = list_photos(test_dir)
+    results, _ = encode_photos([path for _, path in photos], cache_path, workers, preprocess, upsample, use_cache)
+    encodings, labels = [], []
+    for (person_name, _), (encoding, _) in zip(photos, results):
+        if encoding is not None:
+            encodings.append(encoding)
+            labels.append("Unknown" if person_name.lower() == UNKNOWN_FOLDER else person_name)
+    print(f"{len(encodings)} test faces from {len(photos)} photos.")
+    return np.array(encodings, dtype=np.float64).reshape(-1, 128), np.array(labels)
+
+
+def calibrate(gallery_path=ENCODINGS_FILE, test_dir=TEST_DATASET_DIR, config_path=CONFIG_FILE,
+              cache_path=CACHE_FILE, workers=None, preprocess=False, upsample=1, use_cache=True,
+              max_false_accept_rate=None, min_identity_samples=MIN_IDENTITY_SAMPLES):
+    with open(gallery_path, 'rb') as f:
+        gallery = pickle.load(f)
+    gallery_encodings = np.array(gallery["encodings"], dtype=np.float64).reshape(-1, 128)
+    gallery_names = np.array(gallery["names"])
+    if not len(gallery_encodings):
+        print(f"No encodings in '{gallery_path}'. Run enroll_faces.py first.")
+        return None
+
+    test_encodings, labels = load_test_encodings(test_dir, cache_path, workers, preprocess, upsample, use_cache)
+    if not len(test_encodings):
+        print(f"No usable test faces under '{test_dir}'.")
+        return None
+
+    start = time.perf_counter()
+    distances = distance_matrix(test_encodings, gallery_encodings)
+    nearest = distances.argmin(axis=1)
+    nearest_distance = distances[np.arange(len(nearest)), nearest]
+    nearest_name = gallery_names[nearest]
+    known = np.isin(labels, gallery_names)
+    correct = nearest_name == labels
+
+    tolerance, global_metrics = pick_threshold(sweep(nearest_distance, correct, known), max_false_accept_rate)
+
+    # app.py accepts a face when its distance is below the tolerance of its nearest identity, so
+    # each identity's threshold only affects the test faces that land nearest to it
+    identity_tolerances, identity_metrics = {}, {}
+    for name in np.unique(gallery_names).tolist():
+        mask = nearest_name == name
+        if mask.sum() < min_identity_samples or not (correct & mask).any():
+            continue
+        identity_tolerances[name], identity_metrics[name] = pick_threshold(
+            sweep(nearest_distance[mask], correct[mask], known[mask]), max_false_accept_rate
+        )
+    sweep_ms = (time.perf_counter() - start) * 1000
+
+    config = {
+        'tolerance': tolerance,
+        'identity_tolerances': identity_tolerances,
+        'calibration': {
+            'calibrated_at': datetime.now().isoformat(timespec='seconds'),
+            'gallery_faces': int(len(gallery_encodings)),
+            'test_faces': int(len(test_encodings)),
+            'thresholds_swept': int(len(THRESHOLDS)),
+            'max_false_accept_rate': max_false_accept_rate,
+            'metrics': global_metrics,
+            'identity_metrics': identity_metrics,
+        },
+    }
+    tmp_path = config_path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(config, f, indent=2)
+    os.replace(tmp_path, config_path)
+
+    print(f"Distance matrix {distances.shape[0]}x{distances.shape[1]} and {len(THRESHOLDS)}-threshold sweeps in {sweep_ms:.1f} ms.")
+    print(f"Global tolerance: {tolerance} (accuracy {global_metrics['accuracy']:.1%}, "
+          f"false accepts {global_metrics['false_accept_rate']:.1%}, false rejects {global_metrics['false_reject_rate']:.1%})")
+    for name, value in identity_tolerances.items():
+        metrics = identity_metrics[name]
+        print(f"  {name:<16} {value}  (accuracy {metrics['accuracy']:.1%} over {metrics['samples']} faces)")
+    print(f"Saved to '{config_path}'. Restart the recognition server to apply it.")
+    return config
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calibrate the face match tolerance on test_dataset/.")
+    parser.add_argument('--gallery', default=ENCODINGS_FILE)
+    parser.add_argument('--test-dataset', default=TEST_DATASET_DIR)
+    parser.add_argument('--output', default=CONFIG_FILE)
+    parser.add_argument('--cache', default=CACHE_FILE, help="Per-photo encoding cache for the test set")
+    parser.add_argument('--rebuild', action='store_true', help="Encode every test photo again, ignoring the cache")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--preprocess', action='store_true',
+                        help="Apply CLAHE to test photos (app.py does not, so off by default)")
+    parser.add_argument('--upsample', type=int, default=1)
+    parser.add_argument('--max-false-accept-rate', type=float, default=None,
+                        help="Only consider tolerances that accept at most this fraction of wrong faces")
+    parser.add_argument('--min-identity-samples', type=int, default=MIN_IDENTITY_SAMPLES)
+    args = parser.parse_args()
+
+    config = calibrate(args.gallery, args.test_dataset, args.output, args.cache, args.workers, args.preprocess,
+                       args.upsample, not args.rebuild, args.max_false_accept_rate, args.min_identity_samples)
+    sys.exit(0 if config else 1)
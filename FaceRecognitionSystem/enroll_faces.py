@@ -0,0 +1,207 @@
+import os
+import sys
+import time
+import pickle
+import hashlib
+import argparse
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+# Builds the known-face gallery (encodings.pkl) that app.py loads, from one folder of photos per
+# person. This is the enrollment pipeline from training_and_enrollment.ipynb (CLAHE preprocessing,
+# then detection with one upsample, landmarks and a 128D descriptor for the largest face) spread
+# over a process pool. Every photo's encoding is cached by content hash, so a re-run only
+# processes photos that were added or changed.
+#
+#   python enroll_faces.py
+#   python enroll_faces.py --dataset dataset --output encodings.pkl --workers 4
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODELS_DIR = os.path.join(BASE_DIR, "models")
+DATASET_DIR = os.path.join(BASE_DIR, "dataset")
+ENCODINGS_FILE = os.path.join(BASE_DIR, "encodings.pkl")
+CACHE_FILE = os.path.join(BASE_DIR, ".enrollment_cache.pkl")
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+# Part of every cache key: change it whenever the pipeline below changes what an encoding means
+PIPELINE_VERSION = "clahe-2.0-8x8/largest-face/resnet-v1"
+
+# Skip reasons that follow from the photo's content alone; other failures ("error: ...") may be
+# transient (a missing model file, MemoryError) and are retried on the next run
+CACHEABLE_SKIPS = ("unreadable image", "no face found")
+
+# dlib models, loaded once per worker process
+_models = None
+
+
+def load_models(models_dir=MODELS_DIR):
+    global _models
+    import dlib  # imported here so the parent process and spawned workers import it only when needed
+
+    _models = (
+        dlib.get_frontal_face_detector(),
+        dlib.shape_predictor(os.path.join(models_dir, "shape_predictor_68_face_landmarks.dat")),
+        dlib.face_recognition_model_v1(os.path.join(models_dir, "dlib_face_recognition_resnet_model_v1.dat")),
+    )
+
+
+def preprocess_image(img):
+    """CLAHE contrast enhancement on the grayscale image, returned as 3-channel BGR (as in the notebook)."""
+    import cv2
+    gray_img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+    return cv2.cvtColor(clahe.apply(gray_img), cv2.COLOR_GRAY2BGR)
+
+
+def encode_image(image_path, preprocess=True, upsample=1):
+    """Returns (128D encoding of the largest face or None, reason it was skipped or None)."""
+    import cv2
+    if _models is None:
+        load_models()
+    detector, predictor, face_recognizer = _models
+
+    img = cv2.imread(image_path)
+    if img is None:
+        return None, "unreadable image"
+    if preprocess:
+        img = preprocess_image(img)
+    rgb_image = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+    detected_faces = detector(rgb_image, upsample)
+    if len(detected_faces) == 0:
+        return None, "no face found"
+    face_rect = max(detected_faces, key=lambda face: face.area())
+    shape = predictor(rgb_image, face_rect)
+    return np.array(face_recognizer.compute_face_descriptor(rgb_image, shape)), None
+
+
+def _encode_job(job):
+    image_path, preprocess, upsample = job
+    try:
+        return encode_image(image_path, preprocess, upsample)
+    except Exception as e:
+        return None, f"error: {e}"
+
+
+def list_photos(dataset_dir):
+    """Returns [(person name, image path)] for every photo, sorted by person and file name."""
+    photos = []
+    for person_name in sorted(os.listdir(dataset_dir)):
+        person_dir = os.path.join(dataset_dir, person_name)
+        if not os.path.isdir(person_dir):
+            continue
+        for filename in sorted(os.listdir(person_dir)):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                photos.append((person_name, os.path.join(person_dir, filename)))
+    return photos
+
+
+def file_sha256(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def load_cache(cache_path):
+    try:
+        with open(cache_path, 'rb') as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        print(f"Warning: Ignoring unreadable enrollment cache '{cache_path}': {e}")
+        return {}
+
+
+def write_pickle(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def encode_photos(paths, cache_path=CACHE_FILE, workers=None, preprocess=True, upsample=1, use_cache=True):
+    """Returns ([(encoding or None, skip reason)] for each path, number of photos actually encoded).
+
+    Photos whose content hash is in the cache are not decoded again; photos without a usable face
+    (CACHEABLE_SKIPS) are cached too, so they are not retried on every run, but failed encodings are
+    not. The cache is rewritten with just these photos' entries so it does not grow forever.
+    """
+    cache = load_cache(cache_path) if cache_path and use_cache else {}
+    settings = f"{PIPELINE_VERSION}/preprocess={int(preprocess)}/upsample={upsample}"
+    keys = [f"{file_sha256(path)}/{settings}" for path in paths]
+    # Identical photos stored under several names are encoded once
+    missing = {key: path for key, path in zip(keys, paths) if key not in cache}
+    fresh = {}
+
+    if missing:
+        print(f"Encoding {len(missing)} new or changed photos...")
+        jobs = [(path, preprocess, upsample) for path in missing.values()]
+        if workers == 1:
+            results = list(map(_encode_job, jobs))
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=load_models) as pool:
+                results = list(pool.map(_encode_job, jobs, chunksize=4))
+        fresh = dict(zip(missing, results))
+        cache.update((key, (encoding, reason)) for key, (encoding, reason) in fresh.items()
+                     if encoding is not None or reason in CACHEABLE_SKIPS)
+    else:
+        print(f"All {len(paths)} photos are cached.")
+
+    if cache_path:
+        wanted = set(keys)
+        write_pickle(cache_path, {key: value for key, value in cache.items() if key in wanted})
+    return [fresh[key] if key in fresh else cache[key] for key in keys], len(missing)
+
+
+def enroll(dataset_dir=DATASET_DIR, output_path=ENCODINGS_FILE, cache_path=CACHE_FILE, workers=None,
+           preprocess=True, upsample=1, use_cache=True):
+    """Encodes every photo under dataset_dir/<person>/ and writes the gallery to output_path."""
+    start = time.perf_counter()
+    photos = list_photos(dataset_dir)
+    if not photos:
+        print(f"No photos found under '{dataset_dir}'. Expected one folder per person.")
+        return None
+
+    results, encoded = encode_photos([path for _, path in photos], cache_path, workers, preprocess, upsample, use_cache)
+    known_face_encodings, known_face_names, skipped = [], [], []
+    for (person_name, path), (encoding, reason) in zip(photos, results):
+        if encoding is not None:
+            known_face_encodings.append(encoding)
+            known_face_names.append(person_name)
+        else:
+            skipped.append((path, reason))
+
+    # Same format the notebook saved and load_encodings() in app.py reads
+    write_pickle(output_path, {"encodings": known_face_encodings, "names": known_face_names})
+
+    for path, reason in skipped:
+        print(f"    Skipping {os.path.relpath(path, dataset_dir)}: {reason}")
+    summary = {
+        'photos': len(photos),
+        'encoded': encoded,
+        'cached': len(photos) - encoded,
+        'enrolled': len(known_face_encodings),
+        'people': len(set(known_face_names)),
+        'skipped': len(skipped),
+        'seconds': round(time.perf_counter() - start, 2),
+    }
+    print(f"Enrolled {summary['enrolled']} faces for {summary['people']} people into '{output_path}' "
+          f"in {summary['seconds']}s ({summary['encoded']} encoded, {summary['cached']} cached, {summary['skipped']} skipped).")
+    print("Restart the recognition server to load the new gallery.")
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Enroll known faces into the recognition gallery.")
+    parser.add_argument('--dataset', default=DATASET_DIR, help="Folder with one sub-folder of photos per person")
+    parser.add_argument('--output', default=ENCODINGS_FILE, help="Gallery file loaded by app.py")
+    parser.add_argument('--cache', default=CACHE_FILE, help="Per-photo encoding cache")
+    parser.add_argument('--rebuild', action='store_true', help="Encode every photo again, ignoring the cache")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: one per CPU)")
+    parser.add_argument('--no-preprocess', action='store_true', help="Skip CLAHE preprocessing")
+    parser.add_argument('--upsample', type=int, default=1, help="Detector upsampling passes")
+    args = parser.parse_args()
+
+    summary = enroll(args.dataset, args.output, args.cache, args.workers,
+                     preprocess=not args.no_preprocess, upsample=args.upsample, use_cache=not args.rebuild)
+    sys.exit(0 if summary and summary['enrolled'] else 1)
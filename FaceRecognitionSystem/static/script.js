@@ -178,7 +178,7 @@ document.addEventListener("DOMContentLoaded", () => {
             // Create bounding box element
             const bboxDiv = document.createElement('div');
             bboxDiv.classList.add('bounding-box');
-            bboxDiv.classList.add(name === 'Unknown' ? 'unknown' : 'known');
+            bboxDiv.classList.add(face.quality ? 'unverified' : (name === 'Unknown' ? 'unknown' : 'known'));
             // Position bounding box relative to the video/canvas
             bboxDiv.style.left = `${(x1 / video.videoWidth) * 100}%`;
             bboxDiv.style.top = `${(y1 / video.videoHeight) * 100}%`;
@@ -187,7 +187,7 @@ document.addEventListener("DOMContentLoaded", () => {
 
             // Add text (name and distance)
             const textSpan = document.createElement('span');
-            textSpan.textContent = `${name} ${distance}`;
+            textSpan.textContent = face.quality ? `${name} (${face.quality})` : `${name} ${distance}`;
             bboxDiv.appendChild(textSpan);
 
             detectionOverlay.appendChild(bboxDiv);
@@ -0,0 +1,166 @@
+import time
+import threading
+from collections import OrderedDict
+
+
+# --- Temporal Alert Debouncing ---
+class Incident:
+    """One continuous sighting of a class (or of one tracked object) on a camera, from confirmation until it leaves view."""
+    def __init__(self, camera_id, class_name, started_at, track_id=None):
+        self.camera_id = camera_id
+        self.class_name = class_name
+        self.track_id = track_id  # set when incidents follow tracked objects rather than whole classes
+        self.started_at = started_at
+        self.last_seen = started_at
+        self.ended_at = None
+        self.frame_hits = 0
+        self.max_confidence = 0.0
+        self.alert_id = None  # Firestore alert document backing this incident
+        self.identities = set()  # names matched on this incident's faces, when face identification is on
+
+    @property
+    def duration(self):
+        return (self.ended_at or self.last_seen) - self.started_at
+
+    @property
+    def key(self):
+        """Identifies the incident's subject, e.g. for cooldowns: (camera_id, class_name, track_id)."""
+        return (self.camera_id, self.class_name, self.track_id)
+
+
+class _ClassWindow:
+    __slots__ = ('history', 'incident')
+
+    def __init__(self):
+        self.history = 0  # bit i set = class seen i frames ago
+        self.incident = None
+
+
+class AlertDebouncer:
+    """Confirms a class only once it is seen in K of the last N frames, and tracks incident start/end.
+
+    An incident ends once the class has been absent for N consecutive frames, so a detection that
+    flickers for a frame or two does not split one incident into several.
+
+    The subjects fed to update() are class names, or (class name, track ID) pairs when the
+    detections are tracked; then each tracked object gets its own incident, so one person lingering
+    stays one incident while several people passing by are several.
+    """
+    def __init__(self, confirm_frames=3, window_frames=5, min_confidence=0.0):
+        if not 0 < confirm_frames <= window_frames:
+            raise ValueError("confirm_frames must be between 1 and window_frames")
+        self.confirm_frames = confirm_frames
+        self.window_frames = window_frames
+        self.min_confidence = min_confidence
+        self._window_mask = (1 << window_frames) - 1
+        self._windows = {}  # (camera_id, subject) -> _ClassWindow
+        self._lock = threading.Lock()
+
+    def update(self, camera_id, class_confidences, now=None):
+        """Feeds one frame's best confidence per subject. Returns (started, ongoing, ended) incident lists."""
+        now = time.time() if now is None else now
+        seen = {subject for subject, confidence in class_confidences.items() if confidence >= self.min_confidence}
+        started, ongoing, ended = [], [], []
+
+        with self._lock:
+            for subject in seen:
+                self._windows.setdefault((camera_id, subject), _ClassWindow())
+
+            for key in [key for key in self._windows if key[0] == camera_id]:
+                window = self._windows[key]
+                subject = key[1]
+                hit = subject in seen
+                window.history = ((window.history << 1) | hit) & self._window_mask
+                hits = bin(window.history).count('1')
+                incident = window.incident
+
+                if incident is None:
+                    if hits >= self.confirm_frames:
+                        class_name, track_id = subject if isinstance(subject, tuple) else (subject, None)
+                        incident = window.incident = Incident(camera_id, class_name, now, track_id)
+                        incident.frame_hits = hits - 1  # count the frames that confirmed it
+                        started.append(incident)
+                    elif hits == 0:
+                        del self._windows[key]
+                        continue
+                elif hits == 0:
+                    incident.ended_at = now
+                    ended.append(incident)
+                    del self._windows[key]
+                    continue
+                else:
+                    ongoing.append(incident)
+
+                if hit and incident is not None:
+                    incident.last_seen = now
+                    incident.frame_hits += 1
+                    incident.max_confidence = max(incident.max_confidence, float(class_confidences[subject]))
+
+        return started, ongoing, ended
+
+    def close_camera(self, camera_id, now=None):
+        """Ends every open incident on a camera, e.g. when the stream switches away from it."""
+        now = time.time() if now is None else now
+        ended = []
+        with self._lock:
+            for key in [key for key in self._windows if key[0] == camera_id]:
+                incident = self._windows.pop(key).incident
+                if incident is not None:
+                    incident.ended_at = now
+                    ended.append(incident)
+        return ended
+
+
+# --- Shared Alert Cooldowns ---
+class CooldownStore:
+    """Thread-safe cooldown map shared by every stream, with TTL eviction and a size cap.
+
+    Keys are incident keys (see Incident.key). Entries are kept in last-triggered order, so expired
+    entries are always at the front and the least recently triggered key is evicted first when full.
+    """
+    def __init__(self, ttl_seconds=5.0, max_entries=1024):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> time the cooldown started
+        self._lock = threading.Lock()
+        self.hits = 0       # attempts suppressed because the key was still cooling down
+        self.misses = 0     # attempts allowed through
+        self.evictions = 0  # entries dropped by the size cap before their TTL ran out
+
+    def _expire(self, now):
+        while self._entries:
+            key, started = next(iter(self._entries.items()))
+            if now - started <= self.ttl_seconds:
+                break
+            del self._entries[key]
+
+    def try_acquire(self, key, now=None):
+        """Returns True and starts a new cooldown if the key is not cooling down, else False."""
+        now = time.time() if now is None else now
+        with self._lock:
+            self._expire(now)
+            if key in self._entries:
+                self.hits += 1
+                return False
+            self.misses += 1
+            self._entries[key] = now
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            return True
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            self._expire(time.time())
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
@@ -0,0 +1,249 @@
+import os
+import json
+import time
+import threading
+import numpy as np
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+
+class CameraAggregates:
+    """Rolling hourly class counts and daily occupancy grids for one camera.
+
+    Both are ring buffers indexed by absolute hour/day modulo their length; each ring row remembers
+    which hour/day it holds so a stale row is cleared when the ring wraps around onto it.
+    """
+    def __init__(self, num_classes, retention_hours, retention_days, grid_shape):
+        self.hourly_counts = np.zeros((retention_hours, num_classes), dtype=np.int64)
+        self.hour_ids = np.full(retention_hours, -1, dtype=np.int64)
+        self.daily_grids = np.zeros((retention_days, num_classes) + tuple(grid_shape), dtype=np.float32)
+        self.day_ids = np.full(retention_days, -1, dtype=np.int64)
+        # Not persisted: what the current hour/second has already counted
+        self.counted_hour = -1
+        self.counted_tracks = set()    # (track ID, class ID) counted in counted_hour
+        self.peak_second = -1
+        self.peak_counts = np.zeros(num_classes, dtype=np.int64)  # most boxes per class in one frame of peak_second
+
+    def _hour_row(self, hour_id):
+        row = hour_id % len(self.hour_ids)
+        if self.hour_ids[row] != hour_id:
+            self.hourly_counts[row] = 0
+            self.hour_ids[row] = hour_id
+        return row
+
+    def _day_row(self, day_id):
+        row = day_id % len(self.day_ids)
+        if self.day_ids[row] != day_id:
+            self.daily_grids[row] = 0
+            self.day_ids[row] = day_id
+        return row
+
+
+class DetectionAnalytics:
+    """Incremental per-camera, per-class hourly counts and spatial heatmaps fed by the detection loop.
+
+    Each frame costs a couple of np.add.at calls; queries read the aggregates directly, so no raw
+    history is rescanned. Aggregates are saved to an .npz file periodically and reloaded on start.
+    With autosave off (a web process reading another process's aggregates), refresh() reloads
+    the file whenever it has been rewritten.
+    """
+    def __init__(self, class_names, persist_path=None, retention_hours=7 * 24, retention_days=7,
+                 grid_shape=(48, 64), persist_interval=300, autosave=True):
+        self.class_names = dict(class_names)
+        self.num_classes = max(self.class_names) + 1 if self.class_names else 0
+        self.retention_hours = retention_hours
+        self.retention_days = retention_days
+        self.grid_shape = tuple(grid_shape)
+        self.persist_path = persist_path
+        self.persist_interval = persist_interval
+        self.autosave = autosave
+        self._cameras = {}
+        self._loaded_mtime = None
+        self._lock = threading.Lock()
+        if persist_path and os.path.exists(persist_path):
+            self._load()
+        if persist_path and autosave:
+            threading.Thread(target=self._persist_loop, name='analytics-persist', daemon=True).start()
+
+    def set_class_names(self, class_names):
+        """Sets the model's classes when they were not known at construction (model loaded later)."""
+        with self._lock:
+            if self.class_names:
+                return
+            self.class_names = dict(class_names)
+            self.num_classes = max(self.class_names) + 1 if self.class_names else 0
+            self._cameras = {}
+
+    def _camera(self, camera_id):
+        camera = self._cameras.get(camera_id)
+        if camera is None:
+            camera = self._cameras[camera_id] = CameraAggregates(
+                self.num_classes, self.retention_hours, self.retention_days, self.grid_shape
+            )
+        return camera
+
+    def class_id(self, class_name):
+        for class_id, name in self.class_names.items():
+            if name == class_name:
+                return class_id
+        return None
+
+    # --- Updates ---
+    def update(self, camera_id, cls, xyxy, frame_shape, track_ids=None, now=None):
+        """Adds one frame's detections (class IDs and xyxy boxes in pixels of a frame_shape frame).
+
+        Hourly counts do not depend on the frame rate or on how long objects stay in view. With
+        track_ids (tracking on), each tracked object counts once per hour and untracked boxes not at
+        all; without, each class counts its most boxes in any one frame of every second.
+        """
+        if not len(cls) or not self.num_classes:
+            return
+        now = time.time() if now is None else now
+        cls = np.asarray(cls, dtype=np.int64)
+        xyxy = np.asarray(xyxy, dtype=np.float32)
+        height, width = frame_shape[:2]
+        grid_h, grid_w = self.grid_shape
+
+        # Box centres in grid cells
+        col = np.clip(((xyxy[:, 0] + xyxy[:, 2]) * 0.5 * grid_w / width).astype(np.int64), 0, grid_w - 1)
+        row = np.clip(((xyxy[:, 1] + xyxy[:, 3]) * 0.5 * grid_h / height).astype(np.int64), 0, grid_h - 1)
+
+        with self._lock:
+            camera = self._camera(str(camera_id))
+            hour_id = int(now // HOUR)
+            hour_row = camera._hour_row(hour_id)
+            day_row = camera._day_row(int(now // DAY))
+            if track_ids is not None:
+                if camera.counted_hour != hour_id:
+                    camera.counted_hour, camera.counted_tracks = hour_id, set()
+                for track_id, class_id in zip(np.asarray(track_ids).tolist(), cls.tolist()):
+                    if track_id >= 0 and (track_id, class_id) not in camera.counted_tracks:
+                        camera.counted_tracks.add((track_id, class_id))
+                        camera.hourly_counts[hour_row, class_id] += 1
+            else:
+                second = int(now)
+                if camera.peak_second != second:
+                    camera.peak_second = second
+                    camera.peak_counts[:] = 0
+                frame_counts = np.bincount(cls, minlength=self.num_classes)[:self.num_classes]
+                camera.hourly_counts[hour_row] += np.maximum(frame_counts - camera.peak_counts, 0)
+                np.maximum(camera.peak_counts, frame_counts, out=camera.peak_counts)
+            np.add.at(camera.daily_grids[day_row], (cls, row, col), 1)
+
+    # --- Queries ---
+    def hourly_counts(self, camera_id=None, class_name=None, hours=24, now=None):
+        """Per-hour counts over the last `hours` hours, oldest first, for one camera or all of them."""
+        now = time.time() if now is None else now
+        hours = min(hours, self.retention_hours)
+        current_hour = int(now // HOUR)
+        wanted = np.arange(current_hour - hours + 1, current_hour + 1)
+        totals = np.zeros((hours, self.num_classes), dtype=np.int64)
+
+        with self._lock:
+            if camera_id:
+                camera = self._cameras.get(str(camera_id))
+                cameras = [camera] if camera is not None else []
+            else:
+                cameras = list(self._cameras.values())
+            for camera in cameras:
+                rows = wanted % self.retention_hours
+                valid = camera.hour_ids[rows] == wanted
+                totals[valid] += camera.hourly_counts[rows[valid]]
+
+        class_ids = self._class_ids(class_name)
+        return [
+            {
+                'hour': int(hour_id * HOUR),
+                'counts': {self.class_names[class_id]: int(totals[i, class_id]) for class_id in class_ids},
+            }
+            for i, hour_id in enumerate(wanted.tolist())
+        ]
+
+    def heatmap(self, camera_id, class_name=None, days=1, now=None):
+        """Occupancy grid (grid_shape) summed over the last `days` days, for one class or all classes."""
+        now = time.time() if now is None else now
+        days = min(days, self.retention_days)
+        current_day = int(now // DAY)
+        wanted = np.arange(current_day - days + 1, current_day + 1)
+        grid = np.zeros(self.grid_shape, dtype=np.float32)
+        class_ids = self._class_ids(class_name)
+
+        with self._lock:
+            camera = self._cameras.get(str(camera_id))
+            if camera is not None and class_ids:
+                rows = wanted % self.retention_days
+                valid_rows = rows[camera.day_ids[rows] == wanted]
+                grid = camera.daily_grids[np.ix_(valid_rows, class_ids)].sum(axis=(0, 1))
+        return grid
+
+    def cameras(self):
+        with self._lock:
+            return list(self._cameras)
+
+    def _class_ids(self, class_name):
+        if class_name is None:
+            return sorted(self.class_names)
+        class_id = self.class_id(class_name)
+        return [class_id] if class_id is not None else []
+
+    # --- Persistence ---
+    def persist(self):
+        """Writes all aggregates to persist_path atomically."""
+        if not self.persist_path:
+            return
+        arrays = {'__meta__/class_names': np.array(json.dumps(self.class_names))}
+        with self._lock:
+            for camera_id, camera in self._cameras.items():
+                arrays[f"{camera_id}/hourly_counts"] = camera.hourly_counts.copy()
+                arrays[f"{camera_id}/hour_ids"] = camera.hour_ids.copy()
+                arrays[f"{camera_id}/daily_grids"] = camera.daily_grids.copy()
+                arrays[f"{camera_id}/day_ids"] = camera.day_ids.copy()
+        tmp_path = f"{self.persist_path}.tmp.npz"
+        np.savez_compressed(tmp_path, **arrays)
+        os.replace(tmp_path, self.persist_path)
+
+    def refresh(self):
+        """Reloads aggregates saved by another process; a no-op for the process that saves them."""
+        if self.autosave or not self.persist_path or not os.path.exists(self.persist_path):
+            return
+        if os.path.getmtime(self.persist_path) != self._loaded_mtime:
+            self._load()
+
+    def _load(self):
+        """Reads the saved aggregates into new objects, then swaps them in under the lock."""
+        try:
+            mtime = os.path.getmtime(self.persist_path)
+            with np.load(self.persist_path) as data:
+                class_names = self.class_names
+                if '__meta__/class_names' in data.files and not class_names:
+                    class_names = {int(k): v for k, v in json.loads(str(data['__meta__/class_names'])).items()}
+                num_classes = max(class_names) + 1 if class_names else 0
+                cameras = {}
+                for key in data.files:
+                    camera_id, name = key.rsplit('/', 1)
+                    if camera_id == '__meta__':
+                        continue
+                    camera = cameras.get(camera_id)
+                    if camera is None:
+                        camera = cameras[camera_id] = CameraAggregates(
+                            num_classes, self.retention_hours, self.retention_days, self.grid_shape
+                        )
+                    current = getattr(camera, name)
+                    if data[key].shape == current.shape:
+                        setattr(camera, name, data[key].copy())
+            with self._lock:
+                self.class_names, self.num_classes = class_names, num_classes
+                self._cameras = cameras
+                self._loaded_mtime = mtime
+            print(f"Loaded analytics aggregates for {len(cameras)} cameras.")
+        except Exception as e:
+            print(f"Error loading analytics aggregates from {self.persist_path}: {e}")
+
+    def _persist_loop(self):
+        while True:
+            time.sleep(self.persist_interval)
+            try:
+                self.persist()
+            except Exception as e:
+                print(f"Error persisting analytics aggregates: {e}")
@@ -1,23 +1,53 @@
 import os
+import sys
 import cv2
 import json
+import math
 import base64
 import numpy as np
 import threading
+import itertools
 import time
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session, flash, Response
+from flask import Flask, render_template, request, jsonify, redirect, url_for, session, flash, Response, send_file
 from flask_cors import CORS
 from firebase_admin import credentials, firestore, initialize_app, auth
 from werkzeug.security import generate_password_hash, check_password_hash
-from ultralytics import YOLO
 from datetime import datetime, timedelta
 from functools import wraps
 import time
 
+# Modules shared with FaceRecognitionSystem live in the repository-level common package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.metrics import MetricsRegistry, PROMETHEUS_CONTENT_TYPE
+from common.profiling import SlowFrameTracker, SamplingProfiler
+from common.startup import StartupTasks
+from common.face_quality import QualityGate
+from threat_rules import ThreatRulesEngine, DEFAULT_MONITORED_OBJECTS, THREAT_LEVELS
+from alerting import AlertDebouncer, CooldownStore
+from frame_buffer import FrameBufferRegistry, encode_mp4
+from evidence_store import EvidenceStore, AsyncEvidenceWriter, EvidenceJob, EVIDENCE_MIMETYPES
+from recorder import SegmentRecorder
+from event_store import DetectionEventStore
+from analytics import DetectionAnalytics
+from engine_link import EngineClient
+from shared_frames import SharedMemoryCapture
+from face_identity import FaceIdentifier, UNKNOWN
+from tracker import ObjectTracker, parse_count_lines
+from regions import RegionDetector, parse_roi, parse_tiling
+import frame_stages
+from resolution import ResolutionPolicy, imgsz_levels
+
+# --- Process Role ---
+# 'standalone': this process runs detection and serves HTTP (python app.py).
+# 'engine':     detection only; frames and status are published to web processes (detection_engine.py).
+# 'web':        HTTP only; streams and engine state come from the detection engine (asgi.py).
+PROCESS_ROLE = os.environ.get('SURVEILLANCE_ROLE', 'standalone')
+
 # Initialize Flask App
 app = Flask(__name__)
 CORS(app)
-app.secret_key = os.urandom(24)
+# Set FLASK_SECRET_KEY when several processes must accept the same session cookies
+app.secret_key = os.environ.get('FLASK_SECRET_KEY') or os.urandom(24)
 
 # --- Firebase Admin SDK Initialization ---
 try:
@@ -32,19 +62,147 @@ except Exception as e:
     print(f"Failed to initialize Firebase Admin SDK: {e}")
     db = None
 
+# --- Local Event Store ---
+# Every detection, alert and activity log entry is kept in a local SQLite database so history
+# queries are fast and keep working when Firestore is unreachable.
+EVENT_STORE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'events.db')
+DETECTION_RETENTION_DAYS = int(os.environ.get('DETECTION_RETENTION_DAYS', 30))
+event_store = DetectionEventStore(EVENT_STORE_PATH, DETECTION_RETENTION_DAYS)
+
 # --- YOLOv8 Model Initialization ---
-try:
+# Inference backend: 'pytorch', 'onnx', 'openvino' or 'openvino_int8' (see detector_backends.py)
+DETECTOR_BACKEND = os.environ.get('DETECTOR_BACKEND', 'pytorch')
+DETECTOR_IMGSZ = int(os.environ.get('DETECTOR_IMGSZ', 640))
+
+# Per-camera input size, lowered under load and raised with the threat level (see resolution.py).
+# Levels default to DETECTOR_IMGSZ and roughly 3/4 and 1/2 of it, in multiples of 32.
+ADAPTIVE_IMGSZ = os.environ.get('ADAPTIVE_IMGSZ', '1') == '1'
+IMGSZ_LEVELS = [int(level) for level in os.environ.get(
+    'IMGSZ_LEVELS', ','.join(str(level) for level in imgsz_levels(DETECTOR_IMGSZ))
+).split(',')]
+resolution_policy = ResolutionPolicy(
+    [DETECTOR_IMGSZ] + [level for level in IMGSZ_LEVELS if level < DETECTOR_IMGSZ],
+    target_fps=float(os.environ.get('INFERENCE_TARGET_FPS', 10)),
+    enabled=ADAPTIVE_IMGSZ,
+)
+
+# Loaded in the background after startup (see load_model); None until then or if loading fails
+model = None
+
+def load_model():
+    """Loads the detector and runs one warm-up inference so the first real frame is not slow."""
+    global model
+    # Imported here so importing app.py does not pull in ultralytics/torch
+    from detector_backends import load_detector
+
     model_path = os.path.join(os.path.dirname(__file__), 'models', 'best.pt')
     if not os.path.exists(model_path):
         raise FileNotFoundError(f"YOLOv8 model not found at {model_path}")
-    model = YOLO(model_path)
-    print("YOLOv8 model loaded successfully for Flask app!")
-except FileNotFoundError as e:
-    print(f"Error loading YOLOv8 model: {e}")
-    model = None
-except Exception as e:
-    print(f"An unexpected error occurred while loading YOLOv8 model: {e}")
-    model = None
+    detector = load_detector(model_path, DETECTOR_BACKEND, DETECTOR_IMGSZ)
+    detector(np.zeros((480, 640, 3), dtype=np.uint8))
+    if resolution_policy.enabled and not detector.dynamic:
+        resolution_policy.enabled = False
+        print(f"Adaptive resolution disabled: the {detector.backend} export only runs at imgsz {DETECTOR_IMGSZ}")
+    threat_engine.set_model_names(detector.names)
+    analytics.set_class_names(detector.names)
+    tracker.set_class_names(detector.names)
+    model = detector
+    print(f"YOLOv8 model loaded successfully for Flask app! (backend: {model.backend})")
+
+# Threat rules are compiled against the model's class IDs and reloaded whenever the config changes;
+# load_model() recompiles them once the model's classes are known
+threat_engine = ThreatRulesEngine()
+
+# An alert fires only once a class is seen in ALERT_CONFIRM_FRAMES of the last ALERT_WINDOW_FRAMES frames
+ALERT_CONFIRM_FRAMES = int(os.environ.get('ALERT_CONFIRM_FRAMES', 3))
+ALERT_WINDOW_FRAMES = int(os.environ.get('ALERT_WINDOW_FRAMES', 5))
+alert_debouncer = AlertDebouncer(ALERT_CONFIRM_FRAMES, ALERT_WINDOW_FRAMES)
+
+# Detections get persistent track IDs; with tracking on, each tracked object is its own incident
+# (see alerting.py) and the cooldown below is per track. Count lines come from the camera documents.
+TRACKING_ENABLED = os.environ.get('TRACKING_ENABLED', '1') == '1'
+tracker = ObjectTracker(max_age=int(os.environ.get('TRACK_MAX_AGE_FRAMES', 30)))
+
+# Cameras with ROI polygons or tiling (camera document 'roi'/'tiling') are inferred on crops, see regions.py
+region_detector = RegionDetector()
+
+# Detection settings stored on camera documents, with the validator for each
+CAMERA_SETTINGS = {'count_lines': parse_count_lines, 'roi': parse_roi, 'tiling': parse_tiling}
+
+# Cooldown between in-place updates of an open incident's alert, shared by every /video_feed viewer
+ALERT_COOLDOWN_SECONDS = 5
+alert_cooldowns = CooldownStore(ALERT_COOLDOWN_SECONDS, max_entries=1024)
+
+# --- Face Identification ---
+# Optional cascade stage: faces in no_mask (and person) boxes are matched against the
+# FaceRecognitionSystem gallery, so alerts say whether an enrolled worker or an unknown person was seen
+FACE_RECOGNITION_DIR = os.environ.get(
+    'FACE_RECOGNITION_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'FaceRecognitionSystem')
+)
+FACE_IDENTIFICATION = os.environ.get('FACE_IDENTIFICATION', '1') == '1'
+FACE_IDENTIFY_MIN_SIZE = int(os.environ.get('FACE_IDENTIFY_MIN_SIZE', 40))
+face_identifier = FaceIdentifier(
+    os.path.join(FACE_RECOGNITION_DIR, 'models'),
+    os.path.join(FACE_RECOGNITION_DIR, 'encodings.pkl'),
+    os.path.join(FACE_RECOGNITION_DIR, 'recognition_config.json'),
+    min_face_size=FACE_IDENTIFY_MIN_SIZE,
+    max_faces=int(os.environ.get('FACE_IDENTIFY_MAX_FACES', 4)),
+    # Same gate and settings as FaceRecognitionSystem, with this stage's minimum face size
+    quality_gate=QualityGate(
+        min_face_size=FACE_IDENTIFY_MIN_SIZE,
+        min_sharpness=float(os.environ.get('FACE_MIN_SHARPNESS', 40)),
+        max_yaw_degrees=float(os.environ.get('FACE_MAX_YAW', 35)),
+        enabled=os.environ.get('FACE_QUALITY_GATE', '1') == '1',
+    ),
+)
+
+# --- Alert Evidence ---
+# Each alert keeps the annotated snapshot plus a clip from EVIDENCE_PRE_SECONDS before
+# to EVIDENCE_POST_SECONDS after the incident started, cut from the per-camera frame buffer.
+EVIDENCE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'evidence')
+EVIDENCE_MAX_BYTES = int(os.environ.get('EVIDENCE_MAX_BYTES', 2 * 1024 ** 3))
+EVIDENCE_MAX_AGE_DAYS = int(os.environ.get('EVIDENCE_MAX_AGE_DAYS', 14))
+EVIDENCE_PRE_SECONDS = 5
+EVIDENCE_POST_SECONDS = 5
+
+# --- Per-Camera Rewind Buffer ---
+# Fixed memory per camera: RING_BUFFER_MB of encoded frames, at most RING_BUFFER_SECONDS long
+RING_BUFFER_SECONDS = max(float(os.environ.get('RING_BUFFER_SECONDS', 30)), EVIDENCE_PRE_SECONDS + EVIDENCE_POST_SECONDS)
+RING_BUFFER_MB = int(os.environ.get('RING_BUFFER_MB', 64))
+RING_BUFFER_MAX_FPS = 30
+frame_buffers = FrameBufferRegistry(
+    duration_seconds=RING_BUFFER_SECONDS,
+    capacity_bytes=RING_BUFFER_MB * 1024 ** 2,
+    max_frames=int(RING_BUFFER_SECONDS * RING_BUFFER_MAX_FPS)
+)
+evidence_store = EvidenceStore(EVIDENCE_DIR, EVIDENCE_MAX_BYTES, EVIDENCE_MAX_AGE_DAYS * 24 * 3600)
+
+# --- Continuous Recording ---
+# Every camera is recorded to RECORDING_SEGMENT_SECONDS-long segments; the oldest segments are
+# deleted once the recordings use more than RECORDING_QUOTA_GB.
+RECORDING_ENABLED = os.environ.get('RECORDING_ENABLED', '1') == '1'
+RECORDINGS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'recordings')
+RECORDING_SEGMENT_SECONDS = int(os.environ.get('RECORDING_SEGMENT_SECONDS', 60))
+RECORDING_QUOTA_GB = float(os.environ.get('RECORDING_QUOTA_GB', 20))
+# Longest range one clip export may cover; clips longer than the rewind buffer come from the recordings
+CLIP_MAX_SECONDS = float(os.environ.get('CLIP_MAX_SECONDS', 120))
+# Longest range one /api/recordings listing covers (each returns the detections of every frame in it)
+RECORDINGS_MAX_RANGE_SECONDS = float(os.environ.get('RECORDINGS_MAX_RANGE_SECONDS', 3600))
+recorder = SegmentRecorder(
+    RECORDINGS_DIR, RECORDING_SEGMENT_SECONDS, int(RECORDING_QUOTA_GB * 1024 ** 3), read_only=PROCESS_ROLE == 'web'
+) if RECORDING_ENABLED else None
+
+# --- Detection Analytics ---
+# Hourly class counts and occupancy heatmaps are aggregated as frames are processed and saved
+# every ANALYTICS_PERSIST_SECONDS, so dashboards never rescan the raw detection history.
+ANALYTICS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'analytics.npz')
+ANALYTICS_PERSIST_SECONDS = int(os.environ.get('ANALYTICS_PERSIST_SECONDS', 300))
+analytics = DetectionAnalytics(
+    {}, ANALYTICS_PATH, persist_interval=ANALYTICS_PERSIST_SECONDS, autosave=PROCESS_ROLE != 'web'
+)
+
+# Web processes reach the detection engine through this link (see engine_link.py)
+engine_client = EngineClient() if PROCESS_ROLE == 'web' else None
 
 # --- Global Variables for Video Stream and Detection ---
 video_stream = None
@@ -55,6 +213,7 @@ system_status = "offline"
 current_threat_level = "Low"
 total_detections = 0
 last_object_detected = "N/A"
+last_frame_detections = None  # detections.Detections of the latest processed frame
 
 # --- Utility Functions ---
 def get_app_id():
@@ -62,6 +221,7 @@ def get_app_id():
 
 def log_activity(user_id, role, message, camera_name="Unknown", detections=None, threat_level="Low"):
     """Enhanced activity logging with more details."""
+    event_store.record_activity(user_id, role, message, camera_name, detections, threat_level, 'verified')
     if db:
         try:
             app_id = get_app_id()
@@ -217,29 +377,66 @@ def initialize_system_collections():
             'last_object_detected': 'N/A'
         }, merge=True)
         
-        # Initialize threat config
+        # Initialize threat config, keeping the sensitivity, monitored objects and rules an admin already
+        # saved; threat_level/level hold the live detected level and restart at 'Low'
         threat_ref = db.collection('artifacts').document(app_id).collection('public').document('data').collection('settings').document('threat_config')
-        threat_ref.set({
+        threat_doc = threat_ref.get()
+        saved_config = threat_doc.to_dict() if threat_doc.exists else {}
+        threat_defaults = {
             'threat_level': 'Low',
             'level': 'Low',
-            'monitored_objects': ['knife', 'gun', 'person'],
             'timestamp': firestore.SERVER_TIMESTAMP
-        }, merge=True)
+        }
+        if 'sensitivity' not in saved_config:
+            threat_defaults['sensitivity'] = 'Low'
+        if 'monitored_objects' not in saved_config:
+            threat_defaults['monitored_objects'] = DEFAULT_MONITORED_OBJECTS
+        threat_ref.set(threat_defaults, merge=True)
+        threat_engine.reload(threat_ref.get().to_dict())
         
         print("System collections initialized successfully.")
         
     except Exception as e:
         print(f"Error initializing system collections: {e}")
 
-# Initialize system on startup
-admin_uid = None
-if db:
+def bootstrap_firestore():
+    """Creates the default admin, webcam and settings documents if they are missing."""
+    global admin_uid
     admin_uid = create_default_admin_user()
     register_default_webcam()
     initialize_system_collections()
     update_system_status("starting")
 
+# Initialize system on startup, in the background so the server accepts requests immediately;
+# /api/health/ready reports when every component has finished loading
+admin_uid = None
+startup = StartupTasks()
+if PROCESS_ROLE == 'web':
+    # Web workers only read and forward; bootstrapping (and its 'starting' status) is the engine's job
+    startup.skip('firestore', "bootstrapped by the detection engine")
+elif db:
+    startup.add('firestore', bootstrap_firestore)
+else:
+    startup.skip('firestore', "Firebase Admin SDK is not initialized; running on the local event store")
+if PROCESS_ROLE == 'web':
+    startup.skip('model', "loaded by the detection engine")
+else:
+    startup.add('model', load_model)
+if PROCESS_ROLE == 'web':
+    startup.skip('face_identity', "loaded by the detection engine")
+elif not FACE_IDENTIFICATION:
+    startup.skip('face_identity', "disabled with FACE_IDENTIFICATION=0")
+else:
+    startup.add('face_identity', face_identifier.load, required=False)
+
 # --- Enhanced Camera Management Class ---
+# Capture resolution requested from every camera. CAPTURE_PROCESS=1 moves capture and decoding into a
+# child process feeding a shared-memory ring sized from the resolution actually delivered (shared_frames.py)
+CAPTURE_WIDTH = 640
+CAPTURE_HEIGHT = 480
+CAPTURE_FPS = 30
+CAPTURE_PROCESS = os.environ.get('CAPTURE_PROCESS', '0') == '1'
+
 class VideoCapture:
     """Enhanced video capture class with better error handling and reconnection."""
     def __init__(self, source=0):
@@ -260,13 +457,18 @@ class VideoCapture:
             else:
                 source = self.source
 
-            self.cap = cv2.VideoCapture(source)
+            # A capture process holds a shared memory ring, so let it go before opening a new one
+            self.release()
+            if CAPTURE_PROCESS:
+                self.cap = SharedMemoryCapture(source, CAPTURE_WIDTH, CAPTURE_HEIGHT, CAPTURE_FPS)
+            else:
+                self.cap = cv2.VideoCapture(source)
             
             # Set camera properties for better performance
             if self.cap.isOpened():
-                self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-                self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-                self.cap.set(cv2.CAP_PROP_FPS, 30)
+                self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, CAPTURE_WIDTH)
+                self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, CAPTURE_HEIGHT)
+                self.cap.set(cv2.CAP_PROP_FPS, CAPTURE_FPS)
                 
                 print(f"Successfully opened video source at {source}")
                 self.reconnect_attempts = 0
@@ -320,14 +522,172 @@ class VideoCapture:
         self.reconnect_attempts = 0
         return self.connect()
 
+# --- Incident Alert Persistence ---
+def get_camera_name(camera_id):
+    """Looks up a camera's display name in Firestore."""
+    camera_name = "Unknown Camera"
+    if camera_id and db:
+        try:
+            app_id = get_app_id()
+            camera_doc = db.collection('artifacts').document(app_id).collection('public').document('data').collection('cameras').document(camera_id).get()
+            if camera_doc.exists:
+                camera_name = camera_doc.to_dict().get('name', 'Unknown Camera')
+        except Exception as e:
+            print(f"Error fetching camera name: {e}")
+    return camera_name
+
+def open_incident_alert(incident):
+    """Creates the single alert document for a newly confirmed incident."""
+    camera_name = get_camera_name(incident.camera_id)
+    threat_level = threat_engine.rules.threat_level_for(incident.class_name)
+    detections = [incident.class_name]
+    alert_data = {
+        'camera': camera_name,
+        'camera_id': incident.camera_id,
+        'detections': detections,
+        'threatLevel': threat_level,
+        'status': 'unverified',
+        'event_state': 'active',
+        'frame_hits': incident.frame_hits,
+        'max_confidence': incident.max_confidence,
+        'identities': sorted(incident.identities),
+        'track_id': incident.track_id
+    }
+    try:
+        if db:
+            app_id = get_app_id()
+            alerts_ref = db.collection('artifacts').document(app_id).collection('public').document('data').collection('alerts')
+            _, alert_doc_ref = alerts_ref.add({
+                **alert_data,
+                'event_start': datetime.fromtimestamp(incident.started_at),
+                'last_seen': datetime.fromtimestamp(incident.last_seen),
+                'timestamp': firestore.SERVER_TIMESTAMP
+            })
+            incident.alert_id = alert_doc_ref.id
+        incident.alert_id = event_store.insert_alert(
+            incident.alert_id, incident.started_at,
+            event_start=incident.started_at, last_seen=incident.last_seen, **alert_data
+        )
+        track = f" (track {incident.track_id})" if incident.track_id is not None else ""
+        print(f"Alert logged: {detections}{track} - {threat_level} priority on {camera_name}")
+
+        # Also log system activity
+        if admin_uid:
+            log_activity(
+                admin_uid, 
+                'system', 
+                f"Auto-detection: {', '.join(detections)} detected",
+                camera_name,
+                detections,
+                threat_level
+            )
+    except Exception as e:
+        print(f"Error logging alert to Firebase: {e}")
+
+def update_incident_alert(incident):
+    """Updates an incident's alert document in place; marks it ended once the incident closes."""
+    if not incident.alert_id:
+        return
+    update_data = {
+        'last_seen': datetime.fromtimestamp(incident.last_seen),
+        'frame_hits': incident.frame_hits,
+        'max_confidence': incident.max_confidence,
+        'duration_seconds': round(incident.duration, 1),
+        'identities': sorted(incident.identities)
+    }
+    if incident.ended_at is not None:
+        update_data['event_state'] = 'ended'
+        update_data['event_end'] = datetime.fromtimestamp(incident.ended_at)
+    local_update = {
+        'last_seen': incident.last_seen,
+        'frame_hits': incident.frame_hits,
+        'max_confidence': incident.max_confidence,
+        'identities': sorted(incident.identities)
+    }
+    if incident.ended_at is not None:
+        local_update['event_state'] = 'ended'
+        local_update['event_end'] = incident.ended_at
+    event_store.update_alert(incident.alert_id, **local_update)
+    if not db:
+        return
+    try:
+        app_id = get_app_id()
+        db.collection('artifacts').document(app_id).collection('public').document('data').collection('alerts').document(incident.alert_id).update(update_data)
+    except Exception as e:
+        print(f"Error updating alert {incident.alert_id}: {e}")
+
+def attach_alert_evidence(alert_id, references):
+    """Stores the evidence references on the alert document once the media is on disk."""
+    event_store.update_alert(alert_id, evidence=references)
+    if not db:
+        return
+    try:
+        app_id = get_app_id()
+        db.collection('artifacts').document(app_id).collection('public').document('data').collection('alerts').document(alert_id).update({
+            'evidence': references
+        })
+    except Exception as e:
+        print(f"Error attaching evidence to alert {alert_id}: {e}")
+
+evidence_writer = AsyncEvidenceWriter(evidence_store, attach_alert_evidence)
+
+# --- Metrics ---
+# Exposed on /metrics in the Prometheus text format. Queue depths and drop counts that other
+# components already track are read at scrape time instead of being updated per frame.
+metrics = MetricsRegistry()
+metric_stage_seconds = metrics.histogram(
+    'surveillance_frame_stage_seconds', 'Time spent in each stage of the frame loop.', ('camera', 'stage')
+)
+metric_frame_seconds = metrics.histogram(
+    'surveillance_frame_seconds', 'End-to-end processing time of one streamed frame.', ('camera',)
+)
+metric_dropped_frames = metrics.counter(
+    'surveillance_dropped_frames_total', 'Frames lost before streaming, by reason.', ('camera', 'reason')
+)
+metric_alerts = metrics.counter(
+    'surveillance_alerts_total', 'Alerts opened for confirmed incidents.', ('camera', 'class')
+)
+metric_identities = metrics.counter(
+    'surveillance_face_identities_total', 'Faces identified in detector boxes, by result.', ('camera', 'result')
+)
+metrics.callback('surveillance_line_crossings_total', 'Tracked objects crossing a camera count line.', lambda: tracker.line_counts(),
+                 ('camera', 'line', 'direction'), metric_type='counter')
+metrics.callback('surveillance_inference_imgsz', 'Detector input size currently used per camera.', lambda: {
+    (camera_id,): imgsz for camera_id, imgsz in resolution_policy.current().items()
+}, ('camera',))
+metric_video_clients = metrics.gauge('surveillance_video_feed_clients', 'Connected /video_feed clients.')
+metrics.callback('surveillance_queue_depth', 'Items waiting in background writer queues.', lambda: {
+    ('recorder',): recorder.pending() if recorder else 0,
+    ('evidence',): evidence_writer.pending(),
+    ('event_store',): event_store.pending(),
+}, ('queue',))
+metrics.callback('surveillance_queue_dropped_total', 'Items dropped because a writer queue was full.', lambda: {
+    ('recorder',): recorder.dropped if recorder else 0,
+    ('evidence',): evidence_writer.dropped,
+}, ('queue',), metric_type='counter')
+metrics.callback('surveillance_total_detections', 'Objects detected since startup.', lambda: total_detections, metric_type='counter')
+
+# --- Profiling ---
+# Opt-in tracing keeps the PROFILING_SLOW_FRAMES slowest frames with their stage breakdown;
+# admins can toggle it and take sampling profiles at runtime via /api/admin/profiling.
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '0') == '1'
+PROFILING_SLOW_FRAMES = int(os.environ.get('PROFILING_SLOW_FRAMES', 50))
+slow_frames = SlowFrameTracker(PROFILING_SLOW_FRAMES, PROFILING_ENABLED)
+sampling_profiler = SamplingProfiler()
+
+def observe_stage(camera_label, stage, since, trace=None):
+    """Records the time since `since` for one frame-loop stage and returns the current perf_counter."""
+    now = time.perf_counter()
+    metric_stage_seconds.labels(camera_label, stage).observe(now - since)
+    if trace is not None:
+        trace.span(stage, now - since)
+    return now
+
 # --- Enhanced Video Streaming and Detection Logic ---
-def generate_frames():
-    """Enhanced frame generator with improved detection and logging."""
+def detection_frames():
+    """Runs detection on the active camera and yields each annotated frame as JPEG bytes."""
     global video_stream, detection_active, frame_lock, current_camera_id, current_threat_level
-    global total_detections, last_object_detected
-
-    alert_cooldown = {}
-    cooldown_duration = 5  # seconds
+    global total_detections, last_object_detected, last_frame_detections
 
     while True:
         with frame_lock:
@@ -335,84 +695,87 @@ def generate_frames():
                 time.sleep(1)
                 continue
 
+            camera_label = current_camera_id or 'none'
+            trace = slow_frames.begin(camera_label)
+            frame_start = time.perf_counter()
             frame = video_stream.get_frame()
+            stage_start = observe_stage(camera_label, 'capture', frame_start, trace)
             if frame is not None:
+                new_incidents = []
+                frame_detections = None
+
                 # Run YOLOv8 inference on the frame
                 if model:
                     try:
-                        results = model(frame)
-                        annotated_frame = results[0].plot()
-
-                        # Get detections for logging
-                        detections = []
-                        if results[0].boxes is not None:
-                            for box in results[0].boxes:
-                                class_id = int(box.cls)
-                                class_name = model.names[class_id]
-                                detections.append(class_name)
+                        # Full frame, or one batch over the camera's ROI crops / tiles
+                        imgsz = resolution_policy.imgsz(current_camera_id, current_threat_level)
+                        region_plan = region_detector.plan(current_camera_id, frame.shape)
+                        output = frame_stages.infer(model, frame, region_detector, region_plan, imgsz)
+                        inference_seconds = time.perf_counter() - stage_start
+                        resolution_policy.observe(current_camera_id, inference_seconds, current_threat_level)
+                        stage_start = observe_stage(camera_label, 'inference', stage_start, trace)
+
+                        # Detections as arrays, extracted once and shared by every stage below
+                        frame_detections, annotated_frame = frame_stages.annotate(frame, output, model.names, region_plan)
+                        last_frame_detections = frame_detections
+                        stage_start = observe_stage(camera_label, 'annotate', stage_start, trace)
+                        cls, conf, xyxy = frame_detections.cls, frame_detections.conf, frame_detections.xyxy
+                        class_names = frame_detections.class_names()
+                        event_store.record_detections(current_camera_id, time.time(), frame_detections)
+
+                        # Persistent IDs across frames for dwell time, line counts and per-object alerts
+                        if TRACKING_ENABLED:
+                            frame_detections.track_ids = tracker.update(current_camera_id, cls, conf, xyxy, frame.shape)
+                            frame_stages.draw_track_ids(annotated_frame, frame_detections.track_ids, xyxy)
+                            stage_start = observe_stage(camera_label, 'track', stage_start, trace)
+
+                        # Distinct tracked objects per hour, or the per-second peak without tracking
+                        analytics.update(current_camera_id, cls, xyxy, frame.shape, frame_detections.track_ids)
+
+                        # Identify faces in the detector's own boxes instead of searching the frame for them
+                        if face_identifier.wants(class_names):
+                            identities = frame_stages.identify_faces(face_identifier, frame, frame_detections, class_names, annotated_frame)
+                            for name, _ in identities.values():
+                                metric_identities.labels(camera_label, 'unknown' if name == UNKNOWN else 'known').inc()
+                            stage_start = observe_stage(camera_label, 'identify', stage_start, trace)
 
                         # Update global detection stats
-                        if detections:
-                            total_detections += len(detections)
-                            last_object_detected = detections[-1]
+                        if len(frame_detections):
+                            total_detections += len(frame_detections)
+                            last_object_detected = class_names[-1]
 
-                        # Determine threat level based on detections
-                        threat_level = 'Low'
-                        if any(detection in ["weapon", "other_coverings", "knife", "gun"] for detection in detections):
-                            threat_level = 'High'
-                        elif any(detection in ["medical_mask", "nomask", "person"] for detection in detections):
-                            threat_level = 'Low'
+                        # Determine threat level and alerting classes from the configured rules
+                        evaluation = threat_engine.evaluate(current_camera_id, cls, conf, xyxy)
+                        threat_level = evaluation.threat_level
+                        stage_start = observe_stage(camera_label, 'rules', stage_start, trace)
 
                         # Update global threat level if changed
                         if threat_level != current_threat_level:
                             update_threat_level(threat_level)
 
-                        # Log to Firestore if detections are made and cooldown has passed
-                        if detections and db:
-                            current_time = time.time()
-                            detection_key = f"{current_camera_id}_{'-'.join(sorted(detections))}"
-                            
-                            if detection_key not in alert_cooldown or (current_time - alert_cooldown[detection_key]) > cooldown_duration:
-                                alert_cooldown[detection_key] = current_time
-                                
-                                # Get current camera name
-                                camera_name = "Unknown Camera"
-                                if current_camera_id:
-                                    try:
-                                        app_id = get_app_id()
-                                        camera_doc = db.collection('artifacts').document(app_id).collection('public').document('data').collection('cameras').document(current_camera_id).get()
-                                        if camera_doc.exists:
-                                            camera_name = camera_doc.to_dict().get('name', 'Unknown Camera')
-                                    except Exception as e:
-                                        print(f"Error fetching camera name: {e}")
-                                
-                                # Log alert to Firebase
-                                try:
-                                    app_id = get_app_id()
-                                    alerts_ref = db.collection('artifacts').document(app_id).collection('public').document('data').collection('alerts')
-                                    alert_doc = alerts_ref.add({
-                                        'camera': camera_name,
-                                        'camera_id': current_camera_id,
-                                        'detections': detections,
-                                        'threatLevel': threat_level,
-                                        'status': 'unverified',
-                                        'timestamp': firestore.SERVER_TIMESTAMP
-                                    })
-                                    print(f"Alert logged: {detections} - {threat_level} priority on {camera_name}")
-                                    
-                                    # Also log system activity
-                                    if admin_uid:
-                                        log_activity(
-                                            admin_uid, 
-                                            'system', 
-                                            f"Auto-detection: {', '.join(detections)} detected",
-                                            camera_name,
-                                            detections,
-                                            threat_level
-                                        )
-                                        
-                                except Exception as e:
-                                    print(f"Error logging alert to Firebase: {e}")
+                        # Confirm monitored classes over several frames; one alert document per incident
+                        track_ids = frame_detections.track_ids
+                        started, ongoing, ended = alert_debouncer.update(
+                            current_camera_id, frame_stages.alert_confidences(evaluation, frame_detections)
+                        )
+                        if frame_detections.identities:
+                            for incident in started + ongoing:
+                                incident.identities.update(
+                                    name for i, name in frame_detections.identities.items()
+                                    if class_names[i] == incident.class_name
+                                    and (incident.track_id is None or track_ids[i] == incident.track_id)
+                                )
+                        for incident in started:
+                            open_incident_alert(incident)
+                            metric_alerts.labels(camera_label, incident.class_name).inc()
+                        new_incidents = started
+                        for incident in ongoing:
+                            if alert_cooldowns.try_acquire(incident.key):
+                                update_incident_alert(incident)
+                        for incident in ended:
+                            alert_cooldowns.discard(incident.key)
+                            update_incident_alert(incident)
+                        stage_start = observe_stage(camera_label, 'firestore_write', stage_start, trace)
 
                     except Exception as e:
                         print(f"Error during YOLO inference: {e}")
@@ -423,14 +786,172 @@ def generate_frames():
                 # Encode frame to JPEG
                 ret, buffer = cv2.imencode('.jpg', annotated_frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
                 if not ret:
+                    metric_dropped_frames.labels(camera_label, 'encode').inc()
                     continue
 
                 frame = buffer.tobytes()
-                yield (b'--frame\r\n'
-                        b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
+                stage_start = observe_stage(camera_label, 'encode', stage_start, trace)
+
+                # Keep the encoded frame for evidence clips and queue evidence for new alerts
+                frame_time = time.time()
+                camera_buffer = frame_buffers.get(current_camera_id)
+                camera_buffer.append(frame, frame_time)
+                if recorder:
+                    recorder.record(current_camera_id, frame, frame_time, frame_detections)
+                for incident in new_incidents:
+                    if incident.alert_id:
+                        evidence_writer.submit(EvidenceJob(
+                            incident.alert_id, incident.camera_id, frame, incident.started_at,
+                            camera_buffer, EVIDENCE_PRE_SECONDS, EVIDENCE_POST_SECONDS
+                        ))
+                stage_start = observe_stage(camera_label, 'persist', stage_start, trace)
+                metric_frame_seconds.labels(camera_label).observe(stage_start - frame_start)
+                slow_frames.finish(trace, stage_start - frame_start)
+
+                yield frame
             else:
+                metric_dropped_frames.labels(camera_label, 'capture').inc()
                 time.sleep(0.1)
 
+def generate_frames():
+    """Enhanced frame generator with improved detection and logging."""
+    for frame in detection_frames():
+        yield (b'--frame\r\n'
+                b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
+
+def stream_frames():
+    """Wraps generate_frames() for one /video_feed client so connected viewers are counted."""
+    metric_video_clients.inc()
+    try:
+        yield from generate_frames()
+    finally:
+        metric_video_clients.dec()
+
+def apply_camera_settings(camera_id, camera_data):
+    """Applies a camera document's detection settings (count lines, ROI, tiling) to the detection loop."""
+    try:
+        tracker.set_lines(camera_id, camera_data.get('count_lines'))
+    except ValueError as e:
+        print(f"Ignoring invalid count lines on camera {camera_id}: {e}")
+    try:
+        region_detector.configure(camera_id, camera_data.get('roi'), camera_data.get('tiling'))
+    except ValueError as e:
+        print(f"Ignoring invalid ROI/tiling on camera {camera_id}: {e}")
+
+def parse_camera_settings(data):
+    """Validated detection settings present in a camera request body; raises ValueError."""
+    return {field: parse(data[field]) for field, parse in CAMERA_SETTINGS.items() if field in data}
+
+def ensure_video_stream():
+    """Opens the video stream on the current camera, or the default one if none is selected.
+
+    Returns None once the stream is open, otherwise an (error message, status code) response.
+    """
+    global video_stream, current_camera_id
+
+    app_id = get_app_id()
+    cameras_ref = db.collection('artifacts').document(app_id).collection('public').document('data').collection('cameras')
+
+    # If no current camera, get the default one
+    if not current_camera_id:
+        # Try to get default camera first
+        for doc in cameras_ref.where('is_default', '==', True).limit(1).stream():
+            current_camera_id = doc.id
+            camera_data = doc.to_dict()
+            camera_source = camera_data.get('source') or camera_data.get('rtspUrl', '0')
+            break
+        else:
+            # Get first active camera
+            for doc in cameras_ref.where('status', '==', 'active').limit(1).stream():
+                current_camera_id = doc.id
+                camera_data = doc.to_dict()
+                camera_source = camera_data.get('source') or camera_data.get('rtspUrl', '0')
+                break
+            else:
+                return "No active cameras available", 503
+    else:
+        # Get current camera source
+        camera_doc = cameras_ref.document(current_camera_id).get()
+        if camera_doc.exists:
+            camera_data = camera_doc.to_dict()
+            camera_source = camera_data.get('source') or camera_data.get('rtspUrl', '0')
+        else:
+            return "Current camera not found", 404
+    apply_camera_settings(current_camera_id, camera_data)
+
+    # Initialize or check video stream
+    with frame_lock:
+        if video_stream is None:
+            video_stream = VideoCapture(camera_source)
+        elif not video_stream.cap or not video_stream.cap.isOpened():
+            video_stream.connect()
+
+    if video_stream and video_stream.cap and video_stream.cap.isOpened():
+        return None
+    update_system_status("offline")
+    return "Camera not available", 503
+
+def switch_camera(camera_id):
+    """Switches the video stream to a camera. Returns a result dict (also sent back by the detection engine)."""
+    global video_stream, current_camera_id
+
+    app_id = get_app_id()
+    cameras_ref = db.collection('artifacts').document(app_id).collection('public').document('data').collection('cameras')
+
+    # Get the camera details
+    camera_doc = cameras_ref.document(camera_id).get()
+    if not camera_doc.exists:
+        return {'success': False, 'error': "Camera not found", 'status': 404}
+
+    camera_data = camera_doc.to_dict()
+    camera_source = camera_data.get('source') or camera_data.get('rtspUrl', '0')
+    camera_name = camera_data.get('name', 'Unknown Camera')
+
+    # Switch video stream to new camera
+    with frame_lock:
+        if video_stream:
+            success = video_stream.switch_source(camera_source)
+        else:
+            video_stream = VideoCapture(camera_source)
+            success = video_stream.cap and video_stream.cap.isOpened()
+
+        if not success:
+            return {'success': False, 'error': "Failed to connect to camera", 'status': 500}
+        if current_camera_id != camera_id:
+            for incident in alert_debouncer.close_camera(current_camera_id):
+                update_incident_alert(incident)
+            tracker.close_camera(current_camera_id)
+        current_camera_id = camera_id
+        apply_camera_settings(camera_id, camera_data)
+    return {'success': True, 'camera_name': camera_name}
+
+def tracing_state(enabled=None, capacity=None, clear=False):
+    """Applies any tracing changes and returns the tracing status with the slowest frames."""
+    slow_frames.configure(enabled, capacity)
+    if clear:
+        slow_frames.clear()
+    return {
+        **slow_frames.stats(),
+        'profile_running': sampling_profiler.busy(),
+        'slowest_frames': slow_frames.slowest()
+    }
+
+def handle_engine_request(command, *args):
+    """Commands a web process sends to the detection engine (see engine_link.py)."""
+    if command == 'activate_camera':
+        return switch_camera(*args)
+    if command == 'camera_settings':
+        apply_camera_settings(*args)
+        return {'success': True}
+    if command == 'reload_threat_config':
+        threat_engine.reload(args[0])
+        return {'success': True}
+    if command == 'tracing':
+        return tracing_state(*args)
+    if command == 'profile':
+        return sampling_profiler.profile(*args)
+    raise ValueError(f"Unknown engine command '{command}'")
+
 # --- Routes ---
 @app.route('/')
 def index():
@@ -592,6 +1113,17 @@ def get_system_status():
         print(f"Error fetching system status: {e}")
         return jsonify({"error": "Failed to fetch system status"}), 500
 
+def use_local_history():
+    """History reads go to the local event store when Firestore is down, when asked for
+    with source=local, or when filtering by camera, class or time (Firestore would need a full scan)."""
+    if db is None or request.args.get('source') == 'local':
+        return True
+    return any(arg in request.args for arg in ('camera_id', 'class', 'start', 'end'))
+
+def optional_float_arg(name):
+    value = request.args.get(name)
+    return float(value) if value is not None else None
+
 @app.route('/api/alerts', methods=['GET'])
 @firebase_authenticated
 def get_alerts():
@@ -599,6 +1131,16 @@ def get_alerts():
         status_filter = request.args.get('status', 'all')
         limit = int(request.args.get('limit', 50))
         
+        if use_local_history():
+            return jsonify(event_store.query_alerts(
+                status_filter,
+                request.args.get('camera_id'),
+                request.args.get('class'),
+                optional_float_arg('start'),
+                optional_float_arg('end'),
+                limit
+            ))
+        
         app_id = get_app_id()
         alerts_ref = db.collection('artifacts').document(app_id).collection('public').document('data').collection('alerts')
         
@@ -622,6 +1164,8 @@ def get_alerts():
         
         return jsonify(alerts)
         
+    except ValueError:
+        return jsonify({"error": "start, end and limit must be numbers"}), 400
     except Exception as e:
         print(f"Error fetching alerts: {e}")
         return jsonify({"error": "Failed to fetch alerts"}), 500
@@ -639,22 +1183,29 @@ def update_alert(alert_id):
         if new_status not in ['verified', 'dismissed', 'unverified']:
             return jsonify({"error": "Invalid status"}), 400
         
-        app_id = get_app_id()
-        alerts_doc_ref = db.collection('artifacts').document(app_id).collection('public').document('data').collection('alerts').document(alert_id)
-        
-        # Get the alert data before updating
-        alert_doc = alerts_doc_ref.get()
-        if not alert_doc.exists:
-            return jsonify({"error": "Alert not found"}), 404
+        if db:
+            app_id = get_app_id()
+            alerts_doc_ref = db.collection('artifacts').document(app_id).collection('public').document('data').collection('alerts').document(alert_id)
             
-        alert_data = alert_doc.to_dict()
+            # Get the alert data before updating
+            alert_doc = alerts_doc_ref.get()
+            if not alert_doc.exists:
+                return jsonify({"error": "Alert not found"}), 404
+                
+            alert_data = alert_doc.to_dict()
+            
+            # Update the alert
+            alerts_doc_ref.update({
+                'status': new_status,
+                'updated_at': firestore.SERVER_TIMESTAMP,
+                'updated_by': session['uid']
+            })
+        else:
+            alert_data = event_store.get_alert(alert_id)
+            if alert_data is None:
+                return jsonify({"error": "Alert not found"}), 404
         
-        # Update the alert
-        alerts_doc_ref.update({
-            'status': new_status,
-            'updated_at': firestore.SERVER_TIMESTAMP,
-            'updated_by': session['uid']
-        })
+        event_store.update_alert(alert_id, status=new_status, updated_at=time.time(), updated_by=session['uid'])
         
         # Log activity based on status change
         if new_status == 'verified':
@@ -682,6 +1233,17 @@ def update_alert(alert_id):
         print(f"Error updating alert: {e}")
         return jsonify({"error": "Failed to update alert"}), 500
 
+@app.route('/api/evidence/<evidence_id>', methods=['GET'])
+@firebase_authenticated
+def get_evidence(evidence_id):
+    """Serves an alert snapshot or clip. Range requests are honoured so clips can be seeked."""
+    path = evidence_store.path_for(evidence_id)
+    if not path:
+        return jsonify({"error": "Evidence not found"}), 404
+    mimetype = EVIDENCE_MIMETYPES[evidence_id.rsplit('.', 1)[1]]
+    # Content-addressed files never change, so clients may cache them indefinitely
+    return send_file(path, mimetype=mimetype, conditional=True, etag=evidence_id, max_age=31536000)
+
 @app.route('/api/cameras', methods=['GET', 'POST'])
 @firebase_authenticated
 def handle_cameras():
@@ -710,6 +1272,10 @@ def handle_cameras():
             
             if not camera_name or not rtsp_url:
                 return jsonify({"error": "Camera name and RTSP URL are required"}), 400
+            try:
+                settings = parse_camera_settings(data)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
             
             new_camera_doc = cameras_ref.document()
             camera_data = {
@@ -720,6 +1286,7 @@ def handle_cameras():
                 'status': 'active',
                 'is_active': True,
                 'is_default': False,
+                **settings,
                 'timestamp': firestore.SERVER_TIMESTAMP
             }
             new_camera_doc.set(camera_data)
@@ -760,10 +1327,22 @@ def manage_camera(camera_id):
             if 'status' in data:
                 update_data['status'] = data['status']
                 update_data['is_active'] = data['status'] == 'active'
+            try:
+                settings = parse_camera_settings(data)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            update_data.update(settings)
                 
             update_data['updated_at'] = firestore.SERVER_TIMESTAMP
             
             camera_doc_ref.update(update_data)
+            if settings:
+                # The detection loop picks the new settings up without a camera switch
+                camera_data = camera_doc_ref.get().to_dict() or {}
+                settings = {field: camera_data.get(field) for field in CAMERA_SETTINGS}
+                apply_camera_settings(camera_id, settings)
+                if engine_client and engine_client.request('camera_settings', camera_id, settings) is None:
+                    print("Detection engine unavailable; it will load the new camera settings when it restarts")
             
             log_activity(
                 session['uid'], 
@@ -804,45 +1383,141 @@ def manage_camera(camera_id):
 def activate_camera(camera_id):
     if session.get('role') != 'admin':
         return jsonify({"error": "Unauthorized"}), 403
-        
-    global video_stream, current_camera_id
-    
+
     try:
-        app_id = get_app_id()
-        cameras_ref = db.collection('artifacts').document(app_id).collection('public').document('data').collection('cameras')
-        
-        # Get the camera details
-        camera_doc = cameras_ref.document(camera_id).get()
-        if not camera_doc.exists:
-            return jsonify({"error": "Camera not found"}), 404
-            
-        camera_data = camera_doc.to_dict()
-        camera_source = camera_data.get('source') or camera_data.get('rtspUrl', '0')
-        camera_name = camera_data.get('name', 'Unknown Camera')
-        
-        # Switch video stream to new camera
-        with frame_lock:
-            if video_stream:
-                success = video_stream.switch_source(camera_source)
-            else:
-                video_stream = VideoCapture(camera_source)
-                success = video_stream.cap and video_stream.cap.isOpened()
-            
-            if success:
-                current_camera_id = camera_id
-                log_activity(
-                    session['uid'], 
-                    'admin', 
-                    f"Switched to camera: {camera_name}"
-                )
-                return jsonify({"success": True, "message": f"Switched to camera: {camera_name}"})
-            else:
-                return jsonify({"error": "Failed to connect to camera"}), 500
+        if engine_client:
+            result = engine_client.request('activate_camera', camera_id)
+            if result is None:
+                return jsonify({"error": "Detection engine unavailable"}), 503
+        else:
+            result = switch_camera(camera_id)
+
+        if not result['success']:
+            return jsonify({"error": result['error']}), result.get('status', 500)
+        log_activity(
+            session['uid'], 
+            'admin', 
+            f"Switched to camera: {result['camera_name']}"
+        )
+        return jsonify({"success": True, "message": f"Switched to camera: {result['camera_name']}"})
                 
     except Exception as e:
         print(f"Error activating camera: {e}")
         return jsonify({"error": "Failed to activate camera"}), 500
 
+@app.route('/api/cameras/<camera_id>/clip', methods=['GET'])
+@firebase_authenticated
+def export_camera_clip(camera_id):
+    """Exports buffered footage as MP4 or MJPEG. Takes start/end epoch seconds, or 'seconds' back from now."""
+    camera_buffer = frame_buffers.find(camera_id)
+    if camera_buffer is None and not recorder:
+        return jsonify({"error": "No buffered footage for this camera"}), 404
+
+    try:
+        clip_format = request.args.get('format', 'mp4').lower()
+        if clip_format not in ('mp4', 'mjpeg'):
+            return jsonify({"error": "Format must be 'mp4' or 'mjpeg'"}), 400
+        if 'start' in request.args:
+            start = float(request.args['start'])
+            end = float(request.args.get('end', time.time()))
+        else:
+            end = time.time()
+            start = end - float(request.args.get('seconds', 10))
+    except ValueError:
+        return jsonify({"error": "start, end and seconds must be numbers"}), 400
+    if not (math.isfinite(start) and math.isfinite(end)) or end <= start:
+        return jsonify({"error": "start and end must be finite, with start before end"}), 400
+    if end - start > CLIP_MAX_SECONDS:
+        return jsonify({"error": f"Clips are limited to {CLIP_MAX_SECONDS:g} seconds"}), 400
+
+    frames = camera_buffer.frames_between(start, end) if camera_buffer else []
+    if not frames and recorder:
+        # The rewind buffer lives in the detection process; web processes cut clips from the recordings
+        recorded = recorder.iter_frames(camera_id, start, end)
+        first = next(recorded, None)
+        frames = itertools.chain([first], recorded) if first is not None else []
+    if not frames:
+        return jsonify({"error": "No buffered frames in the requested range"}), 404
+
+    if clip_format == 'mp4':
+        frames = list(frames)
+        filename = f"{camera_id}_{int(frames[0][0])}_{int(frames[-1][0])}.mp4"
+        data, mimetype = encode_mp4(frames), 'video/mp4'
+    else:
+        # MJPEG is a plain concatenation of the JPEG frames, so it is streamed as they are read
+        filename = f"{camera_id}_{int(start)}_{int(end)}.mjpeg"
+        data, mimetype = (jpeg for _, jpeg in frames), 'video/x-motion-jpeg'
+    return Response(data, mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename="{filename}"'
+    })
+
+def parse_time_range(default_seconds=60):
+    """Reads start/end epoch seconds from the query string; defaults to the last default_seconds."""
+    end = float(request.args.get('end', time.time()))
+    start = float(request.args.get('start', end - default_seconds))
+    if not (math.isfinite(start) and math.isfinite(end)):
+        raise ValueError("start and end must be finite")
+    return start, end
+
+@app.route('/api/recordings/<camera_id>', methods=['GET'])
+@firebase_authenticated
+def list_recordings(camera_id):
+    """Lists recorded segments and detection metadata for a time range."""
+    if not recorder:
+        return jsonify({"error": "Recording is disabled"}), 404
+    try:
+        start, end = parse_time_range()
+    except ValueError:
+        return jsonify({"error": "start and end must be numbers"}), 400
+    if not 0 <= end - start <= RECORDINGS_MAX_RANGE_SECONDS:
+        return jsonify({"error": f"The range must run forwards and cover at most {RECORDINGS_MAX_RANGE_SECONDS:g} seconds"}), 400
+    return jsonify({
+        'camera_id': camera_id,
+        'start': start,
+        'end': end,
+        'segments': recorder.segments_between(camera_id, start, end),
+        'detections': recorder.detections_between(camera_id, start, end)
+    })
+
+@app.route('/api/recordings/<camera_id>/frame', methods=['GET'])
+@firebase_authenticated
+def get_recorded_frame(camera_id):
+    """Returns the recorded frame at (or just before) time t."""
+    if not recorder:
+        return jsonify({"error": "Recording is disabled"}), 404
+    try:
+        timestamp = float(request.args['t'])
+    except (KeyError, ValueError):
+        return jsonify({"error": "t must be an epoch timestamp"}), 400
+    recorded = recorder.frame_at(camera_id, timestamp)
+    if recorded is None:
+        return jsonify({"error": "No recording at that time"}), 404
+    frame_time, jpeg_bytes = recorded
+    return Response(jpeg_bytes, mimetype='image/jpeg', headers={'X-Frame-Timestamp': str(frame_time)})
+
+@app.route('/api/recordings/<camera_id>/playback', methods=['GET'])
+@firebase_authenticated
+def playback_recording(camera_id):
+    """Streams recorded footage as MJPEG, paced by the recorded timestamps (speed=2 plays twice as fast)."""
+    if not recorder:
+        return jsonify({"error": "Recording is disabled"}), 404
+    try:
+        start, end = parse_time_range()
+        speed = max(float(request.args.get('speed', 1)), 0.1)
+    except ValueError:
+        return jsonify({"error": "start, end and speed must be numbers"}), 400
+
+    def generate_playback():
+        previous_time = None
+        for frame_time, jpeg_bytes in recorder.iter_frames(camera_id, start, end):
+            if previous_time is not None:
+                time.sleep(min(max(frame_time - previous_time, 0) / speed, 1.0))
+            previous_time = frame_time
+            yield (b'--frame\r\n'
+                   b'Content-Type: image/jpeg\r\n\r\n' + jpeg_bytes + b'\r\n')
+
+    return Response(generate_playback(), mimetype='multipart/x-mixed-replace; boundary=frame')
+
 @app.route('/api/threat_config', methods=['GET', 'POST'])
 @firebase_authenticated
 def handle_threat_config():
@@ -857,13 +1532,17 @@ def handle_threat_config():
                 return jsonify({
                     'threat_level': config_data.get('threat_level', current_threat_level),
                     'level': config_data.get('level', current_threat_level),
-                    'monitored_objects': config_data.get('monitored_objects', ['knife', 'gun', 'person'])
+                    'sensitivity': config_data.get('sensitivity', 'Low'),
+                    'monitored_objects': config_data.get('monitored_objects', DEFAULT_MONITORED_OBJECTS),
+                    'rules': config_data.get('rules', {})
                 })
             else:
                 return jsonify({
                     "threat_level": current_threat_level, 
                     "level": current_threat_level,
-                    "monitored_objects": ['knife', 'gun', 'person']
+                    "sensitivity": "Low",
+                    "monitored_objects": DEFAULT_MONITORED_OBJECTS,
+                    "rules": {}
                 })
         except Exception as e:
             return jsonify({"error": str(e)}), 500
@@ -874,23 +1553,32 @@ def handle_threat_config():
         
         try:
             data = request.json
-            threat_level = data.get('threat_level') or data.get('level', 'Low')
-            monitored_objects = data.get('monitored_objects', ['knife', 'gun', 'person'])
+            # The admin's detection sensitivity; threat_level/level are accepted from older clients but
+            # the live threat level itself is set by the detection loop, not here
+            sensitivity = data.get('sensitivity') or data.get('threat_level') or data.get('level') or 'Low'
+            if sensitivity not in THREAT_LEVELS:
+                return jsonify({"error": f"sensitivity must be one of {list(THREAT_LEVELS)}"}), 400
+            monitored_objects = data.get('monitored_objects', DEFAULT_MONITORED_OBJECTS)
             
-            config_doc_ref.set({
-                'threat_level': threat_level,
-                'level': threat_level,
+            config_data = {
+                'sensitivity': sensitivity,
                 'monitored_objects': monitored_objects,
                 'timestamp': firestore.SERVER_TIMESTAMP,
                 'updated_by': session['uid']
-            }, merge=True)
+            }
+            if isinstance(data.get('rules'), dict):
+                config_data['rules'] = data['rules']
+            config_doc_ref.set(config_data, merge=True)
             
-            update_threat_level(threat_level)
+            saved_config = config_doc_ref.get().to_dict()
+            threat_engine.reload(saved_config)
+            if engine_client and engine_client.request('reload_threat_config', saved_config) is None:
+                print("Detection engine unavailable; it will load the new threat config when it restarts")
             
             log_activity(
                 session['uid'], 
                 'admin', 
-                f"Threat config updated. New level: {threat_level}"
+                f"Threat config updated. New sensitivity: {sensitivity}"
             )
             
             return jsonify({"success": True, "message": "Threat config updated."})
@@ -906,6 +1594,14 @@ def get_activity_logs():
         limit = int(request.args.get('limit', 100))
         status_filter = request.args.get('status', 'all')
         
+        if use_local_history():
+            return jsonify(event_store.query_activity_logs(
+                status_filter,
+                optional_float_arg('start'),
+                optional_float_arg('end'),
+                limit
+            ))
+        
         app_id = get_app_id()
         logs_ref = db.collection('artifacts').document(app_id).collection('public').document('data').collection('activity_logs')
         
@@ -929,10 +1625,94 @@ def get_activity_logs():
         
         return jsonify(logs)
         
+    except ValueError:
+        return jsonify({"error": "start, end and limit must be numbers"}), 400
     except Exception as e:
         print(f"Error fetching activity logs: {e}")
         return jsonify({"error": "Failed to fetch activity logs"}), 500
 
+@app.route('/api/detections', methods=['GET'])
+@firebase_authenticated
+def get_detections():
+    """Filtered raw detection history from the local event store."""
+    try:
+        return jsonify(event_store.query_detections(
+            request.args.get('camera_id'),
+            request.args.get('class'),
+            optional_float_arg('start'),
+            optional_float_arg('end'),
+            optional_float_arg('min_confidence'),
+            int(request.args.get('limit', 500))
+        ))
+    except ValueError:
+        return jsonify({"error": "start, end, min_confidence and limit must be numbers"}), 400
+    except Exception as e:
+        print(f"Error fetching detections: {e}")
+        return jsonify({"error": "Failed to fetch detections"}), 500
+
+@app.route('/api/detections/aggregate', methods=['GET'])
+@firebase_authenticated
+def aggregate_detections():
+    """Detection counts grouped by class, camera, hour and/or day, e.g. ?group_by=camera,hour."""
+    group_by = [group for group in request.args.get('group_by', 'class').split(',') if group]
+    if not group_by or any(group not in ('class', 'camera', 'hour', 'day') for group in group_by):
+        return jsonify({"error": "group_by must be a comma-separated list of class, camera, hour, day"}), 400
+    try:
+        return jsonify(event_store.aggregate_detections(
+            group_by,
+            request.args.get('camera_id'),
+            request.args.get('class'),
+            optional_float_arg('start'),
+            optional_float_arg('end')
+        ))
+    except ValueError:
+        return jsonify({"error": "start and end must be numbers"}), 400
+    except Exception as e:
+        print(f"Error aggregating detections: {e}")
+        return jsonify({"error": "Failed to aggregate detections"}), 500
+
+@app.route('/api/analytics', methods=['GET'])
+@firebase_authenticated
+def get_analytics():
+    """Hourly detection counts per class over the last ?hours= hours, for one camera or all cameras."""
+    try:
+        hours = int(request.args.get('hours', 24))
+    except ValueError:
+        return jsonify({"error": "hours must be an integer"}), 400
+    analytics.refresh()
+    return jsonify({
+        'cameras': analytics.cameras(),
+        'hourly': analytics.hourly_counts(request.args.get('camera_id'), request.args.get('class'), max(hours, 1))
+    })
+
+@app.route('/api/analytics/heatmap/<camera_id>', methods=['GET'])
+@firebase_authenticated
+def get_analytics_heatmap(camera_id):
+    """Occupancy heatmap of a camera over the last ?days= days, as a JSON grid or a PNG (?format=png)."""
+    try:
+        days = int(request.args.get('days', 1))
+    except ValueError:
+        return jsonify({"error": "days must be an integer"}), 400
+    analytics.refresh()
+    grid = analytics.heatmap(camera_id, request.args.get('class'), max(days, 1))
+
+    if request.args.get('format') == 'png':
+        peak = grid.max()
+        scaled = (grid / peak * 255).astype(np.uint8) if peak > 0 else np.zeros(grid.shape, dtype=np.uint8)
+        scaled = cv2.resize(scaled, (640, 480), interpolation=cv2.INTER_LINEAR)
+        ret, buffer = cv2.imencode('.png', cv2.applyColorMap(scaled, cv2.COLORMAP_JET))
+        if not ret:
+            return jsonify({"error": "Failed to render heatmap"}), 500
+        return Response(buffer.tobytes(), mimetype='image/png')
+
+    return jsonify({
+        'camera_id': camera_id,
+        'rows': grid.shape[0],
+        'cols': grid.shape[1],
+        'max': float(grid.max()),
+        'grid': grid.astype(int).tolist()
+    })
+
 @app.route('/api/recent_alerts', methods=['GET'])
 @firebase_authenticated
 def get_recent_alerts():
@@ -1055,78 +1835,172 @@ def manage_user(user_id):
 @firebase_authenticated
 def video_feed():
     try:
-        global video_stream, current_camera_id
-        
-        # If no current camera, get the default one
-        if not current_camera_id:
-            app_id = get_app_id()
-            cameras_ref = db.collection('artifacts').document(app_id).collection('public').document('data').collection('cameras')
-            
-            # Try to get default camera first
-            for doc in cameras_ref.where('is_default', '==', True).limit(1).stream():
-                current_camera_id = doc.id
-                camera_source = doc.to_dict().get('source') or doc.to_dict().get('rtspUrl', '0')
-                break
-            else:
-                # Get first active camera
-                for doc in cameras_ref.where('status', '==', 'active').limit(1).stream():
-                    current_camera_id = doc.id
-                    camera_source = doc.to_dict().get('source') or doc.to_dict().get('rtspUrl', '0')
-                    break
-                else:
-                    return "No active cameras available", 503
-        else:
-            # Get current camera source
-            app_id = get_app_id()
-            camera_doc = db.collection('artifacts').document(app_id).collection('public').document('data').collection('cameras').document(current_camera_id).get()
-            if camera_doc.exists:
-                camera_data = camera_doc.to_dict()
-                camera_source = camera_data.get('source') or camera_data.get('rtspUrl', '0')
-            else:
-                return "Current camera not found", 404
-
-        # Initialize or check video stream
-        with frame_lock:
-            if video_stream is None:
-                video_stream = VideoCapture(camera_source)
-            elif not video_stream.cap or not video_stream.cap.isOpened():
-                video_stream.connect()
-        
-        if video_stream and video_stream.cap and video_stream.cap.isOpened():
-            return Response(generate_frames(), mimetype='multipart/x-mixed-replace; boundary=frame')
-        else:
-            update_system_status("offline")
-            return "Camera not available", 503
+        stream_error = ensure_video_stream()
+        if stream_error:
+            return stream_error
+        return Response(stream_frames(), mimetype='multipart/x-mixed-replace; boundary=frame')
 
     except Exception as e:
         print(f"Error in video feed: {e}")
         update_system_status("offline")
         return "Error streaming video", 500
 
+@app.route('/api/admin/profiling', methods=['GET', 'POST'])
+@firebase_authenticated
+def handle_profiling():
+    """Slow-frame tracing: GET returns the slowest traced frames, POST toggles/resizes/clears tracing."""
+    if session.get('role') != 'admin':
+        return jsonify({"error": "Unauthorized"}), 403
+
+    enabled = capacity = None
+    clear = False
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        try:
+            capacity = int(data['capacity']) if 'capacity' in data else None
+        except (TypeError, ValueError):
+            return jsonify({"error": "capacity must be an integer"}), 400
+        if capacity is not None and capacity < 1:
+            return jsonify({"error": "capacity must be at least 1"}), 400
+        enabled = bool(data['enabled']) if 'enabled' in data else None
+        clear = bool(data.get('clear'))
+
+    # Frames are traced wherever detection runs
+    if engine_client:
+        state = engine_client.request('tracing', enabled, capacity, clear)
+        if state is None:
+            return jsonify({"error": "Detection engine unavailable"}), 503
+    else:
+        state = tracing_state(enabled, capacity, clear)
+    if request.method == 'POST':
+        log_activity(session['uid'], session.get('role'), f"Frame tracing {'enabled' if state['enabled'] else 'disabled'}")
+    return jsonify(state)
+
+@app.route('/api/admin/profile', methods=['GET'])
+@firebase_authenticated
+def download_profile():
+    """Samples the running process for ?seconds= (default 10) and downloads collapsed stacks for flamegraph tools."""
+    if session.get('role') != 'admin':
+        return jsonify({"error": "Unauthorized"}), 403
+    try:
+        seconds = float(request.args.get('seconds', 10))
+        interval = float(request.args.get('interval_ms', 5)) / 1000
+    except ValueError:
+        return jsonify({"error": "seconds and interval_ms must be numbers"}), 400
+
+    # Profiles the detection engine when there is one, unless ?target=web asks for this process
+    interval = max(interval, 0.001)
+    if engine_client and request.args.get('target') != 'web':
+        if not engine_client.connected:
+            return jsonify({"error": "Detection engine unavailable"}), 503
+        result = engine_client.request('profile', seconds, interval, timeout=min(seconds, SamplingProfiler.MAX_SECONDS) + 15)
+    else:
+        result = sampling_profiler.profile(seconds, interval)
+    if result is None:
+        return jsonify({"error": "A profile is already running"}), 409
+    collapsed, samples = result
+    filename = f"profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}.folded"
+    return Response(collapsed, mimetype='text/plain', headers={
+        'Content-Disposition': f'attachment; filename={filename}',
+        'X-Profile-Samples': str(samples)
+    })
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus scrape endpoint."""
+    return Response(metrics.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+def collect_health():
+    """Health snapshot of this process; the detection engine also publishes it to web processes."""
+    system_health = {
+        'status': 'healthy',
+        'timestamp': datetime.now().isoformat(),
+        'video_stream_active': video_stream is not None and video_stream.cap is not None and video_stream.cap.isOpened() if video_stream else False,
+        'model_loaded': model is not None,
+        'detector_backend': model.backend if model else None,
+        'firebase_connected': db is not None,
+        'current_camera_id': current_camera_id,
+        'system_status': system_status,
+        'threat_level': current_threat_level,
+        'total_detections': total_detections,
+        'last_object_detected': last_object_detected,
+        'last_frame_detections': last_frame_detections.to_json() if last_frame_detections is not None else None,
+        'alert_cooldowns': alert_cooldowns.stats(),
+        'evidence_store': evidence_store.stats(),
+        'evidence_pending': evidence_writer.pending(),
+        'frame_buffers': frame_buffers.stats(),
+        'recorder': recorder.stats() if recorder else None,
+        'event_store': event_store.stats(),
+        'analytics_cameras': len(analytics.cameras()),
+        'frame_tracing': slow_frames.stats(),
+        'tracking': tracker.stats() if TRACKING_ENABLED else None,
+        'regions': region_detector.stats(),
+        'resolution': resolution_policy.stats(),
+        'face_identity': face_identifier.stats(),
+        'live': True,
+        'ready': startup.ready(),
+        'startup': startup.status()
+    }
+    
+    # Check if any critical components are down
+    if not system_health['model_loaded'] or not system_health['firebase_connected']:
+        system_health['status'] = 'degraded'
+    
+    if not system_health['video_stream_active']:
+        system_health['status'] = 'offline'
+
+    if any(component['state'] == 'loading' for component in system_health['startup']['components'].values()):
+        system_health['status'] = 'starting'
+    return system_health
+
+def is_ready():
+    """Readiness: this process has finished loading and, for web processes, the engine is ready too."""
+    if not startup.ready():
+        return False
+    if engine_client:
+        return engine_client.connected and bool(engine_client.status and engine_client.status.get('ready'))
+    return True
+
+@app.route('/api/health/live', methods=['GET'])
+def liveness_check():
+    """Liveness probe: the process is up and serving requests, even while components still load."""
+    return jsonify({'live': True, 'timestamp': datetime.now().isoformat()})
+
+@app.route('/api/health/ready', methods=['GET'])
+def readiness_check():
+    """Readiness probe: 200 once models and Firestore are initialized, 503 until then."""
+    ready = is_ready()
+    return jsonify({'ready': ready, 'startup': startup.status()}), 200 if ready else 503
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint to monitor system status."""
     try:
-        system_health = {
-            'status': 'healthy',
-            'timestamp': datetime.now().isoformat(),
-            'video_stream_active': video_stream is not None and video_stream.cap is not None and video_stream.cap.isOpened() if video_stream else False,
-            'model_loaded': model is not None,
-            'firebase_connected': db is not None,
-            'current_camera_id': current_camera_id,
-            'system_status': system_status,
-            'threat_level': current_threat_level,
-            'total_detections': total_detections,
-            'last_object_detected': last_object_detected
-        }
-        
-        # Check if any critical components are down
-        if not system_health['model_loaded'] or not system_health['firebase_connected']:
-            system_health['status'] = 'degraded'
-        
-        if not system_health['video_stream_active']:
+        if not engine_client:
+            return jsonify(collect_health())
+
+        # Web process: detection state comes from the engine's last published snapshot
+        if engine_client.status is None:
+            return jsonify({
+                'status': 'offline',
+                'timestamp': datetime.now().isoformat(),
+                'process_role': PROCESS_ROLE,
+                'engine_connected': engine_client.connected,
+                'firebase_connected': db is not None,
+                'live': True,
+                'ready': False,
+                'startup': startup.status()
+            })
+        system_health = dict(engine_client.status)
+        system_health['timestamp'] = datetime.now().isoformat()
+        system_health['process_role'] = PROCESS_ROLE
+        system_health['engine_startup'] = system_health.pop('startup', None)
+        system_health['startup'] = startup.status()
+        system_health['ready'] = is_ready()
+        system_health['engine_connected'] = engine_client.connected
+        system_health['engine_status_age_seconds'] = round(engine_client.status_age(), 1)
+        if not engine_client.connected:
             system_health['status'] = 'offline'
-            
         return jsonify(system_health)
         
     except Exception as e:
@@ -1137,19 +2011,8 @@ def health_check():
         }), 500
 
 if __name__ == '__main__':
-    # Initialize video stream with default camera
-    try:
-        if current_camera_id:
-            print(f"Initializing video stream with camera ID: {current_camera_id}")
-            video_stream = VideoCapture('0')  # Start with default webcam
-            update_system_status("running")
-        else:
-            print("No camera found, video stream will be initialized on first request")
-            update_system_status("offline")
-    except Exception as e:
-        print(f"Error initializing video stream: {e}")
-        update_system_status("offline")
-    
+    # The default camera is registered by the background 'firestore' startup task; the video
+    # stream opens on the first request for it (ensure_video_stream)
     print("Flask surveillance system is starting...")
     print("Access the system at: http://localhost:5000")
     app.run(host='0.0.0.0', port=5000, debug=True, threaded=True)
\ No newline at end of file
@@ -0,0 +1,108 @@
+import os
+import asyncio
+from http.cookies import SimpleCookie
+from asgiref.wsgi import WsgiToAsgi
+
+# Production web entry point (requires uvicorn and asgiref):
+#
+#   uvicorn asgi:application --host 0.0.0.0 --port 5000
+#
+# /video_feed is served here as an async stream fed by the detection engine process
+# (detection_engine.py), so an idle viewer costs a coroutine rather than a worker thread.
+# Every other route is the Flask app, run by asgiref's WSGI adapter in its thread pool.
+os.environ['SURVEILLANCE_ROLE'] = 'web'
+
+import app as surveillance
+from common.metrics import MetricsRegistry, PROMETHEUS_CONTENT_TYPE  # on sys.path once app is imported
+
+flask_application = WsgiToAsgi(surveillance.app)
+engine_client = surveillance.engine_client
+
+web_metrics = MetricsRegistry()
+metric_stream_clients = web_metrics.gauge('surveillance_web_stream_clients', 'Open /video_feed streams on this web process.')
+web_metrics.callback('surveillance_engine_connected', 'Whether this web process is connected to the detection engine.',
+                     lambda: int(engine_client.connected))
+
+
+def session_from_scope(scope):
+    """Reads the Flask session cookie from an ASGI request; returns {} if missing or invalid."""
+    cookie_header = b'; '.join(value for name, value in scope['headers'] if name == b'cookie').decode('latin-1')
+    cookie = SimpleCookie(cookie_header).get(surveillance.app.config['SESSION_COOKIE_NAME'])
+    if cookie is None:
+        return {}
+    serializer = surveillance.app.session_interface.get_signing_serializer(surveillance.app)
+    try:
+        return serializer.loads(cookie.value, max_age=int(surveillance.app.permanent_session_lifetime.total_seconds()))
+    except Exception:
+        return {}
+
+
+async def send_response(send, status, body, content_type=b'text/plain; charset=utf-8', headers=()):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', content_type), *headers]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def video_feed(scope, receive, send):
+    if 'uid' not in session_from_scope(scope):
+        await send_response(send, 302, b'', headers=[(b'location', b'/')])
+        return
+
+    frames = engine_client.frames
+    if frames._loop is None:
+        frames.bind_loop(asyncio.get_running_loop())
+
+    await send({'type': 'http.response.start', 'status': 200, 'headers': [
+        (b'content-type', b'multipart/x-mixed-replace; boundary=frame'),
+        (b'cache-control', b'no-cache'),
+    ]})
+    metric_stream_clients.inc()
+    disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+    # Start from the newest frame; a viewer that falls behind skips straight to the latest one
+    sequence = frames.sequence - 1 if frames.frame else 0
+    try:
+        while True:
+            next_frame = asyncio.ensure_future(frames.next_frame(sequence))
+            done, _ = await asyncio.wait({next_frame, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            if disconnected in done:
+                next_frame.cancel()
+                break
+            sequence, (camera_id, jpeg_bytes, timestamp) = next_frame.result()
+            await send({
+                'type': 'http.response.body',
+                'body': b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + jpeg_bytes + b'\r\n',
+                'more_body': True,
+            })
+    finally:
+        disconnected.cancel()
+        metric_stream_clients.dec()
+
+
+async def metrics_endpoint(scope, receive, send):
+    """Engine metrics as last published, plus this web process's own."""
+    body = engine_client.metrics_text + web_metrics.render()
+    await send_response(send, 200, body.encode(), PROMETHEUS_CONTENT_TYPE.encode())
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                engine_client.frames.bind_loop(asyncio.get_running_loop())
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    if scope['type'] == 'http' and scope['path'] == '/video_feed':
+        await video_feed(scope, receive, send)
+    elif scope['type'] == 'http' and scope['path'] == '/metrics':
+        await metrics_endpoint(scope, receive, send)
+    else:
+        await flask_application(scope, receive, send)
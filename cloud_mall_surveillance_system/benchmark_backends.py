@@ -0,0 +1,144 @@
+import os
+import cv2
+import json
+import time
+import argparse
+import numpy as np
+from detector_backends import load_detector, SUPPORTED_BACKENDS
+from tracker import greedy_match
+
+# Parity-and-speed benchmark for the detector backends.
+# Every backend runs over the same CPU test images; detections are matched against the
+# PyTorch reference to report the accuracy delta next to the frames-per-second gain.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_MODEL_PATH = os.path.join(BASE_DIR, 'models', 'best.pt')
+DEFAULT_IMAGES_DIR = os.path.join(
+    BASE_DIR, 'model training', 'yolo_prediction_results-20250811T055302Z-1-001',
+    'yolo_prediction_results', 'predict'
+)
+IOU_MATCH_THRESHOLD = 0.5
+
+
+def load_images(images_dir):
+    images = []
+    for name in sorted(os.listdir(images_dir)):
+        if name.lower().endswith(('.png', '.jpg', '.jpeg')):
+            img = cv2.imread(os.path.join(images_dir, name))
+            if img is not None:
+                images.append(img)
+    return images
+
+
+def box_iou(a, b):
+    """Pairwise IoU between two (N, 4) and (M, 4) xyxy arrays."""
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def run_backend(detector, images, conf):
+    """Runs the detector over every image and returns (detections per image, per-image latencies)."""
+    detector(images[0], conf=conf)  # warm-up, excluded from timing
+    detections = []
+    latencies = []
+    for img in images:
+        start = time.perf_counter()
+        boxes = detector(img, conf=conf)[0].boxes
+        latencies.append(time.perf_counter() - start)
+        detections.append((
+            boxes.cls.cpu().numpy().astype(int),
+            boxes.conf.cpu().numpy(),
+            boxes.xyxy.cpu().numpy(),
+        ))
+    return detections, np.array(latencies)
+
+
+def compare_detections(reference, candidate):
+    """Greedy same-class IoU matching of candidate detections against the reference backend."""
+    matched = 0
+    total_ref = 0
+    total_cand = 0
+    conf_deltas = []
+    ious = []
+    for (ref_cls, ref_conf, ref_xyxy), (cand_cls, cand_conf, cand_xyxy) in zip(reference, candidate):
+        total_ref += len(ref_cls)
+        total_cand += len(cand_cls)
+        if not len(ref_cls) or not len(cand_cls):
+            continue
+        iou = box_iou(ref_xyxy, cand_xyxy)
+        iou[ref_cls[:, None] != cand_cls[None, :]] = 0
+        # Highest-IoU pairs first, so a box whose best candidate is taken can still match another
+        for i, j in greedy_match(iou, IOU_MATCH_THRESHOLD):
+            matched += 1
+            conf_deltas.append(abs(float(ref_conf[i]) - float(cand_conf[j])))
+            ious.append(float(iou[i, j]))
+    return {
+        'reference_detections': total_ref,
+        'candidate_detections': total_cand,
+        'recall_vs_reference': matched / total_ref if total_ref else 1.0,
+        'precision_vs_reference': matched / total_cand if total_cand else 1.0,
+        'mean_conf_delta': float(np.mean(conf_deltas)) if conf_deltas else 0.0,
+        'mean_matched_iou': float(np.mean(ious)) if ious else 1.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare detector backends for accuracy parity and CPU speed.")
+    parser.add_argument('--model', default=DEFAULT_MODEL_PATH)
+    parser.add_argument('--images', default=DEFAULT_IMAGES_DIR)
+    parser.add_argument('--backends', nargs='+', default=['pytorch', 'onnx', 'openvino'], choices=SUPPORTED_BACKENDS)
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--conf', type=float, default=0.25)
+    parser.add_argument('--output', help="Optional path to save the results as JSON")
+    args = parser.parse_args()
+
+    images = load_images(args.images)
+    if not images:
+        print(f"No test images found in {args.images}")
+        return
+    print(f"Benchmarking {len(images)} images from {args.images}")
+
+    backends = ['pytorch'] + [b for b in args.backends if b != 'pytorch']
+    reference = None
+    reference_fps = None
+    report = {}
+    for backend in backends:
+        detector = load_detector(args.model, backend, args.imgsz)
+        if detector.backend != backend:
+            print(f"Skipping {backend}: backend unavailable")
+            continue
+        detections, latencies = run_backend(detector, images, args.conf)
+        fps = len(latencies) / latencies.sum()
+        entry = {
+            'fps': fps,
+            'latency_ms_p50': float(np.percentile(latencies, 50) * 1000),
+            'latency_ms_p95': float(np.percentile(latencies, 95) * 1000),
+        }
+        if reference is None:
+            reference, reference_fps = detections, fps
+        else:
+            entry.update(compare_detections(reference, detections))
+            entry['speedup_vs_pytorch'] = fps / reference_fps
+        report[backend] = entry
+
+    for backend, entry in report.items():
+        line = f"{backend:>14}: {entry['fps']:6.1f} FPS  p50 {entry['latency_ms_p50']:6.1f} ms  p95 {entry['latency_ms_p95']:6.1f} ms"
+        if 'speedup_vs_pytorch' in entry:
+            line += (f"  x{entry['speedup_vs_pytorch']:.2f}  recall {entry['recall_vs_reference']:.3f}"
+                     f"  precision {entry['precision_vs_reference']:.3f}  conf delta {entry['mean_conf_delta']:.4f}")
+        print(line)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
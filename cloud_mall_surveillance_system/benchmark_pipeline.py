@@ -0,0 +1,494 @@
+import os
+import sys
+import cv2
+import json
+import time
+import uuid
+import shutil
+import argparse
+import importlib.util
+import platform
+import tempfile
+import subprocess
+import numpy as np
+from collections import Counter
+from detector_backends import SUPPORTED_BACKENDS
+from threat_rules import ThreatRulesEngine
+from alerting import AlertDebouncer
+from tracker import ObjectTracker
+from detections import Detections
+from frame_buffer import FrameRingBuffer
+from event_store import DetectionEventStore
+from recorder import SegmentRecorder
+from regions import RegionDetector, parse_roi, parse_tiling
+from resolution import ResolutionPolicy, imgsz_levels
+from face_identity import FaceIdentifier
+import frame_stages
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.face_quality import QualityGate
+from common.profiling import FrameTrace
+
+# Offline benchmark of the two hot paths: the mall detector's per-frame loop (detection_frames)
+# and the face recognition request (recognize_face). Frames are replayed from bundled images,
+# a video file or synthetic noise; Firestore and the camera are replaced by local fakes, so runs
+# are reproducible and comparable between commits (--output to save, --compare to diff).
+#
+# The detection loop calls the app's own stage functions (frame_stages.py) and runs the same
+# components: ROI/tiling (--roi/--tiling, camera document JSON), the adaptive input size
+# (--fixed-imgsz to turn it off), tracking and, with --identify, face identification. The
+# recognition run imports FaceRecognitionSystem/app.py and calls its recognize_face(), so it
+# uses the server's tolerances and quality gate.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BASE_DIR)
+DEFAULT_MODEL_PATH = os.path.join(BASE_DIR, 'models', 'best.pt')
+DEFAULT_IMAGES_DIR = os.path.join(
+    BASE_DIR, 'model training', 'yolo_prediction_results-20250811T055302Z-1-001',
+    'yolo_prediction_results', 'predict'
+)
+FACE_SYSTEM_DIR = os.path.join(REPO_DIR, 'FaceRecognitionSystem')
+FACE_IDENTIFY_MIN_SIZE = int(os.environ.get('FACE_IDENTIFY_MIN_SIZE', 40))
+
+# Named like the app's surveillance_frame_stage_seconds stages
+DETECTION_STAGES = ['decode', 'inference', 'annotate', 'track', 'identify', 'rules', 'firestore_write', 'encode', 'persist']
+RECOGNITION_STAGES = ['decode', 'detect', 'quality', 'landmarks', 'descriptor', 'match']
+
+
+# --- Local Fakes ---
+class FakeDocument:
+    def __init__(self, store, path):
+        self._store = store
+        self.path = path
+        self.id = path.rsplit('/', 1)[-1]
+
+    def collection(self, name):
+        return FakeCollection(self._store, f"{self.path}/{name}")
+
+    def set(self, data):
+        self._store._write(self.path, dict(data))
+
+    def update(self, data):
+        self._store._write(self.path, {**self._store.docs.get(self.path, {}), **data})
+
+    def get(self):
+        return FakeSnapshot(self.id, self._store.docs.get(self.path))
+
+
+class FakeCollection:
+    def __init__(self, store, path):
+        self._store = store
+        self.path = path
+
+    def document(self, doc_id=None):
+        return FakeDocument(self._store, f"{self.path}/{doc_id or uuid.uuid4().hex}")
+
+    def add(self, data):
+        doc = self.document()
+        doc.set(data)
+        return None, doc
+
+
+class FakeSnapshot:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+
+class FakeFirestore:
+    """In-memory stand-in for the Firestore client with an optional simulated round-trip latency."""
+    def __init__(self, write_latency=0.0):
+        self.docs = {}
+        self.writes = 0
+        self.write_latency = write_latency
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+    def _write(self, path, data):
+        if self.write_latency:
+            time.sleep(self.write_latency)
+        self.docs[path] = data
+        self.writes += 1
+
+
+class FakeCamera:
+    """Replays encoded frames like a network camera: each get_frame() hands back JPEG bytes to decode."""
+    def __init__(self, encoded_frames, loops=1):
+        self.encoded_frames = encoded_frames
+        self.loops = loops
+
+    def __iter__(self):
+        for _ in range(self.loops):
+            yield from self.encoded_frames
+
+
+def encode_jpeg(image, quality=90):
+    return cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes()
+
+
+def load_source_frames(args):
+    """Returns the replayed frames as JPEG bytes, from a video, synthetic noise or an image folder."""
+    if args.video:
+        cap = cv2.VideoCapture(args.video)
+        frames = []
+        while len(frames) < args.max_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(encode_jpeg(frame))
+        cap.release()
+        return frames, args.video
+    if args.synthetic:
+        rng = np.random.default_rng(0)
+        frames = []
+        for _ in range(args.synthetic):
+            image = rng.integers(0, 255, (args.height, args.width, 3), dtype=np.uint8)
+            frames.append(encode_jpeg(cv2.GaussianBlur(image, (9, 9), 0)))
+        return frames, f"synthetic {args.width}x{args.height}"
+    frames = []
+    for name in sorted(os.listdir(args.images)):
+        if name.lower().endswith(('.png', '.jpg', '.jpeg')):
+            with open(os.path.join(args.images, name), 'rb') as f:
+                frames.append(f.read())
+    return frames[:args.max_frames], args.images
+
+
+def summarize(timings, stages):
+    summary = {}
+    for stage in stages + ['total']:
+        values = np.array(timings[stage]) * 1000
+        if not len(values):
+            continue
+        summary[stage] = {
+            'mean_ms': float(values.mean()),
+            'p50_ms': float(np.percentile(values, 50)),
+            'p95_ms': float(np.percentile(values, 95)),
+            'p99_ms': float(np.percentile(values, 99)),
+        }
+    return summary
+
+
+# --- Detection Hot Path ---
+def lap(timings, stage, since):
+    """Records the time since `since` for one stage and returns the current perf_counter (as app.observe_stage)."""
+    now = time.perf_counter()
+    timings[stage].append(now - since)
+    return now
+
+
+def bench_detection(args, work_dir):
+    frames, source = load_source_frames(args)
+    if not frames:
+        print(f"No frames to replay from {source}")
+        return None
+
+    model = None
+    if not args.no_model:
+        # Imported here so --no-model runs without ultralytics installed
+        from detector_backends import load_detector
+        model = load_detector(args.model, args.backend, args.imgsz)
+    names = model.names if model else {}
+    db = FakeFirestore(args.firestore_latency_ms / 1000)
+    alerts_ref = db.collection('artifacts').document('bench').collection('public').document('data').collection('alerts')
+    event_store = DetectionEventStore(os.path.join(work_dir, 'events.db'))
+    recorder = SegmentRecorder(os.path.join(work_dir, 'recordings'), 60, 1024 ** 3)
+    frame_buffer = FrameRingBuffer(30, 64 * 1024 ** 2, 30 * 30)
+    threat_engine = ThreatRulesEngine(names)
+    debouncer = AlertDebouncer(3, 5)
+    tracker = ObjectTracker(class_names=names)
+    camera_id = 'bench-camera'
+    region_detector = RegionDetector()
+    region_detector.configure(camera_id, parse_roi(json.loads(args.roi)) if args.roi else None,
+                              parse_tiling(json.loads(args.tiling)) if args.tiling else None)
+    resolution_policy = ResolutionPolicy(
+        imgsz_levels(args.imgsz), target_fps=args.target_fps,
+        enabled=not args.fixed_imgsz and model is not None and model.dynamic,
+    )
+    face_identifier = None
+    if args.identify:
+        face_identifier = FaceIdentifier(
+            os.path.join(FACE_SYSTEM_DIR, 'models'), os.path.join(FACE_SYSTEM_DIR, 'encodings.pkl'),
+            os.path.join(FACE_SYSTEM_DIR, 'recognition_config.json'),
+            min_face_size=FACE_IDENTIFY_MIN_SIZE, quality_gate=face_quality_gate(args, FACE_IDENTIFY_MIN_SIZE),
+        )
+        try:
+            face_identifier.load()
+        except Exception as e:
+            print(f"Detection: face identification skipped ({e})")
+            face_identifier = None
+
+    # Warm-up, excluded from timing
+    if model:
+        model(cv2.imdecode(np.frombuffer(frames[0], np.uint8), cv2.IMREAD_COLOR))
+
+    print(f"Detection: replaying {len(frames)} frames x {args.loops} from {source} "
+          f"(model: {model.backend if model else 'none'})")
+    timings = {stage: [] for stage in DETECTION_STAGES + ['total']}
+    detections_total = 0
+    imgsz_frames = Counter()
+    threat_level = 'Low'
+    start_all = time.perf_counter()
+    for jpeg in FakeCamera(frames, args.loops):
+        frame_start = time.perf_counter()
+        frame = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            continue
+        stage_start = lap(timings, 'decode', frame_start)
+
+        detections = Detections.empty(names)
+        annotated = frame
+        if model:
+            imgsz = resolution_policy.imgsz(camera_id, threat_level)
+            imgsz_frames[imgsz] += 1
+            region_plan = region_detector.plan(camera_id, frame.shape)
+            output = frame_stages.infer(model, frame, region_detector, region_plan, imgsz)
+            resolution_policy.observe(camera_id, time.perf_counter() - stage_start, threat_level)
+            stage_start = lap(timings, 'inference', stage_start)
+            detections, annotated = frame_stages.annotate(frame, output, model.names, region_plan)
+            stage_start = lap(timings, 'annotate', stage_start)
+
+        now = time.time()
+        cls, conf, xyxy = detections.cls, detections.conf, detections.xyxy
+        detections.track_ids = tracker.update(camera_id, cls, conf, xyxy, frame.shape, now)
+        frame_stages.draw_track_ids(annotated, detections.track_ids, xyxy)
+        stage_start = lap(timings, 'track', stage_start)
+
+        class_names = detections.class_names()
+        if face_identifier and face_identifier.wants(class_names):
+            frame_stages.identify_faces(face_identifier, frame, detections, class_names, annotated)
+            stage_start = lap(timings, 'identify', stage_start)
+
+        evaluation = threat_engine.evaluate(camera_id, cls, conf, xyxy, now)
+        threat_level = evaluation.threat_level
+        stage_start = lap(timings, 'rules', stage_start)
+
+        started, ongoing, ended = debouncer.update(camera_id, frame_stages.alert_confidences(evaluation, detections))
+        for incident in started:
+            _, doc = alerts_ref.add({'camera_id': camera_id, 'detections': [incident.class_name], 'status': 'unverified'})
+            incident.alert_id = doc.id
+        for incident in ongoing + ended:
+            if incident.alert_id:
+                alerts_ref.document(incident.alert_id).update({'frame_hits': incident.frame_hits})
+        stage_start = lap(timings, 'firestore_write', stage_start)
+
+        ok, buffer = cv2.imencode('.jpg', annotated, [cv2.IMWRITE_JPEG_QUALITY, 85])
+        encoded = buffer.tobytes()
+        stage_start = lap(timings, 'encode', stage_start)
+
+        detections_total += len(detections)
+        event_store.record_detections(camera_id, now, detections)
+        frame_buffer.append(encoded, now)
+        recorder.record(camera_id, encoded, now, detections)
+        stage_start = lap(timings, 'persist', stage_start)
+        timings['total'].append(stage_start - frame_start)
+    wall = time.perf_counter() - start_all
+    event_store.flush()
+    recorder.flush()
+
+    frame_count = len(timings['total'])
+    if not frame_count:
+        print(f"Detection: none of the frames from {source} could be decoded")
+        return None
+    return {
+        'source': source,
+        'frames': frame_count,
+        'backend': model.backend if model else None,
+        'fps': frame_count / wall,
+        'detections': detections_total,
+        'firestore_writes': db.writes,
+        'recorder_dropped': recorder.dropped,
+        'imgsz_frames': {str(imgsz): count for imgsz, count in sorted(imgsz_frames.items(), reverse=True)},
+        'regions': region_detector.stats(),
+        'face_identity': face_identifier.stats() if face_identifier else None,
+        'stages': summarize(timings, DETECTION_STAGES),
+    }
+
+
+# --- Recognition Hot Path ---
+def face_quality_gate(args, min_face_size):
+    """The quality gate with the apps' settings (same environment variables and defaults)."""
+    return QualityGate(
+        min_face_size=min_face_size,
+        min_sharpness=float(os.environ.get('FACE_MIN_SHARPNESS', 40)),
+        max_yaw_degrees=float(os.environ.get('FACE_MAX_YAW', 35)),
+        enabled=not args.no_quality_gate and os.environ.get('FACE_QUALITY_GATE', '1') == '1',
+    )
+
+
+def load_face_recognition_app():
+    """Imports FaceRecognitionSystem/app.py under its own module name (this folder has an app.py too)."""
+    spec = importlib.util.spec_from_file_location('face_recognition_app', os.path.join(FACE_SYSTEM_DIR, 'app.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def bench_recognition(args):
+    try:
+        face_app = load_face_recognition_app()
+    except ImportError as e:
+        print(f"Recognition: skipped ({e})")
+        return None
+    # The server's own models, gallery, tolerances (recognition_config.json) and quality gate
+    for component in ('models', 'encodings'):
+        if not face_app.startup.wait(component):
+            print(f"Recognition: skipped ({component}: {face_app.startup.status()['components'][component]['error']})")
+            return None
+    if args.no_quality_gate:
+        face_app.quality_gate.enabled = False
+    face_app.last_alarm_time = float('inf')  # no siren for the unknown faces while benchmarking
+
+    samples = []
+    for person in sorted(os.listdir(args.faces)):
+        person_dir = os.path.join(args.faces, person)
+        if not os.path.isdir(person_dir):
+            continue
+        for name in sorted(os.listdir(person_dir)):
+            if name.lower().endswith(('.png', '.jpg', '.jpeg')):
+                with open(os.path.join(person_dir, name), 'rb') as f:
+                    samples.append((person, f.read()))
+    if not samples:
+        print(f"Recognition: no images found in {args.faces}")
+        return None
+
+    print(f"Recognition: replaying {len(samples)} images x {args.loops} from {args.faces}")
+    timings = {stage: [] for stage in RECOGNITION_STAGES + ['total']}
+    faces_total = 0
+    unverified = 0
+    correct = 0
+    start_all = time.perf_counter()
+    for _ in range(args.loops):
+        for person, jpeg in samples:
+            # process_frame()'s decode, then the server's recognize_face() with a trace for its stages
+            request_start = time.perf_counter()
+            frame = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+            if frame is None:
+                continue
+            rgb_image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            trace = FrameTrace(person)
+            trace.span('decode', time.perf_counter() - request_start)
+            results, _ = face_app.recognize_face(rgb_image, trace)
+            timings['total'].append(time.perf_counter() - request_start)
+            for stage, seconds in trace.spans:
+                timings[stage].append(seconds)
+
+            faces_total += len(results)
+            unverified += sum('quality' in result for result in results)
+            correct += int(bool(results) and results[0]['name'].lower() == person.lower())
+    wall = time.perf_counter() - start_all
+
+    request_count = len(timings['total'])
+    if not request_count:
+        print(f"Recognition: none of the images in {args.faces} could be decoded")
+        return None
+    return {
+        'source': args.faces,
+        'requests': request_count,
+        'fps': request_count / wall,
+        'faces': faces_total,
+        'unverified_faces': unverified,
+        'top1_name_matches': correct / request_count,
+        'tolerance': face_app.TOLERANCE,
+        'quality_gate': face_app.quality_gate.stats(),
+        'stages': summarize(timings, RECOGNITION_STAGES),
+    }
+
+
+# --- Reporting ---
+def print_report(name, result):
+    print(f"\n{name}: {result['fps']:.1f} FPS end-to-end")
+    for stage, stats in result['stages'].items():
+        print(f"  {stage:>15}: mean {stats['mean_ms']:7.2f} ms  p50 {stats['p50_ms']:7.2f} ms  "
+              f"p95 {stats['p95_ms']:7.2f} ms  p99 {stats['p99_ms']:7.2f} ms")
+    if result.get('imgsz_frames'):
+        print("  frames per imgsz: " + ", ".join(f"{imgsz}: {count}" for imgsz, count in result['imgsz_frames'].items()))
+    if result.get('quality_gate'):
+        print(f"  quality gate: {result['quality_gate']}")
+
+
+def print_comparison(report, baseline):
+    print(f"\nCompared with {baseline['meta'].get('commit') or 'baseline'}:")
+    for suite in ('detection', 'recognition'):
+        current, previous = report.get(suite), baseline.get(suite)
+        if not current or not previous:
+            continue
+        print(f"  {suite}: FPS {previous['fps']:.1f} -> {current['fps']:.1f} ({(current['fps'] / previous['fps'] - 1) * 100:+.1f}%)")
+        for stage, stats in current['stages'].items():
+            if stage in previous['stages'] and previous['stages'][stage]['p50_ms'] > 0:
+                change = stats['p50_ms'] / previous['stages'][stage]['p50_ms'] - 1
+                print(f"    {stage:>15}: p50 {previous['stages'][stage]['p50_ms']:7.2f} -> {stats['p50_ms']:7.2f} ms ({change * 100:+.1f}%)")
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline latency/FPS benchmark of the detection and recognition hot paths.")
+    parser.add_argument('--suite', choices=['detection', 'recognition', 'all'], default='all')
+    parser.add_argument('--model', default=DEFAULT_MODEL_PATH)
+    parser.add_argument('--backend', default='pytorch', choices=SUPPORTED_BACKENDS)
+    parser.add_argument('--imgsz', type=int, default=640, help="Largest adaptive input size (DETECTOR_IMGSZ)")
+    parser.add_argument('--fixed-imgsz', action='store_true', help="Always infer at --imgsz (ADAPTIVE_IMGSZ=0)")
+    parser.add_argument('--target-fps', type=float, default=10.0, help="Inference budget of the adaptive input size")
+    parser.add_argument('--roi', help="Camera ROI polygons as JSON, in normalized coordinates")
+    parser.add_argument('--tiling', help="Camera tiling as JSON, e.g. '{\"rows\": 2, \"cols\": 2}'")
+    parser.add_argument('--identify', action='store_true', help="Run face identification on no_mask/person boxes")
+    parser.add_argument('--no-quality-gate', action='store_true', help="Describe every face (FACE_QUALITY_GATE=0)")
+    parser.add_argument('--no-model', action='store_true', help="Skip inference to measure the pipeline overhead alone")
+    parser.add_argument('--images', default=DEFAULT_IMAGES_DIR, help="Image folder replayed as camera frames")
+    parser.add_argument('--video', help="Replay a video file instead of the image folder")
+    parser.add_argument('--synthetic', type=int, default=0, help="Replay N synthetic frames instead of the image folder")
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=480)
+    parser.add_argument('--max-frames', type=int, default=500)
+    parser.add_argument('--faces', default=os.path.join(FACE_SYSTEM_DIR, 'test_dataset'))
+    parser.add_argument('--loops', type=int, default=3, help="Times to replay the source")
+    parser.add_argument('--firestore-latency-ms', type=float, default=0.0, help="Simulated Firestore write latency")
+    parser.add_argument('--output', help="Save the results as JSON")
+    parser.add_argument('--compare', help="Previous JSON results to compare against")
+    args = parser.parse_args()
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': time.time(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'opencv': cv2.__version__,
+            'args': vars(args),
+        }
+    }
+    work_dir = tempfile.mkdtemp(prefix='bench_pipeline_')
+    try:
+        if args.suite in ('detection', 'all'):
+            report['detection'] = bench_detection(args, work_dir)
+        if args.suite in ('recognition', 'all'):
+            report['recognition'] = bench_recognition(args)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    for suite in ('detection', 'recognition'):
+        if report.get(suite):
+            print_report(suite.capitalize(), report[suite])
+
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(report, json.load(f))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+import os
+import json
+import time
+import argparse
+import cv2
+import numpy as np
+from detector_backends import load_detector, SUPPORTED_BACKENDS
+from benchmark_backends import DEFAULT_MODEL_PATH, DEFAULT_IMAGES_DIR, compare_detections
+from regions import RegionDetector, parse_roi, parse_tiling
+
+# Recall-and-latency benchmark of ROI/tiled inference (regions.py) against full-frame inference.
+# Ground truth comes from YOLO label files (--labels, e.g. the labels/test folder written by
+# split_dataset.py, in the model's class IDs). Without labels, full-frame inference at a higher
+# input size (--reference-imgsz) stands in for ground truth.
+#
+#   python benchmark_regions.py --images yolo_dataset/images/test --labels yolo_dataset/labels/test --tiling 2x2
+#   python benchmark_regions.py --roi '[[[0, 0.3], [1, 0.3], [1, 1], [0, 1]]]' --tiling 2x2 --tiling 3x3
+
+
+def load_images(images_dir):
+    """[(file stem, BGR image)] for every readable image in the folder."""
+    images = []
+    for name in sorted(os.listdir(images_dir)):
+        if name.lower().endswith(('.png', '.jpg', '.jpeg')):
+            img = cv2.imread(os.path.join(images_dir, name))
+            if img is not None:
+                images.append((os.path.splitext(name)[0], img))
+    return images
+
+
+def load_labels(labels_dir, stem, shape):
+    """Ground-truth (cls, conf, xyxy) in pixels from a YOLO label file; empty if it is missing."""
+    height, width = shape[:2]
+    path = os.path.join(labels_dir, stem + '.txt')
+    rows = np.loadtxt(path, ndmin=2) if os.path.exists(path) and os.path.getsize(path) else np.zeros((0, 5))
+    cx, cy, w, h = rows[:, 1] * width, rows[:, 2] * height, rows[:, 3] * width, rows[:, 4] * height
+    xyxy = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+    return rows[:, 0].astype(int), np.ones(len(rows)), xyxy
+
+
+def run_full_frame(detector, images, conf, imgsz):
+    detector(images[0][1], conf=conf, imgsz=imgsz)  # warm-up, excluded from timing
+    detections, latencies = [], []
+    for _, img in images:
+        start = time.perf_counter()
+        boxes = detector(img, conf=conf, imgsz=imgsz)[0].boxes
+        latencies.append(time.perf_counter() - start)
+        detections.append((boxes.cls.cpu().numpy().astype(int), boxes.conf.cpu().numpy(), boxes.xyxy.cpu().numpy()))
+    return detections, np.array(latencies)
+
+
+def run_regions(detector, images, conf, roi, tiling):
+    region_detector = RegionDetector()
+    region_detector.configure('bench', roi, tiling)
+    plan = region_detector.plan('bench', images[0][1].shape)
+    region_detector.detect(detector, images[0][1], plan, conf=conf)  # warm-up
+    detections, latencies = [], []
+    for _, img in images:
+        start = time.perf_counter()
+        plan = region_detector.plan('bench', img.shape)
+        result = region_detector.detect(detector, img, plan, conf=conf)
+        latencies.append(time.perf_counter() - start)
+        detections.append((result.cls, result.conf, result.xyxy))
+    return detections, np.array(latencies), region_detector.stats()['crops_per_frame']
+
+
+def parse_tiling_arg(value):
+    rows, _, cols = value.lower().partition('x')
+    return {'rows': int(rows), 'cols': int(cols or rows)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare ROI/tiled inference with full-frame inference for recall and latency.")
+    parser.add_argument('--model', default=DEFAULT_MODEL_PATH)
+    parser.add_argument('--backend', default='pytorch', choices=SUPPORTED_BACKENDS)
+    parser.add_argument('--images', default=DEFAULT_IMAGES_DIR)
+    parser.add_argument('--labels', help="YOLO label folder for ground truth (default: high-resolution full-frame detections)")
+    parser.add_argument('--reference-imgsz', type=int, default=1280)
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--conf', type=float, default=0.25)
+    parser.add_argument('--roi', help="ROI polygons as JSON, in normalized coordinates")
+    parser.add_argument('--tiling', action='append', default=[], help="Tile grid such as 2x2 (repeatable)")
+    parser.add_argument('--overlap', type=float, default=0.2)
+    parser.add_argument('--output', help="Optional path to save the results as JSON")
+    args = parser.parse_args()
+
+    images = load_images(args.images)
+    if not images:
+        print(f"No test images found in {args.images}")
+        return
+    roi = parse_roi(json.loads(args.roi)) if args.roi else []
+    tilings = [parse_tiling({**parse_tiling_arg(value), 'overlap': args.overlap}) for value in args.tiling]
+    detector = load_detector(args.model, args.backend, args.imgsz)
+
+    if args.labels:
+        reference = [load_labels(args.labels, stem, img.shape) for stem, img in images]
+        reference_name = f"labels in {args.labels}"
+    else:
+        reference, _ = run_full_frame(detector, images, args.conf, args.reference_imgsz)
+        reference_name = f"full-frame detections at imgsz {args.reference_imgsz}"
+    print(f"Benchmarking {len(images)} images from {args.images} against {reference_name}")
+
+    configs = [('full_frame', None, None)]
+    if roi:
+        configs.append(('roi', roi, None))
+    for tiling in tilings:
+        name = f"tiles_{tiling['rows']}x{tiling['cols']}"
+        configs.append((name, None, tiling))
+        if roi:
+            configs.append((f"roi_{name}", roi, tiling))
+
+    report = {}
+    for name, config_roi, tiling in configs:
+        if config_roi is None and tiling is None:
+            detections, latencies = run_full_frame(detector, images, args.conf, args.imgsz)
+            crops = 1.0
+        else:
+            detections, latencies, crops = run_regions(detector, images, args.conf, config_roi, tiling)
+        comparison = compare_detections(reference, detections)
+        report[name] = {
+            'crops_per_frame': crops,
+            'latency_ms_p50': float(np.percentile(latencies, 50) * 1000),
+            'latency_ms_p95': float(np.percentile(latencies, 95) * 1000),
+            'recall': comparison['recall_vs_reference'],
+            'precision': comparison['precision_vs_reference'],
+            'detections': comparison['candidate_detections'],
+        }
+
+    baseline = report['full_frame']
+    for name, entry in report.items():
+        print(f"{name:>16}: {entry['crops_per_frame']:4.1f} crops  p50 {entry['latency_ms_p50']:7.1f} ms  "
+              f"p95 {entry['latency_ms_p95']:7.1f} ms  recall {entry['recall']:.3f} ({entry['recall'] - baseline['recall']:+.3f})  "
+              f"precision {entry['precision']:.3f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'reference': reference_name, 'results': report}, f, indent=2)
+        print(f"Results saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+import json
+import argparse
+import numpy as np
+from detector_backends import load_detector, SUPPORTED_BACKENDS
+from benchmark_backends import DEFAULT_MODEL_PATH, DEFAULT_IMAGES_DIR, compare_detections
+from benchmark_regions import load_images, load_labels, run_full_frame
+from resolution import DEFAULT_LEVELS
+
+# Accuracy-and-latency benchmark of each input size the resolution policy (resolution.py) can pick.
+# Ground truth comes from YOLO label files (--labels); without labels, inference at
+# --reference-imgsz stands in for it. The latencies show which level fits a given frame budget
+# (INFERENCE_TARGET_FPS) on this machine, the recall what that level costs.
+#
+#   python benchmark_resolution.py --images yolo_dataset/images/test --labels yolo_dataset/labels/test
+#   python benchmark_resolution.py --backend onnx --level 640 --level 512 --level 384 --level 256
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure detection accuracy and latency at each adaptive input size.")
+    parser.add_argument('--model', default=DEFAULT_MODEL_PATH)
+    parser.add_argument('--backend', default='pytorch', choices=SUPPORTED_BACKENDS)
+    parser.add_argument('--images', default=DEFAULT_IMAGES_DIR)
+    parser.add_argument('--labels', help="YOLO label folder for ground truth (default: detections at --reference-imgsz)")
+    parser.add_argument('--reference-imgsz', type=int, default=1280)
+    parser.add_argument('--level', type=int, action='append', default=[], help="Input size to test (repeatable, default 640/480/320)")
+    parser.add_argument('--conf', type=float, default=0.25)
+    parser.add_argument('--output', help="Optional path to save the results as JSON")
+    args = parser.parse_args()
+
+    images = load_images(args.images)
+    if not images:
+        print(f"No test images found in {args.images}")
+        return
+    levels = sorted(set(args.level or DEFAULT_LEVELS), reverse=True)
+    detector = load_detector(args.model, args.backend, levels[0])
+    if not detector.dynamic:
+        print(f"The {detector.backend} backend only runs at its export size; benchmarking imgsz {levels[0]} alone")
+        levels = levels[:1]
+
+    if args.labels:
+        reference = [load_labels(args.labels, stem, img.shape) for stem, img in images]
+        reference_name = f"labels in {args.labels}"
+    else:
+        reference, _ = run_full_frame(detector, images, args.conf, args.reference_imgsz)
+        reference_name = f"detections at imgsz {args.reference_imgsz}"
+    print(f"Benchmarking {len(images)} images from {args.images} against {reference_name}")
+
+    report = {}
+    for imgsz in levels:
+        detections, latencies = run_full_frame(detector, images, args.conf, imgsz)
+        comparison = compare_detections(reference, detections)
+        report[str(imgsz)] = {
+            'latency_ms_p50': float(np.percentile(latencies, 50) * 1000),
+            'latency_ms_p95': float(np.percentile(latencies, 95) * 1000),
+            'max_fps': float(1 / np.percentile(latencies, 95)),
+            'recall': comparison['recall_vs_reference'],
+            'precision': comparison['precision_vs_reference'],
+            'detections': comparison['candidate_detections'],
+        }
+
+    top = report[str(levels[0])]
+    for imgsz, entry in report.items():
+        print(f"imgsz {imgsz:>5}: p50 {entry['latency_ms_p50']:7.1f} ms  p95 {entry['latency_ms_p95']:7.1f} ms  "
+              f"({entry['max_fps']:5.1f} fps)  recall {entry['recall']:.3f} ({entry['recall'] - top['recall']:+.3f})  "
+              f"precision {entry['precision']:.3f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'backend': detector.backend, 'reference': reference_name, 'results': report}, f, indent=2)
+        print(f"Results saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
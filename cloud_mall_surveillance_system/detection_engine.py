@@ -0,0 +1,62 @@
+import os
+import time
+import threading
+
+# Production entry point for detection: one long-running process that owns the camera, the
+# model and every writer (Firestore alerts, recorder, evidence, event store), and publishes
+# annotated frames and status to the web processes started with asgi.py.
+#
+#   python detection_engine.py
+#   uvicorn asgi:application --host 0.0.0.0 --port 5000
+#
+# Both processes need the same DETECTION_ENGINE_AUTHKEY or key file (see engine_link.py); start
+# several web processes behind a load balancer with a shared FLASK_SECRET_KEY. With
+# CAPTURE_PROCESS=1 camera capture and decoding run in a child process that hands frames over
+# through shared memory, leaving this process's cores to inference.
+os.environ['SURVEILLANCE_ROLE'] = 'engine'
+
+import app as surveillance
+from engine_link import EnginePublisher
+
+STATUS_INTERVAL_SECONDS = 1.0
+CAMERA_RETRY_SECONDS = 5
+
+
+def publish_status(publisher):
+    while True:
+        try:
+            health = surveillance.collect_health()
+            health['engine_subscribers'] = publisher.subscribers()
+            health['engine_dropped_messages'] = publisher.dropped
+            publisher.publish_status(health, surveillance.metrics.render())
+        except Exception as e:
+            print(f"Error publishing engine status: {e}")
+        time.sleep(STATUS_INTERVAL_SECONDS)
+
+
+def main():
+    publisher = EnginePublisher(surveillance.handle_engine_request)
+    threading.Thread(target=publish_status, args=(publisher,), name='engine-status', daemon=True).start()
+
+    # Model warm-up and the Firestore bootstrap run in the background; the camera waits for both
+    for component in ('firestore', 'model'):
+        surveillance.startup.wait(component)
+
+    # Detection runs continuously, whether or not anyone is watching
+    while True:
+        try:
+            stream_error = surveillance.ensure_video_stream()
+        except Exception as e:
+            stream_error = (str(e), 500)
+        if stream_error:
+            print(f"Detection engine waiting for a camera: {stream_error[0]}")
+            time.sleep(CAMERA_RETRY_SECONDS)
+            continue
+
+        print(f"Detection engine running on camera {surveillance.current_camera_id}")
+        for jpeg_bytes in surveillance.detection_frames():
+            publisher.publish_frame(surveillance.current_camera_id, jpeg_bytes, time.time())
+
+
+if __name__ == '__main__':
+    main()
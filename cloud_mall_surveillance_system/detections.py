@@ -0,0 +1,116 @@
+import struct
+import numpy as np
+
+# --- Per-Frame Detections ---
+# One frame's detections as parallel NumPy arrays, pulled off the model output once per frame and
+# passed as-is to the rules, tracker, analytics, event store and recorder, so no stage loops over
+# boxes in Python or looks class names up one box at a time.
+#
+# Both encodings are columnar and carry their own class table (the classes present in the frame),
+# so they can be decoded without the model:
+#   to_json()  {'classes': [...], 'cls': [...], 'conf': [...], 'xyxy': [[x1, y1, x2, y2], ...],
+#               'track_ids': [...], 'identities': {index: name}}, the last two only when present;
+#              cls indexes into classes. Sent to clients.
+#   to_bytes() a little-endian record, about 15 bytes per detection. Used for recordings.
+
+BINARY_VERSION = 1
+_HEADER = struct.Struct('<BHBH')  # version, detections, flags, class table bytes
+_HAS_TRACKS, _HAS_IDENTITIES = 1, 2
+
+
+class Detections:
+    """cls (int64), conf (float32) and xyxy (float32, N x 4) of one frame, plus optional per-box extras."""
+    __slots__ = ('cls', 'conf', 'xyxy', 'names', 'track_ids', 'identities')
+
+    def __init__(self, cls, conf, xyxy, names, track_ids=None, identities=None):
+        self.cls = np.asarray(cls, dtype=np.int64)
+        self.conf = np.asarray(conf, dtype=np.float32)
+        self.xyxy = np.asarray(xyxy, dtype=np.float32).reshape(-1, 4)
+        self.names = names                # class ID -> class name (the model's names)
+        self.track_ids = track_ids        # int64 per box, -1 when untracked; None without tracking
+        self.identities = identities or {}  # box index -> identified person
+
+    @classmethod
+    def from_boxes(cls, boxes, names):
+        """From an ultralytics Boxes object: one device-to-host copy per array."""
+        return cls(boxes.cls.cpu().numpy(), boxes.conf.cpu().numpy(), boxes.xyxy.cpu().numpy(), names)
+
+    @classmethod
+    def empty(cls, names=None):
+        return cls(np.zeros(0), np.zeros(0), np.zeros((0, 4)), names or {})
+
+    def __len__(self):
+        return len(self.cls)
+
+    def class_table(self):
+        """(class IDs present, sorted; index of each box's class in them)."""
+        present = np.unique(self.cls)
+        return present, np.searchsorted(present, self.cls)
+
+    def class_names(self):
+        """Class name of every box, as an object array."""
+        present, index = self.class_table()
+        table = np.array([self.names.get(class_id, str(class_id)) for class_id in present.tolist()], dtype=object)
+        return table[index]
+
+    def to_json(self):
+        present, index = self.class_table()
+        data = {
+            'classes': [self.names.get(class_id, str(class_id)) for class_id in present.tolist()],
+            'cls': index.tolist(),
+            'conf': np.round(self.conf.astype(np.float64), 3).tolist(),
+            'xyxy': np.rint(self.xyxy).astype(np.int32).tolist(),
+        }
+        if self.track_ids is not None:
+            data['track_ids'] = self.track_ids.tolist()
+        if self.identities:
+            data['identities'] = {str(i): name for i, name in self.identities.items()}
+        return data
+
+    def to_bytes(self):
+        present, index = self.class_table()
+        table = '\n'.join(self.names.get(class_id, str(class_id)) for class_id in present.tolist()).encode()
+        flags = (_HAS_TRACKS if self.track_ids is not None else 0) | (_HAS_IDENTITIES if self.identities else 0)
+        parts = [
+            _HEADER.pack(BINARY_VERSION, len(self), flags, len(table)),
+            table,
+            index.astype('<u1').tobytes(),
+            np.rint(np.clip(self.conf, 0, 1) * 10000).astype('<u2').tobytes(),
+            np.rint(np.clip(self.xyxy, 0, 65535)).astype('<u2').tobytes(),
+        ]
+        if self.track_ids is not None:
+            parts.append(self.track_ids.astype('<i4').tobytes())
+        if self.identities:
+            identities = '\n'.join(self.identities.get(i, '') for i in range(len(self))).encode()
+            parts += [struct.pack('<H', len(identities)), identities]
+        return b''.join(parts)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Decodes to_bytes() output; class IDs of the result index into the record's own class table."""
+        version, count, flags, table_size = _HEADER.unpack_from(data)
+        if version != BINARY_VERSION:
+            raise ValueError(f"Unsupported detections record version {version}")
+        offset = _HEADER.size
+        table = data[offset:offset + table_size].decode()
+        names = dict(enumerate(table.split('\n'))) if table_size else {}
+        offset += table_size
+
+        def take(dtype, items):
+            nonlocal offset
+            array = np.frombuffer(data, dtype=dtype, count=items, offset=offset)
+            offset += array.nbytes
+            return array
+
+        class_index = take('<u1', count)
+        conf = take('<u2', count) / 10000
+        xyxy = take('<u2', count * 4).reshape(-1, 4)
+        track_ids = take('<i4', count).astype(np.int64) if flags & _HAS_TRACKS else None
+        identities = {}
+        if flags & _HAS_IDENTITIES:
+            size, = struct.unpack_from('<H', data, offset)
+            offset += 2
+            identities = {
+                i: name for i, name in enumerate(data[offset:offset + size].decode().split('\n')) if name
+            }
+        return cls(class_index, conf, xyxy, names, track_ids, identities)
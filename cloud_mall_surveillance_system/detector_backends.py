@@ -0,0 +1,105 @@
+import os
+import shutil
+import hashlib
+
+# --- Detector Backend Configuration ---
+# 'pytorch' runs best.pt directly. The other backends run an exported copy of best.pt
+# through the matching runtime; ultralytics wraps every runtime in the same Results
+# objects, so callers get identical detections whichever backend is active.
+EXPORT_SPECS = {
+    'onnx': {'format': 'onnx', 'suffix': '.onnx', 'dynamic': True},
+    'openvino': {'format': 'openvino', 'suffix': '_openvino_model', 'dynamic': True},
+    'openvino_int8': {'format': 'openvino', 'suffix': '_int8_openvino_model', 'int8': True},
+}
+SUPPORTED_BACKENDS = ('pytorch',) + tuple(EXPORT_SPECS)
+
+# Dataset yaml used to calibrate INT8 quantization (ultralytics falls back to coco8 if unset)
+INT8_CALIBRATION_DATA = os.environ.get('DETECTOR_INT8_DATA')
+
+
+def _export_digest(model_path, export_kwargs):
+    """Short hash of the weights file and the export options, used to key the export cache."""
+    digest = hashlib.sha1()
+    with open(model_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    digest.update(repr(sorted(export_kwargs.items())).encode())
+    return digest.hexdigest()[:12]
+
+
+def export_model(model_path, backend, imgsz=640):
+    """Exports the weights for the given backend, reusing the cached artifact if the weights and
+    export options (imgsz, format flags, INT8 calibration data) are unchanged."""
+    spec = EXPORT_SPECS[backend]
+    export_kwargs = {
+        'format': spec['format'],
+        'imgsz': imgsz,
+        'dynamic': spec.get('dynamic', False),
+        'int8': spec.get('int8', False),
+    }
+    if spec.get('int8') and INT8_CALIBRATION_DATA:
+        export_kwargs['data'] = INT8_CALIBRATION_DATA
+    cache_dir = os.path.join(os.path.dirname(model_path), 'exports', _export_digest(model_path, export_kwargs))
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    artifact_path = os.path.join(cache_dir, stem + spec['suffix'])
+    if os.path.exists(artifact_path):
+        return artifact_path
+
+    # ultralytics writes the export next to the weights it was given, so stage a copy in the cache dir
+    os.makedirs(cache_dir, exist_ok=True)
+    staged_weights = os.path.join(cache_dir, os.path.basename(model_path))
+    shutil.copy2(model_path, staged_weights)
+    from ultralytics import YOLO
+    try:
+        exported_path = str(YOLO(staged_weights).export(**export_kwargs))
+    finally:
+        os.remove(staged_weights)
+
+    exported_path = exported_path.rstrip(os.sep)
+    if os.path.abspath(exported_path) != os.path.abspath(artifact_path):
+        shutil.move(exported_path, artifact_path)
+    print(f"Exported {backend} detector to {artifact_path}")
+    return artifact_path
+
+
+class DetectorBackend:
+    """Callable YOLO detector that runs on the configured inference backend."""
+    def __init__(self, model_path, backend='pytorch', imgsz=640):
+        if backend not in SUPPORTED_BACKENDS:
+            raise ValueError(f"Unknown detector backend '{backend}'. Expected one of {SUPPORTED_BACKENDS}")
+        self.model_path = model_path
+        self.backend = backend
+        self.imgsz = imgsz
+        # Imported here so SUPPORTED_BACKENDS and the export helpers load without ultralytics
+        from ultralytics import YOLO
+
+        if backend == 'pytorch':
+            self.artifact_path = model_path
+            self.model = YOLO(model_path)
+        else:
+            self.artifact_path = export_model(model_path, backend, imgsz)
+            self.model = YOLO(self.artifact_path, task='detect')
+
+    @property
+    def names(self):
+        return self.model.names
+
+    @property
+    def dynamic(self):
+        """Whether the model accepts an imgsz other than the one it was exported at."""
+        return self.backend == 'pytorch' or EXPORT_SPECS[self.backend].get('dynamic', False)
+
+    def __call__(self, frame, **kwargs):
+        kwargs.setdefault('imgsz', self.imgsz)
+        kwargs.setdefault('verbose', False)
+        return self.model(frame, **kwargs)
+
+
+def load_detector(model_path, backend='pytorch', imgsz=640):
+    """Loads the detector on the requested backend, falling back to PyTorch if export or loading fails."""
+    if backend != 'pytorch':
+        try:
+            return DetectorBackend(model_path, backend, imgsz)
+        except Exception as e:
+            print(f"Failed to load '{backend}' detector backend, falling back to pytorch: {e}")
+    return DetectorBackend(model_path, 'pytorch', imgsz)
@@ -0,0 +1,269 @@
+import os
+import time
+import secrets
+import queue
+import asyncio
+import itertools
+import threading
+from multiprocessing.connection import Listener, Client
+
+# --- Detection Engine Link ---
+# In production the detection loop runs in its own process (detection_engine.py) and the web
+# process (asgi.py) serves HTTP. They talk over one multiprocessing connection per web process:
+#   engine -> web: ('frame', camera_id, jpeg_bytes, timestamp), ('status', health_dict, metrics_text),
+#                  ('reply', request_id, result)
+#   web -> engine: ('request', request_id, command, args)
+#
+# multiprocessing connections unpickle whatever the peer sends, so the authkey is all that stands
+# between the port and code execution. It comes from DETECTION_ENGINE_AUTHKEY, or else from a
+# random key file (DETECTION_ENGINE_AUTHKEY_FILE) readable only by its owner, which the first
+# process to start creates and every later one reads. Engines on another host need the env var.
+ENGINE_HOST = os.environ.get('DETECTION_ENGINE_HOST', '127.0.0.1')
+ENGINE_PORT = int(os.environ.get('DETECTION_ENGINE_PORT', 6001))
+ENGINE_AUTHKEY_FILE = os.environ.get(
+    'DETECTION_ENGINE_AUTHKEY_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.engine_authkey')
+)
+
+
+def engine_authkey():
+    """The shared engine authkey: DETECTION_ENGINE_AUTHKEY, or the key file, created on first use."""
+    key = os.environ.get('DETECTION_ENGINE_AUTHKEY')
+    if key:
+        return key.encode()
+    if not os.path.exists(ENGINE_AUTHKEY_FILE):
+        # Written in full to a private temp file, then linked into place so a concurrent reader
+        # never sees a partial key and two processes starting together agree on one key
+        temp_path = f"{ENGINE_AUTHKEY_FILE}.{os.getpid()}.tmp"
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            f.write(secrets.token_hex(32))
+        try:
+            os.link(temp_path, ENGINE_AUTHKEY_FILE)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(temp_path)
+    if os.name == 'posix' and os.stat(ENGINE_AUTHKEY_FILE).st_mode & 0o077:
+        raise RuntimeError(f"{ENGINE_AUTHKEY_FILE} is readable by other users; chmod 600 it")
+    with open(ENGINE_AUTHKEY_FILE) as f:
+        key = f.read().strip()
+    if not key:
+        raise RuntimeError(f"{ENGINE_AUTHKEY_FILE} is empty; delete it or set DETECTION_ENGINE_AUTHKEY")
+    return key.encode()
+
+
+class _Subscriber:
+    """One connected web process. Frames are latest-wins so a slow subscriber never stalls the engine."""
+    def __init__(self, connection, publisher):
+        self.connection = connection
+        self.publisher = publisher
+        self.outbox = queue.Queue(maxsize=4)
+        self.closed = False
+        self._send_lock = threading.Lock()
+        threading.Thread(target=self._send_loop, name='engine-subscriber-send', daemon=True).start()
+        threading.Thread(target=self._receive_loop, name='engine-subscriber-receive', daemon=True).start()
+
+    def offer(self, message):
+        try:
+            self.outbox.put_nowait(message)
+        except queue.Full:
+            # Drop the oldest queued message to make room for the newest
+            try:
+                self.outbox.get_nowait()
+            except queue.Empty:
+                pass
+            self.publisher.dropped += 1
+            self.offer(message)
+
+    def _send_loop(self):
+        while not self.closed:
+            message = self.outbox.get()
+            if message is None:
+                return
+            try:
+                with self._send_lock:
+                    self.connection.send(message)
+            except (OSError, EOFError):
+                self.close()
+
+    def _receive_loop(self):
+        while not self.closed:
+            try:
+                kind, request_id, command, args = self.connection.recv()
+            except (OSError, EOFError):
+                self.close()
+                return
+            if kind != 'request':
+                continue
+            try:
+                result = self.publisher.on_request(command, *args)
+            except Exception as e:
+                print(f"Engine error handling '{command}': {e}")
+                result = {'success': False, 'error': str(e)}
+            # Replies must not be dropped, so they bypass the latest-wins outbox
+            try:
+                with self._send_lock:
+                    self.connection.send(('reply', request_id, result))
+            except (OSError, EOFError):
+                self.close()
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.publisher.remove(self)
+            try:
+                self.outbox.put_nowait(None)  # wakes the send thread so it exits
+            except queue.Full:
+                pass
+            try:
+                self.connection.close()
+            except OSError:
+                pass
+
+
+class EnginePublisher:
+    """Engine side: accepts web-process connections, broadcasts frames and status, serves requests."""
+    def __init__(self, on_request, host=ENGINE_HOST, port=ENGINE_PORT, authkey=None):
+        authkey = authkey or engine_authkey()
+        self.on_request = on_request  # called as on_request(command, *args) -> picklable result
+        self.dropped = 0
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._listener = Listener((host, port), authkey=authkey)
+        threading.Thread(target=self._accept_loop, name='engine-accept', daemon=True).start()
+        print(f"Detection engine listening on {host}:{port}")
+
+    def _accept_loop(self):
+        while True:
+            try:
+                connection = self._listener.accept()
+            except Exception as e:
+                print(f"Engine rejected a connection: {e}")
+                continue
+            with self._lock:
+                self._subscribers.append(_Subscriber(connection, self))
+            print("Web process connected to the detection engine")
+
+    def remove(self, subscriber):
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    def subscribers(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def broadcast(self, message):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            subscriber.offer(message)
+
+    def publish_frame(self, camera_id, jpeg_bytes, timestamp):
+        self.broadcast(('frame', camera_id, jpeg_bytes, timestamp))
+
+    def publish_status(self, health, metrics_text):
+        self.broadcast(('status', health, metrics_text))
+
+
+class FrameHub:
+    """Hands the newest engine frame to any number of asyncio stream handlers.
+
+    Every waiter awaits the same future, which the hub replaces on each frame, so publishing
+    costs O(1) regardless of how many /video_feed connections are open.
+    """
+    def __init__(self):
+        self.sequence = 0
+        self.frame = None  # (camera_id, jpeg_bytes, timestamp)
+        self._loop = None
+        self._next = None
+
+    def bind_loop(self, loop):
+        self._loop = loop
+        self._next = loop.create_future()
+
+    def publish(self, camera_id, jpeg_bytes, timestamp):
+        """Thread-safe; called from the engine client's receive thread."""
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._publish, (camera_id, jpeg_bytes, timestamp))
+
+    def _publish(self, frame):
+        self.sequence += 1
+        self.frame = frame
+        current, self._next = self._next, self._loop.create_future()
+        current.set_result(None)
+
+    async def next_frame(self, after_sequence):
+        """Waits for a frame newer than after_sequence and returns (sequence, frame)."""
+        while self.sequence <= after_sequence:
+            await asyncio.shield(self._next)
+        return self.sequence, self.frame
+
+
+class EngineClient:
+    """Web side: keeps a connection to the engine, caches its status and forwards frames to a FrameHub."""
+    def __init__(self, host=ENGINE_HOST, port=ENGINE_PORT, authkey=None):
+        self.address = (host, port)
+        self.authkey = authkey or engine_authkey()
+        self.frames = FrameHub()
+        self.status = None
+        self.metrics_text = ''
+        self.status_received_at = None
+        self._connection = None
+        self._send_lock = threading.Lock()
+        self._request_ids = itertools.count(1)
+        self._replies = {}  # request_id -> [threading.Event, result]
+        threading.Thread(target=self._run, name='engine-client', daemon=True).start()
+
+    @property
+    def connected(self):
+        return self._connection is not None
+
+    def status_age(self):
+        return time.time() - self.status_received_at if self.status_received_at else None
+
+    def _run(self):
+        while True:
+            try:
+                self._connection = Client(self.address, authkey=self.authkey)
+                print(f"Connected to detection engine at {self.address[0]}:{self.address[1]}")
+                self._receive_loop()
+            except Exception as e:
+                if self._connection is not None:
+                    print(f"Lost connection to detection engine: {e}")
+            self._connection = None
+            for pending in list(self._replies.values()):
+                pending[0].set()
+            time.sleep(2)
+
+    def _receive_loop(self):
+        while True:
+            message = self._connection.recv()
+            kind = message[0]
+            if kind == 'frame':
+                self.frames.publish(*message[1:])
+            elif kind == 'status':
+                _, self.status, self.metrics_text = message
+                self.status_received_at = time.time()
+            elif kind == 'reply':
+                pending = self._replies.get(message[1])
+                if pending:
+                    pending[1] = message[2]
+                    pending[0].set()
+
+    def request(self, command, *args, timeout=15):
+        """Runs a command in the engine and returns its result, or None if the engine is unreachable."""
+        connection = self._connection
+        if connection is None:
+            return None
+        request_id = next(self._request_ids)
+        pending = self._replies[request_id] = [threading.Event(), None]
+        try:
+            with self._send_lock:
+                connection.send(('request', request_id, command, args))
+            pending[0].wait(timeout)
+            return pending[1]
+        except (OSError, EOFError):
+            return None
+        finally:
+            self._replies.pop(request_id, None)
@@ -0,0 +1,342 @@
+import json
+import time
+import uuid
+import queue
+import sqlite3
+import threading
+
+# --- Local Event Store Schema ---
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS detections (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    camera_id TEXT NOT NULL,
+    class_name TEXT NOT NULL,
+    confidence REAL NOT NULL,
+    x1 REAL, y1 REAL, x2 REAL, y2 REAL
+);
+CREATE INDEX IF NOT EXISTS idx_detections_camera_time ON detections (camera_id, ts);
+CREATE INDEX IF NOT EXISTS idx_detections_class_time ON detections (class_name, ts);
+
+CREATE TABLE IF NOT EXISTS alerts (
+    id TEXT PRIMARY KEY,
+    ts REAL NOT NULL,
+    camera_id TEXT,
+    camera TEXT,
+    detections TEXT,
+    threat_level TEXT,
+    status TEXT,
+    event_state TEXT,
+    event_start REAL,
+    event_end REAL,
+    last_seen REAL,
+    frame_hits INTEGER,
+    max_confidence REAL,
+    evidence TEXT,
+    identities TEXT,
+    track_id INTEGER,
+    updated_at REAL,
+    updated_by TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_alerts_time ON alerts (ts);
+CREATE INDEX IF NOT EXISTS idx_alerts_status_time ON alerts (status, ts);
+CREATE INDEX IF NOT EXISTS idx_alerts_camera_time ON alerts (camera_id, ts);
+
+CREATE TABLE IF NOT EXISTS activity_logs (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    user_id TEXT,
+    role TEXT,
+    message TEXT,
+    camera TEXT,
+    detections TEXT,
+    threat_level TEXT,
+    status TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_activity_logs_time ON activity_logs (ts);
+CREATE INDEX IF NOT EXISTS idx_activity_logs_status_time ON activity_logs (status, ts);
+"""
+
+# Alert columns that may be set through insert_alert()/update_alert(), mapped from the Firestore field names
+ALERT_FIELDS = {
+    'camera_id': 'camera_id',
+    'camera': 'camera',
+    'detections': 'detections',
+    'threatLevel': 'threat_level',
+    'status': 'status',
+    'event_state': 'event_state',
+    'event_start': 'event_start',
+    'event_end': 'event_end',
+    'last_seen': 'last_seen',
+    'frame_hits': 'frame_hits',
+    'max_confidence': 'max_confidence',
+    'evidence': 'evidence',
+    'identities': 'identities',
+    'track_id': 'track_id',
+    'updated_at': 'updated_at',
+    'updated_by': 'updated_by',
+}
+JSON_ALERT_COLUMNS = ('detections', 'evidence', 'identities')
+AGGREGATE_GROUPS = {
+    'class': 'class_name',
+    'camera': 'camera_id',
+    'hour': "CAST(ts / 3600 AS INTEGER) * 3600",
+    'day': "CAST(ts / 86400 AS INTEGER) * 86400",
+}
+
+
+def firestore_timestamp(ts):
+    """Shapes an epoch timestamp like a serialized Firestore timestamp, which the dashboard reads."""
+    return {'seconds': int(ts), 'nanoseconds': int((ts % 1) * 1e9)} if ts is not None else None
+
+
+class DetectionEventStore:
+    """Embedded SQLite (WAL mode) store for every detection, alert and activity log entry.
+
+    Writes are queued and committed in batches by one writer thread, so the detection loop only
+    pays for a queue put. Reads use a per-thread connection and run concurrently with the writer.
+    """
+    def __init__(self, db_path, retention_days=30, max_pending=10000, batch_size=500):
+        self.db_path = db_path
+        self.retention_seconds = retention_days * 24 * 3600
+        self.batch_size = batch_size
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+        self._thread = threading.Thread(target=self._run, name='event-store-writer', daemon=True)
+        self._thread.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _reader(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    # --- Writes ---
+    def _submit(self, statement, rows):
+        try:
+            self._queue.put_nowait((statement, rows))
+            return True
+        except queue.Full:
+            self.dropped += len(rows)
+            return False
+
+    def record_detections(self, camera_id, timestamp, detections):
+        """Queues one frame's detections (a detections.Detections)."""
+        if not len(detections):
+            return
+        camera_id = str(camera_id)
+        rows = [
+            (timestamp, camera_id, class_name, confidence, *box)
+            for class_name, confidence, box in zip(
+                detections.class_names().tolist(), detections.conf.tolist(), detections.xyxy.tolist()
+            )
+        ]
+        self._submit("INSERT INTO detections (ts, camera_id, class_name, confidence, x1, y1, x2, y2) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def record_activity(self, user_id, role, message, camera_name, detections, threat_level, status, timestamp=None):
+        timestamp = time.time() if timestamp is None else timestamp
+        self._submit(
+            "INSERT INTO activity_logs (ts, user_id, role, message, camera, detections, threat_level, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(timestamp, user_id, role, message, camera_name, json.dumps(detections or []), threat_level, status)]
+        )
+
+    def _alert_columns(self, fields):
+        columns = {}
+        for field, value in fields.items():
+            column = ALERT_FIELDS.get(field)
+            if column is not None:
+                columns[column] = json.dumps(value) if column in JSON_ALERT_COLUMNS else value
+        return columns
+
+    def insert_alert(self, alert_id=None, timestamp=None, **fields):
+        """Records a new alert; fields use the Firestore alert field names. Returns the alert id."""
+        alert_id = alert_id or f"local-{uuid.uuid4().hex}"
+        columns = {'id': alert_id, 'ts': time.time() if timestamp is None else timestamp}
+        columns.update(self._alert_columns(fields))
+        self._submit(
+            f"INSERT OR REPLACE INTO alerts ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})",
+            [tuple(columns.values())]
+        )
+        return alert_id
+
+    def update_alert(self, alert_id, **fields):
+        """Updates fields of an existing alert in place."""
+        columns = self._alert_columns(fields)
+        if not columns:
+            return
+        self._submit(
+            f"UPDATE alerts SET {', '.join(f'{name} = ?' for name in columns)} WHERE id = ?",
+            [tuple(columns.values()) + (alert_id,)]
+        )
+
+    def flush(self):
+        self._queue.join()
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _run(self):
+        conn = self._connect()
+        last_prune = 0
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with conn:
+                    for statement, rows in batch:
+                        conn.executemany(statement, rows)
+                if time.time() - last_prune > 3600:
+                    last_prune = time.time()
+                    with conn:
+                        conn.execute("DELETE FROM detections WHERE ts < ?", (last_prune - self.retention_seconds,))
+            except Exception as e:
+                print(f"Error writing to local event store: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    # --- Queries ---
+    def query_alerts(self, status=None, camera_id=None, class_name=None, start=None, end=None, limit=50):
+        """Most recent alerts first, shaped like the Firestore alert documents."""
+        clauses, params = [], []
+        if status and status != 'all':
+            clauses.append("status = ?")
+            params.append(status)
+        if camera_id:
+            clauses.append("camera_id = ?")
+            params.append(camera_id)
+        if class_name:
+            clauses.append("EXISTS (SELECT 1 FROM json_each(alerts.detections) WHERE value = ?)")
+            params.append(class_name)
+        if start is not None:
+            clauses.append("ts >= ?")
+            params.append(start)
+        if end is not None:
+            clauses.append("ts <= ?")
+            params.append(end)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._reader().execute(f"SELECT * FROM alerts {where} ORDER BY ts DESC LIMIT ?", params + [limit]).fetchall()
+        return [self._alert_from_row(row) for row in rows]
+
+    def get_alert(self, alert_id):
+        row = self._reader().execute("SELECT * FROM alerts WHERE id = ?", (alert_id,)).fetchone()
+        return self._alert_from_row(row) if row else None
+
+    @staticmethod
+    def _alert_from_row(row):
+        return {
+            'id': row['id'],
+            'camera': row['camera'],
+            'camera_id': row['camera_id'],
+            'detections': json.loads(row['detections'] or '[]'),
+            'threatLevel': row['threat_level'],
+            'status': row['status'],
+            'event_state': row['event_state'],
+            'event_start': firestore_timestamp(row['event_start']),
+            'event_end': firestore_timestamp(row['event_end']),
+            'last_seen': firestore_timestamp(row['last_seen']),
+            'frame_hits': row['frame_hits'],
+            'max_confidence': row['max_confidence'],
+            'evidence': json.loads(row['evidence']) if row['evidence'] else None,
+            'identities': json.loads(row['identities'] or '[]'),
+            'track_id': row['track_id'],
+            'timestamp': firestore_timestamp(row['ts']),
+        }
+
+    def query_activity_logs(self, status=None, start=None, end=None, limit=100):
+        clauses, params = [], []
+        if status and status != 'all':
+            clauses.append("status = ?")
+            params.append(status)
+        if start is not None:
+            clauses.append("ts >= ?")
+            params.append(start)
+        if end is not None:
+            clauses.append("ts <= ?")
+            params.append(end)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._reader().execute(f"SELECT * FROM activity_logs {where} ORDER BY ts DESC LIMIT ?", params + [limit]).fetchall()
+        return [{
+            'id': f"local-{row['id']}",
+            'user_id': row['user_id'],
+            'role': row['role'],
+            'message': row['message'],
+            'camera': row['camera'],
+            'detections': json.loads(row['detections'] or '[]'),
+            'threatLevel': row['threat_level'],
+            'status': row['status'],
+            'timestamp': firestore_timestamp(row['ts']),
+        } for row in rows]
+
+    def query_detections(self, camera_id=None, class_name=None, start=None, end=None, min_confidence=None, limit=500):
+        """Raw detections, newest first. Filters map onto the (camera, time) and (class, time) indexes."""
+        clauses, params = [], []
+        if camera_id:
+            clauses.append("camera_id = ?")
+            params.append(camera_id)
+        if class_name:
+            clauses.append("class_name = ?")
+            params.append(class_name)
+        if start is not None:
+            clauses.append("ts >= ?")
+            params.append(start)
+        if end is not None:
+            clauses.append("ts <= ?")
+            params.append(end)
+        if min_confidence is not None:
+            clauses.append("confidence >= ?")
+            params.append(min_confidence)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._reader().execute(f"SELECT * FROM detections {where} ORDER BY ts DESC LIMIT ?", params + [limit]).fetchall()
+        return [{
+            'timestamp': row['ts'],
+            'camera_id': row['camera_id'],
+            'class': row['class_name'],
+            'confidence': row['confidence'],
+            'box': [row['x1'], row['y1'], row['x2'], row['y2']],
+        } for row in rows]
+
+    def aggregate_detections(self, group_by=('class',), camera_id=None, class_name=None, start=None, end=None):
+        """Detection counts and mean confidence grouped by any of class, camera, hour or day."""
+        group_columns = [AGGREGATE_GROUPS[group] for group in group_by]
+        clauses, params = [], []
+        if camera_id:
+            clauses.append("camera_id = ?")
+            params.append(camera_id)
+        if class_name:
+            clauses.append("class_name = ?")
+            params.append(class_name)
+        if start is not None:
+            clauses.append("ts >= ?")
+            params.append(start)
+        if end is not None:
+            clauses.append("ts <= ?")
+            params.append(end)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        select = ', '.join(f"{column} AS g{i}" for i, column in enumerate(group_columns))
+        group = ', '.join(f"g{i}" for i in range(len(group_columns)))
+        rows = self._reader().execute(
+            f"SELECT {select}, COUNT(*) AS count, AVG(confidence) AS mean_confidence FROM detections {where} "
+            f"GROUP BY {group} ORDER BY {group}", params
+        ).fetchall()
+        return [
+            {**{name: row[f"g{i}"] for i, name in enumerate(group_by)}, 'count': row['count'], 'mean_confidence': row['mean_confidence']}
+            for row in rows
+        ]
+
+    def stats(self):
+        return {'path': self.db_path, 'pending': self._queue.qsize(), 'dropped': self.dropped}
@@ -0,0 +1,158 @@
+import os
+import re
+import time
+import queue
+import hashlib
+import threading
+from collections import OrderedDict
+from frame_buffer import encode_mjpeg
+
+# --- Evidence Media Types ---
+# Clips are stored as MJPEG: the buffered JPEG frames concatenated, playable by VLC/ffplay.
+EVIDENCE_MIMETYPES = {
+    'jpg': 'image/jpeg',
+    'mjpeg': 'video/x-motion-jpeg',
+}
+EVIDENCE_ID_PATTERN = re.compile(r'^[0-9a-f]{64}\.(jpg|mjpeg)$')
+
+
+class EvidenceStore:
+    """Content-addressed media store on local disk with size and age retention.
+
+    Files are named by the SHA-256 of their content, so identical snapshots are stored once.
+    """
+    def __init__(self, root_dir, max_bytes=2 * 1024 ** 3, max_age_seconds=14 * 24 * 3600):
+        self.root_dir = root_dir
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self._index = OrderedDict()  # evidence_id -> (written_at, size), oldest first
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        os.makedirs(root_dir, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        entries = []
+        for shard in os.listdir(self.root_dir):
+            shard_dir = os.path.join(self.root_dir, shard)
+            if not os.path.isdir(shard_dir):
+                continue
+            for name in os.listdir(shard_dir):
+                if EVIDENCE_ID_PATTERN.match(name):
+                    stat = os.stat(os.path.join(shard_dir, name))
+                    entries.append((stat.st_mtime, name, stat.st_size))
+        for mtime, name, size in sorted(entries):
+            self._index[name] = (mtime, size)
+            self._total_bytes += size
+
+    def path_for(self, evidence_id):
+        """Returns the on-disk path of a stored item, or None for unknown or malformed ids."""
+        if not EVIDENCE_ID_PATTERN.match(evidence_id):
+            return None
+        path = os.path.join(self.root_dir, evidence_id[:2], evidence_id)
+        return path if os.path.exists(path) else None
+
+    def put(self, data, extension):
+        """Stores the bytes and returns their evidence id ('<sha256>.<extension>')."""
+        evidence_id = f"{hashlib.sha256(data).hexdigest()}.{extension}"
+        shard_dir = os.path.join(self.root_dir, evidence_id[:2])
+        path = os.path.join(shard_dir, evidence_id)
+        now = time.time()
+        with self._lock:
+            if evidence_id in self._index:
+                os.utime(path, (now, now))
+                self._index.move_to_end(evidence_id)
+                self._index[evidence_id] = (now, self._index[evidence_id][1])
+                return evidence_id
+
+        os.makedirs(shard_dir, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._index[evidence_id] = (now, len(data))
+            self._total_bytes += len(data)
+        self.enforce_retention(now)
+        return evidence_id
+
+    def enforce_retention(self, now=None):
+        """Deletes the oldest items until the store is within its age and size limits."""
+        now = time.time() if now is None else now
+        removed = []
+        with self._lock:
+            while self._index:
+                evidence_id, (written_at, size) = next(iter(self._index.items()))
+                if self._total_bytes <= self.max_bytes and now - written_at <= self.max_age_seconds:
+                    break
+                del self._index[evidence_id]
+                self._total_bytes -= size
+                removed.append(evidence_id)
+        for evidence_id in removed:
+            try:
+                os.remove(os.path.join(self.root_dir, evidence_id[:2], evidence_id))
+            except FileNotFoundError:
+                pass
+        return removed
+
+    def stats(self):
+        with self._lock:
+            return {'items': len(self._index), 'bytes': self._total_bytes, 'max_bytes': self.max_bytes}
+
+
+class EvidenceJob:
+    """Evidence to capture for one alert: the annotated snapshot plus a pre/post-event clip."""
+    def __init__(self, alert_id, camera_id, snapshot_jpeg, event_time, frame_buffer, pre_seconds, post_seconds):
+        self.alert_id = alert_id
+        self.camera_id = camera_id
+        self.snapshot_jpeg = snapshot_jpeg
+        self.event_time = event_time
+        self.frame_buffer = frame_buffer
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+
+
+class AsyncEvidenceWriter:
+    """Background thread that writes evidence to the store and hands the references to a callback.
+
+    Jobs wait until their post-event window has been buffered. The frame loop never blocks:
+    when the queue is full the job is dropped.
+    """
+    def __init__(self, store, on_written, max_pending=64):
+        self.store = store
+        self.on_written = on_written  # called as on_written(alert_id, {'snapshot': id, 'clip': id})
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._run, name='evidence-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, job):
+        try:
+            self._queue.put_nowait(job)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            print(f"Evidence queue full, dropping evidence for alert {job.alert_id}")
+            return False
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            try:
+                wait = job.event_time + job.post_seconds - time.time()
+                if wait > 0:
+                    time.sleep(wait)
+                references = {'snapshot': self.store.put(job.snapshot_jpeg, 'jpg')}
+                clip_frames = job.frame_buffer.frames_between(job.event_time - job.pre_seconds, job.event_time + job.post_seconds)
+                if clip_frames:
+                    references['clip'] = self.store.put(encode_mjpeg(clip_frames), 'mjpeg')
+                    references['clip_frames'] = len(clip_frames)
+                self.on_written(job.alert_id, references)
+            except Exception as e:
+                print(f"Error writing evidence for alert {job.alert_id}: {e}")
+            finally:
+                self._queue.task_done()
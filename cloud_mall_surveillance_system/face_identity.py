@@ -0,0 +1,154 @@
+import os
+import json
+import pickle
+import cv2
+import numpy as np
+
+# --- Cascaded Face Identification ---
+# The YOLO model already localizes faces: a no_mask box is an uncovered face. Instead of running
+# dlib's HOG detector over the whole frame (as FaceRecognitionSystem does), the detection loop
+# hands those boxes to FaceIdentifier, which runs only the 68-point landmarks, the 128D
+# descriptor and the gallery match on a crop around each one. 'person' boxes, for models that
+# have that class, get a HOG pass over just the head region of the crop.
+#
+# The gallery, dlib models and calibrated tolerances are the ones FaceRecognitionSystem uses
+# (encodings.pkl from enroll_faces.py, recognition_config.json from calibrate_tolerance.py), and
+# so is the quality gate (common/face_quality.py): blurred or turned faces get no descriptor and
+# are left out rather than reported as UNKNOWN.
+
+UNKNOWN = "Unknown"
+
+
+class FaceIdentifier:
+    """Matches faces inside detector boxes against the enrolled gallery."""
+    def __init__(self, models_dir, gallery_path, config_path=None, face_classes=('no_mask',),
+                 person_classes=('person',), min_face_size=40, max_faces=4, tolerance=0.36, quality_gate=None):
+        self.models_dir = models_dir
+        self.gallery_path = gallery_path
+        self.config_path = config_path
+        self.face_classes = set(face_classes)
+        self.person_classes = set(person_classes)
+        self.min_face_size = min_face_size
+        self.max_faces = max_faces  # per frame, largest boxes first, to bound the per-frame cost
+        self.tolerance = tolerance
+        self.quality_gate = quality_gate  # common.face_quality.QualityGate, or None to describe every face
+        self.identity_tolerances = {}
+        self.gallery = np.empty((0, 128))
+        self.names = np.array([], dtype=object)
+        self.loaded = False
+        self.faces_identified = 0
+        self.faces_skipped = 0
+        self._dlib = self._detector = self._predictor = self._recognizer = None
+
+    def load(self):
+        """Loads dlib, the models and the gallery; raises if any of them is unavailable."""
+        import dlib  # optional dependency, only needed when identification is enabled
+
+        predictor_path = os.path.join(self.models_dir, "shape_predictor_68_face_landmarks.dat")
+        recognizer_path = os.path.join(self.models_dir, "dlib_face_recognition_resnet_model_v1.dat")
+        for path in (predictor_path, recognizer_path, self.gallery_path):
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"Face identification needs {path}")
+
+        with open(self.gallery_path, 'rb') as f:
+            gallery = pickle.load(f)
+        self.gallery = np.array(gallery["encodings"], dtype=np.float64).reshape(-1, 128)
+        self.names = np.array(gallery["names"], dtype=object)
+
+        if self.config_path and os.path.exists(self.config_path):
+            with open(self.config_path, 'r') as f:
+                config = json.load(f)
+            self.tolerance = float(config.get('tolerance', self.tolerance))
+            self.identity_tolerances = {name: float(v) for name, v in config.get('identity_tolerances', {}).items()}
+
+        self._dlib = dlib
+        self._predictor = dlib.shape_predictor(predictor_path)
+        self._recognizer = dlib.face_recognition_model_v1(recognizer_path)
+        if self.person_classes:
+            self._detector = dlib.get_frontal_face_detector()
+        self.loaded = True
+        print(f"Face identification ready: {len(self.gallery)} gallery faces for {len(set(self.names))} people, "
+              f"tolerance {self.tolerance}.")
+
+    def wants(self, class_names):
+        """Whether any detected class is one this stage looks at (so the caller can skip the call)."""
+        return self.loaded and any(name in self.face_classes or name in self.person_classes for name in class_names)
+
+    def identify(self, frame, class_names, xyxy):
+        """Returns {detection index: (name, distance)} for the face and person boxes in a BGR frame.
+
+        name is an enrolled person's name or UNKNOWN; boxes without a usable face, including faces
+        that fail the quality gate, are left out.
+        """
+        if not self.loaded:
+            return {}
+        height, width = frame.shape[:2]
+        candidates = [
+            i for i, name in enumerate(class_names)
+            if name in self.face_classes or name in self.person_classes
+        ]
+        # Largest boxes first: they are the closest faces and the most reliable descriptors
+        candidates.sort(key=lambda i: -(xyxy[i][2] - xyxy[i][0]) * (xyxy[i][3] - xyxy[i][1]))
+
+        identities = {}
+        for i in candidates:
+            x1, y1, x2, y2 = (int(v) for v in xyxy[i])
+            if min(x2 - x1, y2 - y1) < self.min_face_size or len(identities) >= self.max_faces:
+                self.faces_skipped += 1
+                continue
+            if class_names[i] in self.person_classes:
+                # Faces sit in the top part of a person box
+                y2 = y1 + max(int((y2 - y1) * 0.4), self.min_face_size)
+
+            # Crop with a margin so the landmarks at the edge of the box stay inside the image
+            margin_x, margin_y = (x2 - x1) // 5, (y2 - y1) // 5
+            cx1, cy1 = max(x1 - margin_x, 0), max(y1 - margin_y, 0)
+            cx2, cy2 = min(x2 + margin_x, width), min(y2 + margin_y, height)
+            crop = np.ascontiguousarray(cv2.cvtColor(frame[cy1:cy2, cx1:cx2], cv2.COLOR_BGR2RGB))
+
+            if class_names[i] in self.person_classes:
+                faces = self._detector(crop, 0)
+                if not faces:
+                    self.faces_skipped += 1
+                    continue
+                face_rect = max(faces, key=lambda face: face.area())
+            else:
+                face_rect = self._dlib.rectangle(x1 - cx1, y1 - cy1, x2 - cx1, y2 - cy1)
+
+            gate = self.quality_gate
+            if gate is not None:
+                gray_crop = cv2.cvtColor(crop, cv2.COLOR_RGB2GRAY) if gate.enabled else None
+                skip_reason, _ = gate.check_box(gray_crop, face_rect)
+                if skip_reason:
+                    self.faces_skipped += 1
+                    continue
+            shape = self._predictor(crop, face_rect)
+            if gate is not None and gate.check_pose(shape)[0]:
+                self.faces_skipped += 1
+                continue
+            encoding = np.array(self._recognizer.compute_face_descriptor(crop, shape))
+            identities[i] = self.match(encoding)
+            self.faces_identified += 1
+        return identities
+
+    def match(self, encoding):
+        """Nearest gallery face, accepted below that person's tolerance; returns (name, distance)."""
+        if not len(self.gallery):
+            return UNKNOWN, None
+        distances = np.linalg.norm(self.gallery - encoding, axis=1)
+        nearest = int(np.argmin(distances))
+        distance = float(distances[nearest])
+        name = self.names[nearest]
+        if distance < self.identity_tolerances.get(name, self.tolerance):
+            return name, round(distance, 3)
+        return UNKNOWN, round(distance, 3)
+
+    def stats(self):
+        return {
+            'enabled': self.loaded,
+            'gallery_faces': int(len(self.gallery)),
+            'faces_identified': self.faces_identified,
+            'faces_skipped': self.faces_skipped,
+            'tolerance': self.tolerance,
+            'quality_gate': self.quality_gate.stats() if self.quality_gate else None,
+        }
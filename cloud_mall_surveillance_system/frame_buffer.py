@@ -0,0 +1,159 @@
+import os
+import cv2
+import time
+import threading
+import tempfile
+import numpy as np
+
+
+# --- Per-Camera Encoded Frame History ---
+class FrameRingBuffer:
+    """Fixed-memory ring buffer of one camera's encoded JPEG frames.
+
+    All memory is allocated up front: one bytearray arena for the JPEG data plus fixed-size
+    index arrays. Frames are written back to back into the arena; the oldest frames are
+    overwritten once the arena, the frame slots or the configured duration run out.
+    """
+    def __init__(self, duration_seconds=30.0, capacity_bytes=64 * 1024 ** 2, max_frames=1800):
+        self.duration_seconds = duration_seconds
+        self.capacity_bytes = capacity_bytes
+        self.max_frames = max_frames
+        self._arena = bytearray(capacity_bytes)
+        self._timestamps = np.zeros(max_frames, dtype=np.float64)
+        self._offsets = np.zeros(max_frames, dtype=np.int64)
+        self._lengths = np.zeros(max_frames, dtype=np.int64)
+        self._head = 0        # slot of the oldest frame
+        self._count = 0       # frames currently held
+        self._write_pos = 0   # arena offset where the next frame goes
+        self._used_bytes = 0
+        self.dropped = 0      # frames larger than the whole arena
+        self._lock = threading.Lock()
+
+    def _evict_oldest(self):
+        self._used_bytes -= int(self._lengths[self._head])
+        self._head = (self._head + 1) % self.max_frames
+        self._count -= 1
+
+    def append(self, jpeg_bytes, timestamp=None):
+        timestamp = time.time() if timestamp is None else timestamp
+        size = len(jpeg_bytes)
+        if size > self.capacity_bytes:
+            self.dropped += 1
+            return
+        with self._lock:
+            pos = self._write_pos
+            if pos + size > self.capacity_bytes:
+                # Wrap around: the frames still in the arena tail are the oldest ones, drop them first
+                while self._count and self._offsets[self._head] >= pos:
+                    self._evict_oldest()
+                pos = 0
+            # Drop the frames the new one overwrites, plus anything out of slots or too old
+            while self._count and (
+                self._count == self.max_frames
+                or (self._offsets[self._head] < pos + size and self._offsets[self._head] + self._lengths[self._head] > pos)
+                or timestamp - self._timestamps[self._head] > self.duration_seconds
+            ):
+                self._evict_oldest()
+
+            self._arena[pos:pos + size] = jpeg_bytes
+            slot = (self._head + self._count) % self.max_frames
+            self._timestamps[slot] = timestamp
+            self._offsets[slot] = pos
+            self._lengths[slot] = size
+            self._count += 1
+            self._used_bytes += size
+            self._write_pos = pos + size
+
+    def frames_between(self, start, end):
+        """Returns copies of the (timestamp, jpeg bytes) frames captured in [start, end]."""
+        with self._lock:
+            slots = (self._head + np.arange(self._count)) % self.max_frames
+            timestamps = self._timestamps[slots]
+            selected = slots[(timestamps >= start) & (timestamps <= end)]
+            return [
+                (float(self._timestamps[slot]), bytes(self._arena[self._offsets[slot]:self._offsets[slot] + self._lengths[slot]]))
+                for slot in selected.tolist()
+            ]
+
+    def stats(self):
+        with self._lock:
+            oldest = float(self._timestamps[self._head]) if self._count else None
+            newest = float(self._timestamps[(self._head + self._count - 1) % self.max_frames]) if self._count else None
+            return {
+                'frames': self._count,
+                'used_bytes': self._used_bytes,
+                'allocated_bytes': self.allocated_bytes,
+                'oldest': oldest,
+                'newest': newest,
+                'dropped': self.dropped,
+            }
+
+    @property
+    def allocated_bytes(self):
+        return self.capacity_bytes + self._timestamps.nbytes + self._offsets.nbytes + self._lengths.nbytes
+
+
+class FrameBufferRegistry:
+    """Lazily creates one FrameRingBuffer per camera, all with the same fixed allocation."""
+    def __init__(self, duration_seconds=30.0, capacity_bytes=64 * 1024 ** 2, max_frames=1800):
+        self.duration_seconds = duration_seconds
+        self.capacity_bytes = capacity_bytes
+        self.max_frames = max_frames
+        self._buffers = {}
+        self._lock = threading.Lock()
+
+    def get(self, camera_id):
+        with self._lock:
+            buffer = self._buffers.get(camera_id)
+            if buffer is None:
+                buffer = self._buffers[camera_id] = FrameRingBuffer(self.duration_seconds, self.capacity_bytes, self.max_frames)
+            return buffer
+
+    def find(self, camera_id):
+        """Returns the camera's buffer without creating one."""
+        with self._lock:
+            return self._buffers.get(camera_id)
+
+    def stats(self):
+        with self._lock:
+            buffers = dict(self._buffers)
+        cameras = {str(camera_id): buffer.stats() for camera_id, buffer in buffers.items()}
+        return {
+            'duration_seconds': self.duration_seconds,
+            'allocated_bytes': sum(stats['allocated_bytes'] for stats in cameras.values()),
+            'used_bytes': sum(stats['used_bytes'] for stats in cameras.values()),
+            'cameras': cameras,
+        }
+
+
+# --- Clip Export ---
+def encode_mjpeg(frames):
+    """Concatenates buffered JPEG frames into an MJPEG stream."""
+    return b''.join(data for _, data in frames)
+
+
+def encode_mp4(frames):
+    """Decodes buffered JPEG frames and re-encodes them as an MP4 clip. Returns the MP4 bytes."""
+    if not frames:
+        return b''
+    elapsed = frames[-1][0] - frames[0][0]
+    fps = (len(frames) - 1) / elapsed if elapsed > 0 else 15.0
+    first = cv2.imdecode(np.frombuffer(frames[0][1], np.uint8), cv2.IMREAD_COLOR)
+    height, width = first.shape[:2]
+
+    fd, path = tempfile.mkstemp(suffix='.mp4')
+    os.close(fd)
+    try:
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+        for _, data in frames:
+            image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+            if image is None:
+                continue
+            if image.shape[:2] != (height, width):
+                image = cv2.resize(image, (width, height))
+            writer.write(image)
+        writer.release()
+        with open(path, 'rb') as f:
+            return f.read()
+    finally:
+        os.remove(path)
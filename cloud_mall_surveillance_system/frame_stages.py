@@ -0,0 +1,69 @@
+import cv2
+from detections import Detections
+from face_identity import UNKNOWN
+from tracker import track_confidences
+
+# --- Detection Loop Stages ---
+# The steps of one detection-loop frame that do not touch the app's globals: inference (whole frame
+# or ROI crops/tiles), annotation, face identification and the debouncer input. app.py's
+# detection_frames() and benchmark_pipeline.py both call these, so the benchmark times the code
+# the app runs rather than a copy of it.
+
+
+def infer(model, frame, region_detector, region_plan, imgsz=None):
+    """One inference: the model's Results for the whole frame, or merged Detections over the region plan."""
+    kwargs = {} if imgsz is None else {'imgsz': imgsz}
+    if region_plan is None:
+        return model(frame, **kwargs)[0]
+    return region_detector.detect(model, frame, region_plan, **kwargs)
+
+
+def annotate(frame, output, names, region_plan):
+    """(Detections, annotated copy of the frame) from infer()'s output."""
+    if region_plan is None:
+        return Detections.from_boxes(output.boxes, names), output.plot()
+    return output, draw_detections(frame, output, region_plan)
+
+
+def draw_detections(frame, detections, region_plan):
+    """Annotated copy of a frame inferred by regions: ROI outlines, boxes and class labels."""
+    annotated_frame = frame.copy()
+    if region_plan.polygons:
+        cv2.polylines(annotated_frame, region_plan.polygons, True, (255, 200, 0), 1)
+    for name, score, box in zip(detections.class_names().tolist(), detections.conf.tolist(), detections.xyxy.tolist()):
+        x1, y1, x2, y2 = (int(v) for v in box)
+        cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), (0, 0, 255), 2)
+        cv2.putText(annotated_frame, f"{name} {score:.2f}", (x1, max(y1 - 6, 12)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 1)
+    return annotated_frame
+
+
+def draw_track_ids(annotated_frame, track_ids, xyxy):
+    """Writes each tracked detection's ID inside the top-right corner of its box."""
+    for track_id, box in zip(track_ids.tolist(), xyxy.tolist()):
+        if track_id >= 0:
+            cv2.putText(annotated_frame, f"#{track_id}", (int(box[2]) - 40, int(box[1]) + 18),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+
+
+def draw_identity(annotated_frame, name, box):
+    """Writes the matched name under a detection box."""
+    x1, _, _, y2 = (int(v) for v in box)
+    color = (0, 0, 255) if name == UNKNOWN else (0, 200, 0)
+    cv2.putText(annotated_frame, name, (x1, y2 + 18), cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+
+
+def identify_faces(face_identifier, frame, detections, class_names, annotated_frame):
+    """Identifies faces in the detections' face/person boxes, stores and draws the names; returns
+    face_identifier.identify()'s {index: (name, distance)}."""
+    identities = face_identifier.identify(frame, class_names, detections.xyxy)
+    for i, (name, _) in identities.items():
+        detections.identities[i] = name
+        draw_identity(annotated_frame, name, detections.xyxy[i])
+    return identities
+
+
+def alert_confidences(evaluation, detections):
+    """Debouncer input: best confidence per alerting track when tracking, else per alerting class."""
+    if detections.track_ids is None:
+        return evaluation.alert_confidences
+    return track_confidences(detections, evaluation.alerting(detections.cls))
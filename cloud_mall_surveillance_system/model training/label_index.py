@@ -0,0 +1,254 @@
+import os
+import json
+import argparse
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from tqdm import tqdm # This line requires the 'tqdm' library to be installed
+
+from split_dataset import CLASS_NAMES, YOLO_CLASS_NAMES, IMAGE_EXTENSIONS
+
+# Indexes every YOLO label file under a dataset folder (the raw 'datasets' tree or a split
+# 'yolo_dataset') into one NumPy structured array with a row per box, cached next to the labels.
+# A re-run only re-reads label files whose size or modification time changed, so validation
+# and class statistics take well under a second on the full dataset.
+#
+# Labels in the raw tree carry the annotation tool's class IDs; split_dataset() replaces them with
+# the category folder's ID (CLASS_NAMES), so boxes under a category folder are validated and
+# counted as that folder's class. Labels anywhere else (the split output) keep their own IDs.
+#
+#   python label_index.py datasets
+#   python label_index.py yolo_dataset/labels --json label_report.json
+
+LABEL_DTYPE = np.dtype([
+    ('file', np.int32),   # index into LabelIndex.files
+    ('cls', np.int16),
+    ('cx', np.float32),
+    ('cy', np.float32),
+    ('w', np.float32),
+    ('h', np.float32),
+])
+CACHE_NAME = ".label_index.npz"
+NON_LABEL_FILES = {"classes.txt"}
+
+SIZE_BINS = np.array([0, 0.02, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0 + 1e-6])  # sqrt(w * h), image fraction
+IMBALANCE_WARNING_RATIO = 3.0
+
+
+def parse_label(path):
+    """Reads one label file; returns (list of (cls, cx, cy, w, h), number of malformed lines)."""
+    rows = []
+    malformed = 0
+    with open(path, 'r', errors='replace') as f:
+        for line in f:
+            parts = line.split()
+            if not parts:
+                continue
+            try:
+                if len(parts) != 5:
+                    raise ValueError
+                rows.append((int(parts[0]), float(parts[1]), float(parts[2]), float(parts[3]), float(parts[4])))
+            except ValueError:
+                malformed += 1
+    return rows, malformed
+
+
+def scan_labels(root):
+    """Lists label files (relative paths) and images that have no label file under root."""
+    labels, unlabeled_images = [], []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        names = set(filenames)
+        for name in sorted(filenames):
+            lower = name.lower()
+            if lower.endswith('.txt') and name not in NON_LABEL_FILES:
+                labels.append(os.path.relpath(os.path.join(dirpath, name), root))
+            elif lower.endswith(IMAGE_EXTENSIONS) and os.path.splitext(name)[0] + '.txt' not in names:
+                unlabeled_images.append(os.path.relpath(os.path.join(dirpath, name), root))
+    return labels, unlabeled_images
+
+
+class LabelIndex:
+    """All boxes of all label files under `root` as one LABEL_DTYPE array."""
+    def __init__(self, root, files, stats, malformed, boxes, unlabeled_images=()):
+        self.root = root
+        self.files = list(files)
+        self.stats = stats              # (n_files, 2) int64: size, mtime_ns
+        self.malformed = malformed      # malformed line count per file
+        self.boxes = boxes
+        self.unlabeled_images = list(unlabeled_images)
+
+    @classmethod
+    def build(cls, root, workers=16, use_cache=True):
+        """Indexes root, re-reading only label files that changed since the cached index."""
+        label_files, unlabeled_images = scan_labels(root)
+        stats = np.array(
+            [(st.st_size, st.st_mtime_ns) for st in (os.stat(os.path.join(root, path)) for path in label_files)],
+            dtype=np.int64,
+        ).reshape(-1, 2)
+
+        cached = cls.load_cache(root) if use_cache else None
+        reuse = {}  # new file id -> cached file id
+        if cached is not None:
+            cached_ids = {path: i for i, path in enumerate(cached.files)}
+            for i, path in enumerate(label_files):
+                old = cached_ids.get(path)
+                if old is not None and np.array_equal(cached.stats[old], stats[i]):
+                    reuse[i] = old
+
+        malformed = np.zeros(len(label_files), dtype=np.int32)
+        parts = []
+        if reuse:
+            # Carry over cached rows, renumbering their file ids
+            remap = np.full(len(cached.files), -1, dtype=np.int32)
+            new_ids = np.fromiter(reuse.keys(), dtype=np.int32, count=len(reuse))
+            old_ids = np.fromiter(reuse.values(), dtype=np.int32, count=len(reuse))
+            remap[old_ids] = new_ids
+            malformed[new_ids] = cached.malformed[old_ids]
+            kept = cached.boxes[remap[cached.boxes['file']] >= 0].copy()
+            kept['file'] = remap[kept['file']]
+            parts.append(kept)
+
+        to_read = [i for i in range(len(label_files)) if i not in reuse]
+        if to_read:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                results = pool.map(lambda i: parse_label(os.path.join(root, label_files[i])), to_read)
+                for i, (rows, bad_lines) in zip(to_read, tqdm(results, total=len(to_read), desc="Reading labels")):
+                    malformed[i] = bad_lines
+                    if rows:
+                        part = np.empty(len(rows), dtype=LABEL_DTYPE)
+                        part['file'] = i
+                        values = np.asarray(rows, dtype=np.float64)
+                        part['cls'] = values[:, 0]
+                        part['cx'], part['cy'], part['w'], part['h'] = values[:, 1:].T
+                        parts.append(part)
+
+        boxes = np.concatenate(parts) if parts else np.empty(0, dtype=LABEL_DTYPE)
+        boxes = boxes[np.argsort(boxes['file'], kind='stable')]
+        index = cls(root, label_files, stats, malformed, boxes, unlabeled_images)
+        print(f"Indexed {len(label_files)} label files ({len(to_read)} read, {len(reuse)} from cache), {len(boxes)} boxes.")
+        if to_read or cached is None or len(reuse) != len(cached.files):
+            index.save_cache()
+        return index
+
+    # --- Cache ---
+    @staticmethod
+    def cache_path(root):
+        return os.path.join(root, CACHE_NAME)
+
+    @classmethod
+    def load_cache(cls, root):
+        path = cls.cache_path(root)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                return cls(root, data['files'].tolist(), data['stats'], data['malformed'], data['boxes'])
+        except Exception as e:
+            print(f"Warning: Ignoring unreadable label cache '{path}': {e}")
+            return None
+
+    def save_cache(self):
+        path = self.cache_path(self.root)
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, files=np.array(self.files, dtype=np.str_), stats=self.stats,
+                 malformed=self.malformed, boxes=self.boxes)
+        os.replace(tmp_path, path)
+
+    # --- Queries ---
+    def boxes_per_file(self):
+        return np.bincount(self.boxes['file'], minlength=len(self.files))
+
+    def folder_classes(self):
+        """Per file, the CLASS_NAMES ID of the raw category folder it sits in, or -1 outside one."""
+        root_folder = os.path.basename(os.path.normpath(self.root))
+        folder_ids = []
+        for path in self.files:
+            folder = path.split(os.sep)[0] if os.sep in path else root_folder
+            folder_ids.append(CLASS_NAMES.get(folder, -1))
+        return np.array(folder_ids, dtype=np.int16)
+
+    def box_classes(self):
+        """The class ID each box trains as: its category folder's ID in the raw tree, else its own."""
+        folder_cls = self.folder_classes()[self.boxes['file']] if len(self.files) else np.empty(0, dtype=np.int16)
+        return np.where(folder_cls >= 0, folder_cls, self.boxes['cls'])
+
+    def validate(self, num_classes=len(YOLO_CLASS_NAMES)):
+        """Returns a report dict: problem files, class balance and box-size histograms."""
+        boxes = self.boxes
+        cx, cy, w, h = boxes['cx'], boxes['cy'], boxes['w'], boxes['h']
+        out_of_range = (
+            (cx < 0) | (cx > 1) | (cy < 0) | (cy > 1) | (w <= 0) | (h <= 0)
+            | (cx - w / 2 < -1e-3) | (cx + w / 2 > 1 + 1e-3) | (cy - h / 2 < -1e-3) | (cy + h / 2 > 1 + 1e-3)
+        )
+        box_cls = self.box_classes()
+        unknown_class = (box_cls < 0) | (box_cls >= num_classes)
+        per_file = self.boxes_per_file()
+
+        def file_list(file_ids):
+            return [self.files[i] for i in np.unique(file_ids).tolist()]
+
+        class_boxes = np.bincount(box_cls[~unknown_class], minlength=num_classes)
+        class_files = np.array([
+            len(np.unique(boxes['file'][box_cls == class_id])) for class_id in range(num_classes)
+        ])
+        present = class_boxes[class_boxes > 0]
+        imbalance = float(present.max() / present.min()) if len(present) else 0.0
+
+        size = np.sqrt(np.clip(w, 0, None) * np.clip(h, 0, None))
+        histograms = {
+            YOLO_CLASS_NAMES[class_id]: np.histogram(size[box_cls == class_id], bins=SIZE_BINS)[0].tolist()
+            for class_id in range(num_classes)
+        }
+        return {
+            'files': len(self.files),
+            'boxes': int(len(boxes)),
+            'empty_labels': file_list(np.flatnonzero((per_file == 0) & (self.malformed == 0))),
+            'malformed_labels': file_list(np.flatnonzero(self.malformed)),
+            'out_of_range': file_list(boxes['file'][out_of_range]),
+            'unknown_classes': file_list(boxes['file'][unknown_class]),
+            'unlabeled_images': self.unlabeled_images,
+            'class_boxes': {YOLO_CLASS_NAMES[i]: int(n) for i, n in enumerate(class_boxes)},
+            'class_files': {YOLO_CLASS_NAMES[i]: int(n) for i, n in enumerate(class_files)},
+            'imbalance_ratio': round(imbalance, 2),
+            'size_bins': SIZE_BINS.round(3).tolist(),
+            'size_histograms': histograms,
+        }
+
+
+def print_report(report, examples=5):
+    print(f"\nLabel files: {report['files']}, boxes: {report['boxes']}")
+    for key, title in [('empty_labels', "Empty label files"), ('malformed_labels', "Files with malformed lines"),
+                       ('out_of_range', "Files with out-of-range boxes"), ('unknown_classes', "Files with unknown class IDs"),
+                       ('unlabeled_images', "Images without a label file")]:
+        files = report[key]
+        print(f"{title}: {len(files)}" + (f"  e.g. {', '.join(files[:examples])}" if files else ""))
+
+    print("\nClass balance (boxes / files):")
+    for name, count in report['class_boxes'].items():
+        print(f"  {name:<16} {count:>7} / {report['class_files'][name]}")
+    if report['imbalance_ratio'] > IMBALANCE_WARNING_RATIO:
+        print(f"Warning: The most common class has {report['imbalance_ratio']}x the boxes of the rarest one.")
+
+    bins = report['size_bins']
+    labels = [f"{bins[i]:.2f}-{min(bins[i + 1], 1.0):.2f}" for i in range(len(bins) - 1)]
+    print("\nBox size histogram (sqrt(w*h) as a fraction of the image):")
+    print("  " + " " * 16 + "".join(f"{label:>11}" for label in labels))
+    for name, counts in report['size_histograms'].items():
+        print(f"  {name:<16}" + "".join(f"{count:>11}" for count in counts))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index, validate and summarize YOLO label files.")
+    parser.add_argument('root', nargs='?', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'datasets'),
+                        help="Folder searched recursively for label .txt files")
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--rebuild', action='store_true', help="Ignore the cached index")
+    parser.add_argument('--json', help="Also write the full report to this file")
+    args = parser.parse_args()
+
+    report = LabelIndex.build(args.root, workers=args.workers, use_cache=not args.rebuild).validate()
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nFull report written to '{args.json}'.")
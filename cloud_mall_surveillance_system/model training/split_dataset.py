@@ -1,10 +1,77 @@
 import os
+import json
+import errno
 import shutil
 import random
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm # This line requires the 'tqdm' library to be installed
 
 #ensure you have your dataset and are done with annotating the dataset with right labels
 
+# Define your class names and their corresponding integer IDs
+# IMPORTANT: The order here defines the class IDs (0, 1, 2, 3) in your YOLO labels.
+# Ensure this matches how you want them to be interpreted by the model.
+CLASS_NAMES = {
+    "no_mask": 0,
+    "medical_mask": 1,
+    "other_coverings": 2,
+    "weapons": 3
+}
+
+# Map for data.yaml
+YOLO_CLASS_NAMES = [
+    "no_mask",
+    "mask",
+    "other_coverings",
+    "weapon"
+]
+
+SPLITS = ("train", "val", "test")
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+MANIFEST_NAME = "split_manifest.json"
+
+def rewrite_label(label_path, class_id, target_path):
+    """Copies a YOLO label file to target_path with every box's class ID replaced by class_id."""
+    with open(label_path, 'r') as f_in:
+        lines = f_in.readlines()
+
+    new_lines = []
+    for line in lines:
+        parts = line.strip().split()
+        if parts:
+            # The first part is the class ID. Replace it with the new class ID.
+            parts[0] = str(class_id)
+            new_lines.append(" ".join(parts))
+
+    with open(target_path, 'w') as f_out:
+        f_out.write("\n".join(new_lines))
+
+
+def write_data_yaml(output_dir_path):
+    """Writes data.yaml for YOLO training and returns its path."""
+    data_yaml_path = os.path.join(output_dir_path, "data.yaml")
+    with open(data_yaml_path, 'w') as f:
+        # The 'path' in data.yaml should be relative to where you run the YOLO train.py script.
+        # If you place yolo_dataset inside 'faceMask_WeaponDetectionSystem',
+        # and run train.py from 'faceMask_WeaponDetectionSystem', then 'path: ./yolo_dataset' is correct.
+        # If you run train.py from 'ultralytics' folder, and 'faceMask_WeaponDetectionSystem' is a sibling,
+        # then 'path: ../faceMask_WeaponDetectionSystem/yolo_dataset' would be needed.
+        # For simplicity, let's assume you'll run train.py from 'faceMask_WeaponDetectionSystem'
+        # or adjust the path in data.yaml manually later if needed.
+        f.write(f"path: {os.path.basename(output_dir_path)}\n") # This will be 'yolo_dataset'
+        f.write("train: images/train\n")
+        f.write("val: images/val\n")
+        f.write("test: images/test\n\n") # Optional, but good practice
+
+        f.write(f"nc: {len(YOLO_CLASS_NAMES)}\n")
+        f.write("names:\n")
+        for i, name in enumerate(YOLO_CLASS_NAMES):
+            f.write(f"  {i}: {name}\n")
+    return data_yaml_path
+
+
 def split_dataset(base_dir, output_dir_path, train_ratio=0.8, val_ratio=0.1, test_ratio=0.1, random_seed=42):
     """
     Splits an image dataset with YOLO annotations into train, validation, and test sets.
@@ -30,23 +97,7 @@ def split_dataset(base_dir, output_dir_path, train_ratio=0.8, val_ratio=0.1, tes
 
     random.seed(random_seed)
 
-    # Define your class names and their corresponding integer IDs
-    # IMPORTANT: The order here defines the class IDs (0, 1, 2, 3) in your YOLO labels.
-    # Ensure this matches how you want them to be interpreted by the model.
-    class_names = {
-        "no_mask": 0,
-        "medical_mask": 1,
-        "other_coverings": 2,
-        "weapons": 3
-    }
-    
-    # Map for data.yaml
-    yolo_class_names = [
-        "no_mask",
-        "mask",
-        "other_coverings",
-        "weapon"
-    ]
+    class_names = CLASS_NAMES
 
     all_files = [] # List to hold (image_path, label_path, class_id) tuples
 
@@ -106,19 +157,7 @@ def split_dataset(base_dir, output_dir_path, train_ratio=0.8, val_ratio=0.1, tes
             shutil.copy(img_path, os.path.join(target_images_dir, img_filename))
             
             # Read original label, replace class ID, and save to new location
-            with open(label_path, 'r') as f_in:
-                lines = f_in.readlines()
-            
-            new_lines = []
-            for line in lines:
-                parts = line.strip().split()
-                if parts:
-                    # The first part is the class ID. Replace it with the new class ID.
-                    parts[0] = str(original_class_id) 
-                    new_lines.append(" ".join(parts))
-            
-            with open(os.path.join(target_labels_dir, label_filename), 'w') as f_out:
-                f_out.write("\n".join(new_lines))
+            rewrite_label(label_path, original_class_id, os.path.join(target_labels_dir, label_filename))
 
 
     print("\nCopying training files...")
@@ -131,29 +170,224 @@ def split_dataset(base_dir, output_dir_path, train_ratio=0.8, val_ratio=0.1, tes
     copy_files(test_files, os.path.join(output_images_dir, "test"), os.path.join(output_labels_dir, "test"))
 
     # Create data.yaml for YOLO training
-    data_yaml_path = os.path.join(output_dir_path, "data.yaml")
-    with open(data_yaml_path, 'w') as f:
-        # The 'path' in data.yaml should be relative to where you run the YOLO train.py script.
-        # If you place yolo_dataset inside 'faceMask_WeaponDetectionSystem',
-        # and run train.py from 'faceMask_WeaponDetectionSystem', then 'path: ./yolo_dataset' is correct.
-        # If you run train.py from 'ultralytics' folder, and 'faceMask_WeaponDetectionSystem' is a sibling,
-        # then 'path: ../faceMask_WeaponDetectionSystem/yolo_dataset' would be needed.
-        # For simplicity, let's assume you'll run train.py from 'faceMask_WeaponDetectionSystem'
-        # or adjust the path in data.yaml manually later if needed.
-        f.write(f"path: {os.path.basename(output_dir_path)}\n") # This will be 'yolo_dataset'
-        f.write("train: images/train\n")
-        f.write("val: images/val\n")
-        f.write("test: images/test\n\n") # Optional, but good practice
-
-        f.write(f"nc: {len(yolo_class_names)}\n")
-        f.write("names:\n")
-        for i, name in enumerate(yolo_class_names):
-            f.write(f"  {i}: {name}\n")
+    data_yaml_path = write_data_yaml(output_dir_path)
 
     print(f"\nDataset split and organized successfully in '{output_dir_path}'!")
     print(f"A 'data.yaml' file has been created at '{data_yaml_path}' for YOLO training configuration.")
     print("Next, we'll move on to Model Selection and Training!")
 
+# --- Incremental Splitting ---
+# split_dataset() re-copies every image on each run. split_dataset_incremental() keeps a manifest
+# (split_manifest.json in the output folder) of each source file's content hashes and assigned
+# split, so a re-run only places new or changed files and removes outputs of deleted ones.
+# Output files are named '<category folder>__<file name>', since the same file name can appear in
+# several category folders, and any file in the split folders the manifest does not track (left by
+# split_dataset(), which keeps no manifest, or by an older run) is deleted so no image can end up
+# in two splits.
+# Images are reflinked or hardlinked instead of copied where the filesystem allows it.
+
+def file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def assign_split(image_hash, train_ratio, val_ratio, random_seed):
+    """Picks a split from the image's content hash, so the same image always lands in the same
+    split (duplicates cannot leak between train and test) regardless of listing order."""
+    position = int(hashlib.sha256(f"{random_seed}:{image_hash}".encode()).hexdigest()[:8], 16) / 0xFFFFFFFF
+    if position < train_ratio:
+        return "train"
+    if position < train_ratio + val_ratio:
+        return "val"
+    return "test"
+
+
+def _reflink(src, dst):
+    import fcntl
+    FICLONE = 0x40049409  # Linux ioctl; supported on btrfs, xfs and other copy-on-write filesystems
+    with open(src, 'rb') as f_src, open(dst, 'wb') as f_dst:
+        fcntl.ioctl(f_dst.fileno(), FICLONE, f_src.fileno())
+
+
+def place_image(src, dst, link_mode="auto"):
+    """Puts src at dst without copying data where possible; returns the method used.
+
+    link_mode 'auto' tries a reflink (copy-on-write clone), then a hardlink, then a plain copy.
+    A hardlinked output shares the source file, so edit images in the source folders only.
+    """
+    if os.path.lexists(dst):
+        os.remove(dst)
+    if link_mode in ("auto", "reflink"):
+        try:
+            _reflink(src, dst)
+            return "reflink"
+        except (OSError, ImportError):
+            if os.path.exists(dst):
+                os.remove(dst)
+            if link_mode == "reflink":
+                raise
+    if link_mode in ("auto", "hardlink"):
+        try:
+            os.link(src, dst)
+            return "hardlink"
+        except OSError as e:
+            if link_mode == "hardlink" or e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+                raise
+    shutil.copy(src, dst)
+    return "copy"
+
+
+def load_manifest(manifest_path):
+    if not os.path.exists(manifest_path):
+        return {}
+    try:
+        with open(manifest_path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Warning: Could not read manifest '{manifest_path}' ({e}). Starting a fresh one.")
+        return {}
+
+
+def save_manifest(manifest_path, manifest):
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+def split_dataset_incremental(base_dir, output_dir_path, train_ratio=0.8, val_ratio=0.1, test_ratio=0.1,
+                              random_seed=42, workers=8, link_mode="auto"):
+    """
+    Same output layout as split_dataset(), updated in place: only new or changed image-label pairs
+    are placed, and every file keeps the split it was first assigned to.
+
+    Args:
+        base_dir, output_dir_path, train_ratio, val_ratio, test_ratio, random_seed: As for split_dataset().
+        workers (int): Threads used for hashing, placing images and rewriting labels.
+        link_mode (str): 'auto', 'reflink', 'hardlink' or 'copy' (see place_image).
+    """
+    if abs(train_ratio + val_ratio + test_ratio - 1.0) > 1e-9:
+        print("Warning: Ratios do not sum to 1. Adjusting test_ratio.")
+        test_ratio = 1.0 - train_ratio - val_ratio
+        if test_ratio < 0:
+            raise ValueError("Invalid ratios. train_ratio + val_ratio is greater than 1.0")
+
+    manifest_path = os.path.join(output_dir_path, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path)
+    previous = manifest.get("files", {})
+    if previous and (manifest.get("random_seed"), manifest.get("ratios")) != (random_seed, [train_ratio, val_ratio, test_ratio]):
+        print("Note: Seed or ratios differ from the manifest; existing files keep their splits, new files use the new settings.")
+
+    # Collect source pairs, keyed by '<folder>/<image name>'
+    sources = {}
+    print(f"Collecting files from: {base_dir}")
+    for folder_name, class_id in CLASS_NAMES.items():
+        folder_path = os.path.join(base_dir, folder_name)
+        if not os.path.isdir(folder_path):
+            print(f"Warning: Directory '{folder_path}' not found. Skipping.")
+            continue
+        with os.scandir(folder_path) as entries:
+            names = {entry.name for entry in entries if entry.is_file()}
+        for img_name in sorted(names):
+            if not img_name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            label_name = os.path.splitext(img_name)[0] + '.txt'
+            if label_name not in names:
+                print(f"Warning: Annotation file not found for {img_name}. Skipping.")
+                continue
+            sources[f"{folder_name}/{img_name}"] = (
+                os.path.join(folder_path, img_name), os.path.join(folder_path, label_name), class_id
+            )
+
+    if not sources:
+        print("No image-label pairs found. Please check your base_dir and folder structure.")
+        return
+
+    # Hash only files whose size or modification time changed since the last run
+    def fingerprint(key):
+        img_path, label_path, class_id = sources[key]
+        img_stat, label_stat = os.stat(img_path), os.stat(label_path)
+        stat = [img_stat.st_size, img_stat.st_mtime_ns, label_stat.st_size, label_stat.st_mtime_ns]
+        entry = previous.get(key)
+        if entry and entry.get("stat") == stat:
+            return entry["image_hash"], entry["label_hash"], stat
+        return file_sha256(img_path), file_sha256(label_path), stat
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        keys = list(sources)
+        fingerprints = dict(zip(keys, tqdm(pool.map(fingerprint, keys), total=len(keys), desc="Hashing files")))
+
+    for split_type in SPLITS:
+        os.makedirs(os.path.join(output_dir_path, "images", split_type), exist_ok=True)
+        os.makedirs(os.path.join(output_dir_path, "labels", split_type), exist_ok=True)
+
+    def output_paths(key, split_type):
+        folder_name, img_name = key.split("/", 1)
+        img_name = f"{folder_name}__{img_name}"
+        label_name = os.path.splitext(img_name)[0] + '.txt'
+        return (os.path.join(output_dir_path, "images", split_type, img_name),
+                os.path.join(output_dir_path, "labels", split_type, label_name))
+
+    files = {}
+    image_jobs, label_jobs = [], []
+    counts = {"new": 0, "changed": 0, "unchanged": 0}
+    for key, (img_path, label_path, class_id) in sources.items():
+        image_hash, label_hash, stat = fingerprints[key]
+        entry = previous.get(key)
+        split_type = entry["split"] if entry else assign_split(image_hash, train_ratio, val_ratio, random_seed)
+        img_out, label_out = output_paths(key, split_type)
+        image_stale = not entry or entry["image_hash"] != image_hash or not os.path.exists(img_out)
+        label_stale = (not entry or entry["label_hash"] != label_hash or entry["class_id"] != class_id
+                       or not os.path.exists(label_out))
+        if image_stale:
+            image_jobs.append((img_path, img_out))
+        if label_stale:
+            label_jobs.append((label_path, class_id, label_out))
+        counts["new" if not entry else "changed" if image_stale or label_stale else "unchanged"] += 1
+        files[key] = {"split": split_type, "class_id": class_id, "image_hash": image_hash,
+                      "label_hash": label_hash, "stat": stat}
+
+    # Delete every output the new manifest does not track: outputs of removed sources, and files
+    # from split_dataset() or an older run that may sit in a different split than their source now
+    removed = [key for key in previous if key not in sources]
+    expected = {path for key, entry in files.items() for path in output_paths(key, entry["split"])}
+    untracked = 0
+    for kind in ("images", "labels"):
+        for split_type in SPLITS:
+            with os.scandir(os.path.join(output_dir_path, kind, split_type)) as entries:
+                stray = [entry.path for entry in entries if entry.is_file() and entry.path not in expected]
+            for path in stray:
+                os.remove(path)
+            untracked += len(stray)
+
+    print(f"\nTotal files found: {len(sources)}")
+    print(f"New: {counts['new']}, changed: {counts['changed']}, unchanged: {counts['unchanged']}, removed: {len(removed)}")
+    if untracked:
+        print(f"Deleted {untracked} output files the manifest does not track.")
+    for split_type in SPLITS:
+        print(f"{split_type.capitalize()} set size: {sum(1 for entry in files.values() if entry['split'] == split_type)}")
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        methods = list(tqdm(pool.map(lambda job: place_image(*job, link_mode=link_mode), image_jobs),
+                            total=len(image_jobs), desc="Placing images"))
+        list(tqdm(pool.map(lambda job: rewrite_label(*job), label_jobs),
+                  total=len(label_jobs), desc="Rewriting labels"))
+    if methods:
+        print("Images placed by " + ", ".join(f"{method}: {methods.count(method)}" for method in sorted(set(methods))))
+
+    save_manifest(manifest_path, {
+        "random_seed": random_seed,
+        "ratios": [train_ratio, val_ratio, test_ratio],
+        "files": files,
+    })
+    data_yaml_path = write_data_yaml(output_dir_path)
+    print(f"\nDataset updated in '{output_dir_path}'; manifest saved to '{manifest_path}'.")
+    print(f"A 'data.yaml' file has been created at '{data_yaml_path}' for YOLO training configuration.")
+
+
 if __name__ == "__main__":
     # --- IMPORTANT: Configure these paths ---
     # Path to the directory containing your 'no_mask', 'medical_mask', 'other_coverings', and 'weapons' folders.
@@ -163,4 +397,17 @@ if __name__ == "__main__":
     # This will create 'yolo_dataset' directly inside 'faceMask_WeaponDetectionSystem'.
     output_dataset_path = r"C:\Users\hp\.vscode\FinalProjectFolder\faceMask_WeaponDetectionSystem\yolo_dataset"
 
-    split_dataset(base_directory, output_dataset_path)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Split the annotated dataset into YOLO train/val/test sets.")
+    parser.add_argument('--base-dir', default=base_directory)
+    parser.add_argument('--output-dir', default=output_dataset_path)
+    parser.add_argument('--incremental', action='store_true',
+                        help=f"Only process new or changed files, tracked in {MANIFEST_NAME}; images are linked, not copied")
+    parser.add_argument('--workers', type=int, default=8, help="Threads for --incremental")
+    parser.add_argument('--link', choices=('auto', 'reflink', 'hardlink', 'copy'), default='auto',
+                        help="How --incremental places images")
+    args = parser.parse_args()
+
+    if args.incremental:
+        split_dataset_incremental(args.base_dir, args.output_dir, workers=args.workers, link_mode=args.link)
+    else:
+        split_dataset(args.base_dir, args.output_dir)
\ No newline at end of file
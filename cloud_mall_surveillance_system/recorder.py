@@ -0,0 +1,362 @@
+import os
+import time
+import queue
+import bisect
+import struct
+import threading
+import numpy as np
+from detections import Detections
+
+# --- Segment Layout ---
+# recordings/<camera_id>/<segment_start_ms>.mjpeg      concatenated JPEG frames
+# recordings/<camera_id>/<segment_start_ms>.idx        one INDEX_DTYPE record per frame
+# recordings/<camera_id>/<segment_start_ms>.det         detections per frame, a DETECTIONS_HEADER
+#                                                      then a Detections.to_bytes() record
+INDEX_DTYPE = np.dtype([('timestamp', '<f8'), ('offset', '<u8'), ('length', '<u4')])
+DETECTIONS_HEADER = struct.Struct('<dI')  # timestamp, record length
+SEGMENT_EXTENSIONS = ('.mjpeg', '.idx', '.det')
+
+
+class Segment:
+    """One fixed-length recording file of a single camera."""
+    def __init__(self, camera_dir, start_time):
+        self.start_time = start_time
+        self.end_time = start_time
+        self.base_path = os.path.join(camera_dir, str(int(start_time * 1000)))
+        self.size = 0
+
+    def paths(self):
+        return [self.base_path + ext for ext in SEGMENT_EXTENSIONS]
+
+    def index_length(self):
+        """Number of complete records in the index; a trailing partial one from an interrupted write is ignored."""
+        try:
+            return os.path.getsize(self.base_path + '.idx') // INDEX_DTYPE.itemsize
+        except FileNotFoundError:
+            return 0
+
+    def load_index(self, length=None):
+        """The first `length` index records (all complete ones by default) as a read-only memory map,
+        so a searchsorted() seek reads the few pages it touches rather than the whole file."""
+        length = self.index_length() if length is None else length
+        if not length:
+            return np.zeros(0, dtype=INDEX_DTYPE)
+        return np.memmap(self.base_path + '.idx', dtype=INDEX_DTYPE, mode='r', shape=(length,))
+
+    def load_end_time(self):
+        """Timestamp of the last complete index record, or None if there is none; reads only that record."""
+        try:
+            with open(self.base_path + '.idx', 'rb') as f:
+                size = f.seek(0, os.SEEK_END)
+                usable = size - size % INDEX_DTYPE.itemsize
+                if not usable:
+                    return None
+                f.seek(usable - INDEX_DTYPE.itemsize)
+                return float(np.frombuffer(f.read(INDEX_DTYPE.itemsize), dtype=INDEX_DTYPE)['timestamp'][0])
+        except FileNotFoundError:
+            return None
+
+
+def read_detections(path, start, end):
+    """[{'t': timestamp, 'detections': Detections.to_json()}] for the records of a .det file in [start, end]."""
+    if not os.path.exists(path):
+        return []
+    with open(path, 'rb') as f:
+        data = f.read()
+    entries = []
+    offset = 0
+    # Stops at a trailing partial record left by an interrupted write
+    while offset + DETECTIONS_HEADER.size <= len(data):
+        timestamp, length = DETECTIONS_HEADER.unpack_from(data, offset)
+        offset += DETECTIONS_HEADER.size
+        if offset + length > len(data):
+            break
+        if start <= timestamp <= end:
+            entries.append({'t': timestamp, 'detections': Detections.from_bytes(data[offset:offset + length]).to_json()})
+        offset += length
+    return entries
+
+
+class _OpenSegment:
+    def __init__(self, segment):
+        self.segment = segment
+        self.data_file = open(segment.base_path + '.mjpeg', 'ab')
+        self.index_file = open(segment.base_path + '.idx', 'ab')
+        self.meta_file = open(segment.base_path + '.det', 'ab')
+        self.offset = 0
+
+    def write(self, timestamp, jpeg_bytes, detections):
+        self.data_file.write(jpeg_bytes)
+        record = np.array([(timestamp, self.offset, len(jpeg_bytes))], dtype=INDEX_DTYPE)
+        self.index_file.write(record.tobytes())
+        if detections is not None and len(detections):
+            record = detections.to_bytes()
+            self.meta_file.write(DETECTIONS_HEADER.pack(timestamp, len(record)) + record)
+        self.offset += len(jpeg_bytes)
+        self.segment.end_time = timestamp
+        self.segment.size = self.offset
+
+    def flush(self):
+        for f in (self.data_file, self.index_file, self.meta_file):
+            f.flush()
+
+    def close(self):
+        for f in (self.data_file, self.index_file, self.meta_file):
+            f.close()
+        self.segment.size = sum(os.path.getsize(path) for path in self.segment.paths() if os.path.exists(path))
+
+
+class SegmentRecorder:
+    """Continuously records every camera to fixed-length segments with a time index.
+
+    Frames are queued by the detection loop and written by one background thread. The catalog
+    keeps each camera's segments sorted by start time so a timestamp resolves to a segment with
+    a bisect, and to a frame with a binary search over that segment's index file.
+
+    A read_only recorder (used by web processes while another process records) never writes and
+    rescans the directory at most once a second before answering a query. A rescan only stats the
+    index files and re-reads the last record of those that changed.
+    """
+    def __init__(self, root_dir, segment_seconds=60, quota_bytes=10 * 1024 ** 3, max_pending=512, read_only=False):
+        self.root_dir = root_dir
+        self.segment_seconds = segment_seconds
+        self.quota_bytes = quota_bytes
+        self.dropped = 0
+        self.frames_written = 0
+        self.bytes_written = 0
+        self._segments = {}      # camera_id -> [Segment] sorted by start_time
+        self._starts = {}        # camera_id -> [start_time] parallel to _segments, for bisect
+        self._open = {}          # camera_id -> _OpenSegment
+        self._total_bytes = 0
+        self._catalog_lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=max_pending)
+        self.read_only = read_only
+        self._catalog_loaded_at = 0
+        self._scanned = {}       # index path -> ((mtime_ns, size), Segment) as of the last catalog scan
+        os.makedirs(root_dir, exist_ok=True)
+        self._load_catalog()
+        if not read_only:
+            self._thread = threading.Thread(target=self._run, name='segment-recorder', daemon=True)
+            self._thread.start()
+
+    def _refresh_catalog(self):
+        """Picks up segments written by another process; only read-only recorders need this."""
+        if self.read_only and time.time() - self._catalog_loaded_at > 1.0:
+            with self._catalog_lock:
+                self._load_catalog()
+
+    def _load_catalog(self):
+        """Builds the catalog from the directory listing, reusing segments whose index file is unchanged."""
+        previous, self._scanned = self._scanned, {}
+        self._segments = {}
+        self._starts = {}
+        self._total_bytes = 0
+        self._catalog_loaded_at = time.time()
+        for camera_id in os.listdir(self.root_dir):
+            camera_dir = os.path.join(self.root_dir, camera_id)
+            if not os.path.isdir(camera_dir):
+                continue
+            segments = []
+            for entry in os.scandir(camera_dir):
+                if not entry.name.endswith('.idx'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue  # evicted while we were listing
+                stamp = (stat.st_mtime_ns, stat.st_size)
+                cached = previous.get(entry.path)
+                if cached is not None and cached[0] == stamp:
+                    segment = cached[1]
+                else:
+                    segment = Segment(camera_dir, int(entry.name[:-4]) / 1000)
+                    end_time = segment.load_end_time()
+                    if end_time is None:
+                        continue
+                    segment.end_time = end_time
+                    segment.size = sum(os.path.getsize(path) for path in segment.paths() if os.path.exists(path))
+                self._scanned[entry.path] = (stamp, segment)
+                segments.append(segment)
+                self._total_bytes += segment.size
+            segments.sort(key=lambda segment: segment.start_time)
+            self._segments[camera_id] = segments
+            self._starts[camera_id] = [segment.start_time for segment in segments]
+
+    # --- Writing ---
+    def record(self, camera_id, jpeg_bytes, timestamp=None, detections=None):
+        """Queues one encoded frame for recording. Never blocks; drops the frame if the writer is behind."""
+        if self.read_only:
+            return False
+        timestamp = time.time() if timestamp is None else timestamp
+        try:
+            self._queue.put_nowait((str(camera_id), timestamp, jpeg_bytes, detections))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def flush(self):
+        """Waits for queued frames to be written and flushes open segments to disk."""
+        self._queue.join()
+        with self._catalog_lock:
+            for open_segment in self._open.values():
+                open_segment.flush()
+
+    def _run(self):
+        last_flush = time.time()
+        while True:
+            camera_id, timestamp, jpeg_bytes, detections = self._queue.get()
+            try:
+                self._write(camera_id, timestamp, jpeg_bytes, detections)
+                if time.time() - last_flush > 1.0:
+                    with self._catalog_lock:
+                        for open_segment in self._open.values():
+                            open_segment.flush()
+                    last_flush = time.time()
+            except Exception as e:
+                print(f"Error recording frame for camera {camera_id}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _write(self, camera_id, timestamp, jpeg_bytes, detections):
+        with self._catalog_lock:
+            open_segment = self._open.get(camera_id)
+            if open_segment and timestamp - open_segment.segment.start_time >= self.segment_seconds:
+                self._close_segment(camera_id)
+                open_segment = None
+            if open_segment is None:
+                camera_dir = os.path.join(self.root_dir, camera_id)
+                os.makedirs(camera_dir, exist_ok=True)
+                segment = Segment(camera_dir, timestamp)
+                open_segment = self._open[camera_id] = _OpenSegment(segment)
+                self._segments.setdefault(camera_id, []).append(segment)
+                self._starts.setdefault(camera_id, []).append(segment.start_time)
+
+            size_before = open_segment.segment.size
+            open_segment.write(timestamp, jpeg_bytes, detections)
+            self._total_bytes += open_segment.segment.size - size_before
+            self.frames_written += 1
+            self.bytes_written += len(jpeg_bytes)
+            if self._total_bytes > self.quota_bytes:
+                self._enforce_quota()
+
+    def _close_segment(self, camera_id):
+        open_segment = self._open.pop(camera_id)
+        size_before = open_segment.segment.size
+        open_segment.close()
+        self._total_bytes += open_segment.segment.size - size_before
+
+    def _enforce_quota(self):
+        """Deletes the oldest closed segments, across all cameras, until usage is under the quota."""
+        while self._total_bytes > self.quota_bytes:
+            oldest_camera = None
+            for camera_id, segments in self._segments.items():
+                if segments and (camera_id not in self._open or len(segments) > 1):
+                    if oldest_camera is None or segments[0].start_time < self._segments[oldest_camera][0].start_time:
+                        oldest_camera = camera_id
+            if oldest_camera is None:
+                return
+            segment = self._segments[oldest_camera].pop(0)
+            self._starts[oldest_camera].pop(0)
+            self._total_bytes -= segment.size
+            for path in segment.paths():
+                if os.path.exists(path):
+                    os.remove(path)
+
+    # --- Playback ---
+    def _segment_at(self, camera_id, timestamp):
+        starts = self._starts.get(camera_id, [])
+        position = bisect.bisect_right(starts, timestamp) - 1
+        return self._segments[camera_id][position] if position >= 0 else None
+
+    def segments_between(self, camera_id, start, end):
+        """Lists the segments overlapping [start, end]."""
+        camera_id = str(camera_id)
+        self._refresh_catalog()
+        with self._catalog_lock:
+            starts = self._starts.get(camera_id, [])
+            first = max(bisect.bisect_right(starts, start) - 1, 0)
+            last = bisect.bisect_right(starts, end)
+            return [
+                {'start': segment.start_time, 'end': segment.end_time, 'bytes': segment.size}
+                for segment in self._segments.get(camera_id, [])[first:last]
+                if segment.end_time >= start
+            ]
+
+    def frame_at(self, camera_id, timestamp):
+        """Returns (frame timestamp, jpeg bytes) of the last frame recorded at or before the timestamp."""
+        camera_id = str(camera_id)
+        self._refresh_catalog()
+        with self._catalog_lock:
+            segment = self._segment_at(camera_id, timestamp)
+            if segment is None:
+                return None
+            if camera_id in self._open and self._open[camera_id].segment is segment:
+                self._open[camera_id].flush()
+            index = segment.load_index()
+        position = int(np.searchsorted(index['timestamp'], timestamp, side='right')) - 1
+        if position < 0:
+            return None
+        record = index[position]
+        with open(segment.base_path + '.mjpeg', 'rb') as f:
+            f.seek(int(record['offset']))
+            return float(record['timestamp']), f.read(int(record['length']))
+
+    def iter_frames(self, camera_id, start, end):
+        """Yields (timestamp, jpeg bytes) for every recorded frame in [start, end], in order."""
+        camera_id = str(camera_id)
+        self._refresh_catalog()
+        with self._catalog_lock:
+            starts = self._starts.get(camera_id, [])
+            first = max(bisect.bisect_right(starts, start) - 1, 0)
+            last = bisect.bisect_right(starts, end)
+            segments = self._segments.get(camera_id, [])[first:last]
+            if camera_id in self._open:
+                self._open[camera_id].flush()
+            # Snapshot the index lengths now so they never reference frames written after the flush
+            lengths = [segment.index_length() for segment in segments]
+        for segment, length in zip(segments, lengths):
+            try:
+                index = segment.load_index(length)
+            except FileNotFoundError:
+                continue  # deleted by the quota since
+            begin = int(np.searchsorted(index['timestamp'], start, side='left'))
+            stop = int(np.searchsorted(index['timestamp'], end, side='right'))
+            if begin >= stop:
+                continue
+            with open(segment.base_path + '.mjpeg', 'rb') as f:
+                for record in index[begin:stop]:
+                    f.seek(int(record['offset']))
+                    yield float(record['timestamp']), f.read(int(record['length']))
+
+    def detections_between(self, camera_id, start, end):
+        """Returns the detection metadata recorded in [start, end]."""
+        camera_id = str(camera_id)
+        self._refresh_catalog()
+        with self._catalog_lock:
+            starts = self._starts.get(camera_id, [])
+            first = max(bisect.bisect_right(starts, start) - 1, 0)
+            last = bisect.bisect_right(starts, end)
+            segments = self._segments.get(camera_id, [])[first:last]
+            if camera_id in self._open:
+                self._open[camera_id].flush()
+        entries = []
+        for segment in segments:
+            entries.extend(read_detections(segment.base_path + '.det', start, end))
+        return entries
+
+    def stats(self):
+        self._refresh_catalog()
+        with self._catalog_lock:
+            return {
+                'cameras': len(self._segments),
+                'segments': sum(len(segments) for segments in self._segments.values()),
+                'bytes': self._total_bytes,
+                'quota_bytes': self.quota_bytes,
+                'frames_written': self.frames_written,
+                'pending': self._queue.qsize(),
+                'dropped': self.dropped,
+            }
@@ -0,0 +1,108 @@
+import cv2
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+import numpy as np
+from recorder import SegmentRecorder
+from detections import Detections
+
+# Soak test for the segment recorder: many synthetic cameras feed frames at a fixed rate for a
+# sustained period, then the run checks that the writer kept up and that time seeks still resolve.
+
+SAMPLE_DETECTIONS = Detections([1], [0.8], [[10, 10, 50, 50]], {1: 'no_mask'})
+
+
+def synthetic_jpeg(width, height, quality=85):
+    """Noisy frame so JPEG sizes resemble real camera footage rather than a flat image."""
+    image = np.random.randint(0, 255, (height, width, 3), dtype=np.uint8)
+    image = cv2.GaussianBlur(image, (9, 9), 0)
+    return cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes()
+
+
+def camera_feed(recorder, camera_id, frames, fps, duration, stop_event, sent_counts):
+    interval = 1.0 / fps
+    next_time = time.time()
+    deadline = next_time + duration
+    sent = 0
+    while not stop_event.is_set() and next_time < deadline:
+        detections = SAMPLE_DETECTIONS if sent % 10 == 0 else None
+        recorder.record(camera_id, frames[sent % len(frames)], next_time, detections)
+        sent += 1
+        next_time += interval
+        time.sleep(max(0.0, next_time - time.time()))
+    sent_counts[camera_id] = sent
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sustained-throughput soak test for the segment recorder.")
+    parser.add_argument('--cameras', type=int, default=16)
+    parser.add_argument('--fps', type=float, default=15)
+    parser.add_argument('--duration', type=float, default=60, help="Seconds to keep writing")
+    parser.add_argument('--segment-seconds', type=int, default=10)
+    parser.add_argument('--quota-mb', type=float, default=512)
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=480)
+    parser.add_argument('--seeks', type=int, default=200, help="Random time seeks to verify afterwards")
+    parser.add_argument('--dir', help="Recording directory (defaults to a temporary directory that is removed)")
+    args = parser.parse_args()
+
+    root_dir = args.dir or tempfile.mkdtemp(prefix='recorder_soak_')
+    frames = [synthetic_jpeg(args.width, args.height) for _ in range(8)]
+    recorder = SegmentRecorder(root_dir, args.segment_seconds, int(args.quota_mb * 1024 ** 2), max_pending=args.cameras * 64)
+
+    print(f"Soak: {args.cameras} cameras x {args.fps} FPS for {args.duration}s, "
+          f"~{np.mean([len(f) for f in frames]) / 1024:.0f} KB frames, recording to {root_dir}")
+    stop_event = threading.Event()
+    sent_counts = {}
+    threads = [
+        threading.Thread(target=camera_feed, args=(recorder, f"cam{i:03d}", frames, args.fps, args.duration, stop_event, sent_counts))
+        for i in range(args.cameras)
+    ]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    max_pending = 0
+    while any(thread.is_alive() for thread in threads):
+        max_pending = max(max_pending, recorder.pending())
+        time.sleep(0.2)
+    recorder.flush()
+    elapsed = time.time() - start
+
+    stats = recorder.stats()
+    sent = sum(sent_counts.values())
+    print(f"Sent {sent} frames, wrote {stats['frames_written']}, dropped {stats['dropped']} "
+          f"(max queue depth {max_pending})")
+    print(f"Throughput: {stats['frames_written'] / elapsed:.0f} frames/s, "
+          f"{recorder.bytes_written / elapsed / 1024 ** 2:.1f} MB/s")
+    print(f"On disk: {stats['segments']} segments, {stats['bytes'] / 1024 ** 2:.1f} MB of {args.quota_mb:.0f} MB quota")
+
+    # Every seek inside the retained range must land on a frame at or before the requested time
+    seek_times = []
+    failures = 0
+    for _ in range(args.seeks):
+        camera_id = f"cam{random.randrange(args.cameras):03d}"
+        segments = recorder.segments_between(camera_id, 0, time.time())
+        if not segments:
+            continue
+        target = random.uniform(segments[0]['start'], segments[-1]['end'])
+        seek_start = time.perf_counter()
+        result = recorder.frame_at(camera_id, target)
+        seek_times.append(time.perf_counter() - seek_start)
+        if result is None or result[0] > target or not result[1].startswith(b'\xff\xd8'):
+            failures += 1
+    if seek_times:
+        print(f"Seeks: {len(seek_times)} checked, {failures} failed, "
+              f"p50 {np.percentile(seek_times, 50) * 1000:.2f} ms, p99 {np.percentile(seek_times, 99) * 1000:.2f} ms")
+
+    passed = stats['dropped'] == 0 and failures == 0 and stats['bytes'] <= args.quota_mb * 1024 ** 2 * 1.05
+    print("PASS" if passed else "FAIL")
+    if not args.dir:
+        shutil.rmtree(root_dir, ignore_errors=True)
+    raise SystemExit(0 if passed else 1)
+
+
+if __name__ == '__main__':
+    main()
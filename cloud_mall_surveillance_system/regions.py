@@ -0,0 +1,212 @@
+import threading
+import cv2
+import numpy as np
+from detections import Detections
+
+# --- Regions of Interest and Tiled Inference ---
+# A camera document may restrict detection to ROI polygons ('roi': [[[x, y], ...], ...]) and/or
+# split the frame into overlapping tiles ('tiling': {'rows': r, 'cols': c, 'overlap': f}), all in
+# normalized image coordinates. Instead of one full-frame inference, the detector then runs on a
+# batch of crops: the bounding rectangle of each ROI polygon, or the tiles covering them. Tiles
+# that do not touch the ROI are never inferred. Every crop is resized to the detector's input size,
+# so a tile shows small, distant objects at a higher resolution than the whole frame would.
+#
+# Boxes are shifted back into frame coordinates and merged across crops with class-aware NMS. A box
+# cut by a tile edge is suppressed by the complete box from the neighbouring tile when it overlaps
+# it enough by IoU, or when most of its area lies inside it (intersection over the smaller box).
+# Finally, boxes whose centre falls outside every ROI polygon are dropped.
+
+MAX_TILES = 8  # per axis
+
+
+def parse_roi(raw):
+    """Validates ROI polygons: [[[x, y], ...], ...], at least 3 points each, coordinates in 0..1."""
+    polygons = []
+    for i, polygon in enumerate(raw or []):
+        points = np.asarray(polygon, dtype=np.float64)
+        if points.ndim != 2 or points.shape[1] != 2 or len(points) < 3:
+            raise ValueError(f"ROI polygon {i} needs at least three [x, y] points")
+        if not np.all((points >= 0) & (points <= 1)):
+            raise ValueError(f"ROI polygon {i} has coordinates outside 0..1")
+        polygons.append(points.tolist())
+    return polygons
+
+
+def parse_tiling(raw):
+    """Validates a tiling setting: None/{} (off) or {'rows': 1..8, 'cols': 1..8, 'overlap': 0..0.5}."""
+    if not raw:
+        return None
+    if not isinstance(raw, dict):
+        raise ValueError("tiling must be an object with rows, cols and overlap")
+    try:
+        rows, cols = int(raw.get('rows', 1)), int(raw.get('cols', 1))
+        overlap = float(raw.get('overlap', 0.2))
+    except (TypeError, ValueError):
+        raise ValueError("tiling rows and cols must be integers and overlap a number")
+    if not (1 <= rows <= MAX_TILES and 1 <= cols <= MAX_TILES) or not 0 <= overlap <= 0.5:
+        raise ValueError(f"tiling needs 1..{MAX_TILES} rows and cols and an overlap between 0 and 0.5")
+    return {'rows': rows, 'cols': cols, 'overlap': overlap}
+
+
+def tile_rects(rect, rows, cols, overlap):
+    """Splits an (x1, y1, x2, y2) rectangle into rows x cols tiles that overlap by `overlap` of a tile."""
+    x1, y1, x2, y2 = rect
+    tile_w = (x2 - x1) / (cols - (cols - 1) * overlap)
+    tile_h = (y2 - y1) / (rows - (rows - 1) * overlap)
+    tiles = []
+    for row in range(rows):
+        for col in range(cols):
+            tx1 = x1 + col * tile_w * (1 - overlap)
+            ty1 = y1 + row * tile_h * (1 - overlap)
+            tiles.append((int(tx1), int(ty1), min(int(round(tx1 + tile_w)), x2), min(int(round(ty1 + tile_h)), y2)))
+    return tiles
+
+
+def merge_rects(rects):
+    """Unions overlapping rectangles so no pixel is inferred twice for overlapping ROI polygons."""
+    rects = [list(rect) for rect in rects]
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(rects)):
+            for j in range(i + 1, len(rects)):
+                a, b = rects[i], rects[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    rects[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                    del rects[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return [tuple(rect) for rect in rects]
+
+
+def nms(xyxy, conf, cls, iou_threshold=0.5, ios_threshold=0.7):
+    """Class-aware greedy NMS; returns the indices kept, highest confidence first."""
+    order = np.argsort(-conf, kind='stable')
+    xyxy, cls = xyxy[order], cls[order]
+    area = (xyxy[:, 2] - xyxy[:, 0]) * (xyxy[:, 3] - xyxy[:, 1])
+    suppressed = np.zeros(len(order), dtype=bool)
+    for i in range(len(order)):
+        if suppressed[i]:
+            continue
+        rest = np.arange(i + 1, len(order))
+        rest = rest[~suppressed[rest] & (cls[rest] == cls[i])]
+        if not len(rest):
+            continue
+        w = np.clip(np.minimum(xyxy[i, 2], xyxy[rest, 2]) - np.maximum(xyxy[i, 0], xyxy[rest, 0]), 0, None)
+        h = np.clip(np.minimum(xyxy[i, 3], xyxy[rest, 3]) - np.maximum(xyxy[i, 1], xyxy[rest, 1]), 0, None)
+        intersection = w * h
+        iou = intersection / np.maximum(area[i] + area[rest] - intersection, 1e-9)
+        ios = intersection / np.maximum(np.minimum(area[i], area[rest]), 1e-9)
+        suppressed[rest[(iou > iou_threshold) | (ios > ios_threshold)]] = True
+    return order[~suppressed]
+
+
+class RegionPlan:
+    """The crops to infer for one camera at one frame size, and the ROI mask boxes are checked against."""
+    def __init__(self, roi, tiling, frame_shape):
+        height, width = frame_shape[:2]
+        self.frame_shape = tuple(frame_shape[:2])
+        self.mask = None
+        self.polygons = []
+        regions = [(0, 0, width, height)]
+        if roi:
+            self.mask = np.zeros((height, width), dtype=np.uint8)
+            self.polygons = [np.rint(np.array(polygon) * [width - 1, height - 1]).astype(np.int32) for polygon in roi]
+            cv2.fillPoly(self.mask, self.polygons, 1)
+            bounds = [cv2.boundingRect(polygon) for polygon in self.polygons]
+            regions = merge_rects([(x, y, x + w, y + h) for x, y, w, h in bounds])
+
+        rects = regions
+        if tiling:
+            rects = [tile for region in regions for tile in tile_rects(region, tiling['rows'], tiling['cols'], tiling['overlap'])]
+            if self.mask is not None:
+                rects = [(x1, y1, x2, y2) for x1, y1, x2, y2 in rects if self.mask[y1:y2, x1:x2].any()]
+        self.rects = np.array([rect for rect in rects if rect[2] > rect[0] and rect[3] > rect[1]], dtype=np.int64).reshape(-1, 4)
+        self.inferred_fraction = float(
+            ((self.rects[:, 2] - self.rects[:, 0]) * (self.rects[:, 3] - self.rects[:, 1])).sum() / (width * height)
+        )
+
+    def inside(self, xyxy):
+        """Bool per box: its centre lies inside an ROI polygon (always True without an ROI)."""
+        if self.mask is None:
+            return np.ones(len(xyxy), dtype=bool)
+        height, width = self.mask.shape
+        cx = np.clip(((xyxy[:, 0] + xyxy[:, 2]) / 2).astype(np.int64), 0, width - 1)
+        cy = np.clip(((xyxy[:, 1] + xyxy[:, 3]) / 2).astype(np.int64), 0, height - 1)
+        return self.mask[cy, cx].astype(bool)
+
+
+class RegionDetector:
+    """Runs the detector on each camera's ROI crops or tiles; cameras without settings are not handled."""
+    def __init__(self, iou_threshold=0.5, ios_threshold=0.7):
+        self.iou_threshold = iou_threshold
+        self.ios_threshold = ios_threshold
+        self.frames = 0
+        self.crops = 0
+        self._settings = {}  # camera_id -> (roi, tiling)
+        self._plans = {}     # camera_id -> RegionPlan for the last frame size
+        self._lock = threading.Lock()
+
+    def configure(self, camera_id, roi=None, tiling=None):
+        """Sets a camera's ROI polygons and tiling (see parse_roi/parse_tiling); both empty turns it off."""
+        roi, tiling = parse_roi(roi), parse_tiling(tiling)
+        with self._lock:
+            self._plans.pop(camera_id, None)
+            if roi or tiling:
+                self._settings[camera_id] = (roi, tiling)
+            else:
+                self._settings.pop(camera_id, None)
+
+    def plan(self, camera_id, frame_shape):
+        """The camera's RegionPlan for this frame size, or None to infer on the full frame."""
+        with self._lock:
+            settings = self._settings.get(camera_id)
+            if settings is None:
+                return None
+            plan = self._plans.get(camera_id)
+            if plan is None or plan.frame_shape != tuple(frame_shape[:2]):
+                plan = self._plans[camera_id] = RegionPlan(*settings, frame_shape)
+            return plan
+
+    def detect(self, model, frame, plan, **kwargs):
+        """One batched inference over the plan's crops; returns the merged Detections in frame coordinates."""
+        self.frames += 1
+        self.crops += len(plan.rects)
+        if not len(plan.rects):
+            return Detections.empty(model.names)
+        crops = [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in plan.rects.tolist()]
+        results = model(crops, **kwargs)
+
+        cls, conf, xyxy = [], [], []
+        for result, rect in zip(results, plan.rects):
+            boxes = result.boxes
+            cls.append(boxes.cls.cpu().numpy().astype(np.int64))
+            conf.append(boxes.conf.cpu().numpy())
+            xyxy.append(boxes.xyxy.cpu().numpy() + np.tile(rect[:2], 2))
+        cls, conf, xyxy = np.concatenate(cls), np.concatenate(conf), np.concatenate(xyxy).reshape(-1, 4)
+
+        if len(plan.rects) > 1:
+            keep = nms(xyxy, conf, cls, self.iou_threshold, self.ios_threshold)
+            cls, conf, xyxy = cls[keep], conf[keep], xyxy[keep]
+        inside = plan.inside(xyxy)
+        return Detections(cls[inside], conf[inside], xyxy[inside], model.names)
+
+    def stats(self):
+        with self._lock:
+            plans = {camera_id: plan for camera_id, plan in self._plans.items()}
+            cameras = {
+                camera_id: {
+                    'roi_polygons': len(roi or []),
+                    'tiling': tiling,
+                    'crops': len(plans[camera_id].rects) if camera_id in plans else None,
+                    'inferred_fraction': round(plans[camera_id].inferred_fraction, 3) if camera_id in plans else None,
+                }
+                for camera_id, (roi, tiling) in self._settings.items()
+            }
+        return {
+            'cameras': cameras,
+            'frames': self.frames,
+            'crops_per_frame': round(self.crops / self.frames, 2) if self.frames else 0.0,
+        }
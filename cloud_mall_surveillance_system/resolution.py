@@ -0,0 +1,167 @@
+import os
+import time
+import threading
+
+# --- Load-Adaptive Inference Resolution ---
+# Each camera runs the detector at one of a few input sizes (imgsz), largest first. Inference time
+# grows roughly with the square of imgsz, so dropping from 640 to 480 or 320 is the cheapest way
+# to keep up when inference no longer fits the frame budget (frames queue up behind it and are
+# skipped or delayed) or the CPU is saturated by other cameras and processes.
+#
+# A camera steps down one level when its smoothed inference time exceeds the budget or other
+# processes keep the CPUs more than cpu_high busy, and steps back up once the time predicted at
+# the next level up still leaves headroom. The CPU load leaves out this process: back-to-back
+# inference keeps the detector's own threads busy whatever the input size, so counting them would
+# hold every camera at the smallest size. At most one change per min_dwell_seconds keeps it from
+# oscillating. A raised threat level overrides the load: High always runs at the largest size and
+# Medium never below the second one, because small distant objects are the first thing a lower
+# resolution loses.
+
+DEFAULT_LEVELS = (640, 480, 320)
+THREAT_FLOOR = {'High': 0, 'Medium': 1}  # highest level index (smallest imgsz) allowed per threat level
+
+
+def imgsz_levels(imgsz):
+    """Default levels for a detector input size: imgsz and roughly 3/4 and 1/2 of it, in multiples of 32."""
+    return (imgsz, imgsz * 3 // 128 * 32, imgsz // 64 * 32)
+
+
+def _system_busy_seconds():
+    """CPU seconds all processes have spent busy since boot (Linux /proc/stat), or None elsewhere."""
+    try:
+        with open('/proc/stat') as f:
+            ticks = [int(value) for value in f.readline().split()[1:9]]
+    except (OSError, ValueError):
+        return None
+    idle = sum(ticks[3:5])  # idle, iowait
+    return (sum(ticks) - idle) / os.sysconf('SC_CLK_TCK')
+
+
+class OtherCpuLoad:
+    """Share of all CPUs other processes kept busy between two samples: the system's busy time
+    minus this process's own CPU time."""
+    def __init__(self):
+        self._last = None
+
+    def sample(self):
+        """Load since the previous call, or None on the first call and where the OS does not provide it."""
+        busy = _system_busy_seconds()
+        if busy is None:
+            return None
+        now, own = time.monotonic(), time.process_time()
+        last, self._last = self._last, (now, busy, own)
+        if last is None or now <= last[0]:
+            return None
+        other = (busy - last[1]) - (own - last[2])
+        return max(other, 0.0) / ((now - last[0]) * (os.cpu_count() or 1))
+
+
+class _CameraResolution:
+    __slots__ = ('level', 'ema_seconds', 'changed_at', 'changes', 'reason')
+
+    def __init__(self, now):
+        self.level = 0
+        self.ema_seconds = None
+        self.changed_at = now
+        self.changes = 0
+        self.reason = 'initial'
+
+
+class ResolutionPolicy:
+    """Picks each camera's detector input size from its recent inference time, CPU load and threat level."""
+    def __init__(self, levels=DEFAULT_LEVELS, target_fps=10.0, headroom=0.8, cpu_high=0.9,
+                 min_dwell_seconds=5.0, smoothing=0.2, enabled=True):
+        self.levels = tuple(sorted(set(levels), reverse=True))
+        self.budget_seconds = 1.0 / target_fps
+        self.headroom = headroom
+        self.cpu_high = cpu_high
+        self.min_dwell_seconds = min_dwell_seconds
+        self.smoothing = smoothing
+        self.enabled = enabled and len(self.levels) > 1
+        self._cameras = {}
+        self._other_cpu = OtherCpuLoad()
+        self._cpu_load = None
+        self._cpu_sampled_at = 0.0
+        self._lock = threading.Lock()
+
+    def _camera(self, camera_id, now):
+        camera = self._cameras.get(camera_id)
+        if camera is None:
+            camera = self._cameras[camera_id] = _CameraResolution(now)
+        return camera
+
+    def _set_level(self, camera, level, reason, now):
+        if level != camera.level:
+            camera.level = level
+            camera.ema_seconds = None  # timings measured at the old size no longer apply
+            camera.changed_at = now
+            camera.changes += 1
+            camera.reason = reason
+
+    def imgsz(self, camera_id, threat_level='Low', now=None):
+        """The input size for the camera's next frame; raises it at once if the threat level requires."""
+        if not self.enabled:
+            return self.levels[0]
+        now = time.time() if now is None else now
+        with self._lock:
+            camera = self._camera(camera_id, now)
+            floor = THREAT_FLOOR.get(threat_level)
+            if floor is not None and camera.level > floor:
+                self._set_level(camera, floor, f'threat {threat_level}', now)
+            return self.levels[camera.level]
+
+    def observe(self, camera_id, inference_seconds, threat_level='Low', now=None):
+        """Feeds one frame's inference time; may change the level used from the next frame on."""
+        if not self.enabled:
+            return
+        now = time.time() if now is None else now
+        if now - self._cpu_sampled_at >= 1.0:
+            self._cpu_load, self._cpu_sampled_at = self._other_cpu.sample(), now
+
+        with self._lock:
+            camera = self._camera(camera_id, now)
+            if camera.ema_seconds is None:
+                camera.ema_seconds = inference_seconds
+            else:
+                camera.ema_seconds += self.smoothing * (inference_seconds - camera.ema_seconds)
+            if now - camera.changed_at < self.min_dwell_seconds:
+                return
+
+            floor = THREAT_FLOOR.get(threat_level, len(self.levels) - 1)
+            cpu_saturated = self._cpu_load is not None and self._cpu_load > self.cpu_high
+            if camera.level < min(floor, len(self.levels) - 1):
+                if camera.ema_seconds > self.budget_seconds:
+                    self._set_level(camera, camera.level + 1, 'inference over budget', now)
+                    return
+                if cpu_saturated:
+                    self._set_level(camera, camera.level + 1, 'cpu saturated', now)
+                    return
+            if camera.level > 0 and not cpu_saturated:
+                # Predicted time one level up, from the quadratic cost in imgsz
+                scale = (self.levels[camera.level - 1] / self.levels[camera.level]) ** 2
+                if camera.ema_seconds * scale < self.budget_seconds * self.headroom:
+                    self._set_level(camera, camera.level - 1, 'load fell', now)
+
+    def current(self):
+        """{camera_id: active imgsz}."""
+        with self._lock:
+            return {camera_id: self.levels[camera.level] for camera_id, camera in self._cameras.items()}
+
+    def stats(self):
+        with self._lock:
+            cameras = {
+                camera_id: {
+                    'imgsz': self.levels[camera.level],
+                    'inference_ms': round(camera.ema_seconds * 1000, 1) if camera.ema_seconds is not None else None,
+                    'changes': camera.changes,
+                    'reason': camera.reason,
+                }
+                for camera_id, camera in self._cameras.items()
+            }
+        return {
+            'enabled': self.enabled,
+            'levels': list(self.levels),
+            'budget_ms': round(self.budget_seconds * 1000, 1),
+            'other_cpu_load': round(self._cpu_load, 2) if self._cpu_load is not None else None,
+            'cameras': cameras,
+        }
@@ -0,0 +1,347 @@
+import os
+import sys
+import time
+import argparse
+import threading
+import subprocess
+import numpy as np
+from multiprocessing import shared_memory
+
+# --- Shared-Memory Frame Ring ---
+# A capture process decodes camera frames straight into a ring of fixed-size slots in shared
+# memory; readers in other processes get NumPy views onto those slots, so no frame is pickled or
+# sent through a pipe on its way to inference. There is one writer per ring and any number of readers.
+#
+# Handshake (a sequence lock per slot): the writer sets a slot's sequence to -1, fills the slot,
+# then publishes the new sequence number in the slot and in the ring header. A reader takes the
+# newest published sequence, and once it is done with the view it calls intact(seq) to confirm
+# the writer has not lapped the ring and reused that slot in the meantime.
+#
+# The writer never waits for readers, so a view is only safe for a few frame intervals. A reader
+# that holds a frame longer than that (inference on a CPU easily takes more than 8 frames at
+# 30 fps) copies it out first: read_copy() returns a private copy checked intact after copying.
+#
+# The ring is sized from the resolution the camera actually delivers: the capture process opens the
+# source, reads a first frame and reports its size on stdout, and only then does its parent create
+# the ring and send back its name on stdin. Any process can attach() to read the same ring; in this
+# app the single detection process is the only reader, so capture and decoding, not inference, are
+# what move to another core.
+HEADER_FIELDS = 8
+WRITE_SEQ, WIDTH, HEIGHT, CHANNELS, SLOTS, STATE, WRITER_PID = range(7)
+
+STATE_OPENING, STATE_OPEN, STATE_FAILED, STATE_STOPPED = 0, 1, -1, 2
+
+DEFAULT_SLOTS = 8
+
+
+def _align(offset, alignment=64):
+    return (offset + alignment - 1) // alignment * alignment
+
+
+class SharedFrameRing:
+    """A ring of `slots` height x width x channels uint8 frames in one shared memory block."""
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner
+        self.name = shm.name
+        buffer = shm.buf
+
+        self.header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=buffer)
+        self.width, self.height, self.channels, self.slots = (
+            int(v) for v in self.header[[WIDTH, HEIGHT, CHANNELS, SLOTS]]
+        )
+        offset = self.header.nbytes
+        self.slot_seqs = np.ndarray((self.slots,), dtype=np.int64, buffer=buffer, offset=offset)
+        offset += self.slot_seqs.nbytes
+        self.slot_times = np.ndarray((self.slots,), dtype=np.float64, buffer=buffer, offset=offset)
+        offset += self.slot_times.nbytes
+        self.slot_shapes = np.ndarray((self.slots, 2), dtype=np.int64, buffer=buffer, offset=offset)
+        offset = _align(offset + self.slot_shapes.nbytes)
+        self.frames = np.ndarray((self.slots, self.height, self.width, self.channels),
+                                 dtype=np.uint8, buffer=buffer, offset=offset)
+
+    @staticmethod
+    def nbytes(width, height, channels=3, slots=DEFAULT_SLOTS):
+        header = HEADER_FIELDS * 8 + slots * (8 + 8 + 16)
+        return _align(header) + slots * height * width * channels
+
+    @classmethod
+    def create(cls, width, height, channels=3, slots=DEFAULT_SLOTS):
+        """Allocates a new ring; the creating process is responsible for unlink()."""
+        shm = shared_memory.SharedMemory(create=True, size=cls.nbytes(width, height, channels, slots))
+        header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=shm.buf)
+        header[:] = 0
+        header[[WIDTH, HEIGHT, CHANNELS, SLOTS]] = (width, height, channels, slots)
+        ring = cls(shm, owner=True)
+        ring.slot_seqs[:] = 0
+        return ring
+
+    @classmethod
+    def attach(cls, name):
+        """Opens a ring created by another process, without taking over its cleanup."""
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Before Python 3.13 every attach registers with the resource tracker, which would
+            # unlink the block when this process exits even though its creator still uses it
+            from multiprocessing import resource_tracker
+            shm = shared_memory.SharedMemory(name=name)
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        return cls(shm, owner=False)
+
+    @property
+    def state(self):
+        return int(self.header[STATE])
+
+    @state.setter
+    def state(self, value):
+        self.header[STATE] = value
+
+    @property
+    def sequence(self):
+        return int(self.header[WRITE_SEQ])
+
+    # --- Writer ---
+    def begin_write(self):
+        """Claims the slot after the newest one and returns (seq, slot view) for the frame to fill."""
+        seq = self.sequence + 1
+        slot = seq % self.slots
+        self.slot_seqs[slot] = -1
+        return seq, self.frames[slot]
+
+    def commit(self, seq, frame, timestamp=None):
+        """Publishes a frame claimed with begin_write(). `frame` is normally the slot view itself
+        (decoded in place); anything else is copied in, and resized if it does not fit."""
+        slot = seq % self.slots
+        view = self.frames[slot]
+        if frame.ctypes.data != view.ctypes.data:
+            height, width = frame.shape[:2]
+            if height > self.height or width > self.width:
+                import cv2
+                scale = min(self.width / width, self.height / height)
+                frame = cv2.resize(frame, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+                height, width = frame.shape[:2]
+            view[:height, :width] = frame.reshape(height, width, -1)
+        else:
+            height, width = frame.shape[:2]
+        self.slot_times[slot] = time.time() if timestamp is None else timestamp
+        self.slot_shapes[slot] = (height, width)
+        self.slot_seqs[slot] = seq
+        self.header[WRITE_SEQ] = seq
+        return seq
+
+    def write(self, frame, timestamp=None):
+        seq, _ = self.begin_write()
+        return self.commit(seq, frame, timestamp)
+
+    # --- Readers ---
+    def read(self, after_seq=0):
+        """Returns (seq, timestamp, frame view) for the newest frame after after_seq, or None.
+
+        The view aliases shared memory: it stays valid until the writer laps the ring, which
+        intact(seq) checks.
+        """
+        while True:
+            seq = self.sequence
+            if seq <= after_seq:
+                return None
+            slot = seq % self.slots
+            if self.slot_seqs[slot] != seq:
+                continue  # the writer lapped us between the two reads; take the newer frame
+            height, width = self.slot_shapes[slot]
+            timestamp = float(self.slot_times[slot])
+            frame = self.frames[slot, :height, :width]
+            if self.slot_seqs[slot] == seq:
+                return seq, timestamp, frame
+
+    def read_copy(self, after_seq=0, timeout=1.0):
+        """Like wait(), but returns (seq, timestamp, frame) with a private copy of the frame,
+        retrying with the newer frame if the writer reused the slot during the copy."""
+        while True:
+            frame = self.wait(after_seq, timeout)
+            if frame is None:
+                return None
+            seq, timestamp, view = frame
+            copy = view.copy()
+            if self.intact(seq):
+                return seq, timestamp, copy
+
+    def wait(self, after_seq=0, timeout=1.0, poll_interval=0.002):
+        """Like read(), but waits up to `timeout` seconds for a new frame."""
+        deadline = time.monotonic() + timeout
+        while True:
+            frame = self.read(after_seq)
+            if frame is not None or time.monotonic() >= deadline or self.state in (STATE_FAILED, STATE_STOPPED):
+                return frame
+            time.sleep(poll_interval)
+
+    def intact(self, seq):
+        """Whether the frame with sequence `seq` is still in its slot (the writer has not reused it)."""
+        return bool(self.slot_seqs[seq % self.slots] == seq)
+
+    def close(self):
+        # Views must go before the mapping can be closed
+        self.header = self.slot_seqs = self.slot_times = self.slot_shapes = self.frames = None
+        try:
+            self.shm.close()
+        except BufferError:
+            pass  # a reader still holds a frame view; the mapping goes when that is released
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+# --- Capture Process ---
+def open_capture(source, width, height, fps):
+    """Opens `source` with the requested properties; returns (cap, first frame) or (None, None)."""
+    import cv2
+
+    cap = cv2.VideoCapture(int(source) if str(source).isdigit() else source)
+    if not cap.isOpened():
+        return None, None
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+    cap.set(cv2.CAP_PROP_FPS, fps)
+    ok, frame = cap.read()
+    if not ok:
+        cap.release()
+        return None, None
+    return cap, frame
+
+
+def run_capture(ring, cap, first_frame):
+    """Capture loop run in its own process: decodes frames from `cap` directly into the ring."""
+    ring.write(first_frame)
+    ring.state = STATE_OPEN
+
+    parent = os.getppid()
+    try:
+        while ring.state == STATE_OPEN and os.getppid() == parent:
+            seq, slot = ring.begin_write()
+            ok, frame = cap.read(slot)
+            if not ok:
+                ring.slot_seqs[seq % ring.slots] = 0
+                time.sleep(0.05)
+                continue
+            ring.commit(seq, frame)
+    finally:
+        cap.release()
+    return 0
+
+
+def _read_line(stream, timeout):
+    """One line from a pipe, or '' if none arrives within `timeout` seconds."""
+    line = []
+    reader = threading.Thread(target=lambda: line.append(stream.readline()), daemon=True)
+    reader.start()
+    reader.join(timeout)
+    return line[0] if line else ''
+
+
+class SharedMemoryCapture:
+    """Runs cv2.VideoCapture for one source in a child process and reads its frames from a
+    SharedFrameRing. Offers the subset of the cv2.VideoCapture interface VideoCapture uses, so
+    capture and decoding move off the detection process without changing the detection loop.
+    """
+    OPEN_TIMEOUT_SECONDS = 15
+
+    def __init__(self, source, width=640, height=480, fps=30, slots=DEFAULT_SLOTS):
+        self.ring = None
+        self.last_seq = 0
+        self.process = subprocess.Popen([
+            sys.executable, os.path.abspath(__file__), str(source),
+            '--width', str(width), '--height', str(height), '--fps', str(fps),
+        ], stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+
+        # The child reports the resolution it opened at; slots are sized from that, not the request
+        opened = _read_line(self.process.stdout, self.OPEN_TIMEOUT_SECONDS).split()
+        if len(opened) != 2:
+            print(f"Capture process failed to open video source at {source}")
+            self._stop_process()
+            return
+        opened_width, opened_height = int(opened[0]), int(opened[1])
+        self.ring = SharedFrameRing.create(opened_width, opened_height, slots=slots)
+        try:
+            self.process.stdin.write(self.ring.name + '\n')
+            self.process.stdin.flush()
+        except OSError:
+            pass  # the child already exited; isOpened() reports it
+        self._wait_for_open()
+
+    def _wait_for_open(self):
+        deadline = time.monotonic() + self.OPEN_TIMEOUT_SECONDS
+        while self.ring.state == STATE_OPENING and self.process.poll() is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def isOpened(self):
+        return self.ring is not None and self.ring.state == STATE_OPEN and self.process.poll() is None
+
+    def read(self):
+        """Returns (ok, frame) like cv2.VideoCapture.read(). The frame is copied out of the ring,
+        so the detection loop can hold it through inference while the capture process writes on."""
+        if not self.isOpened():
+            return False, None
+        frame = self.ring.read_copy(self.last_seq, timeout=1.0)
+        if frame is None:
+            return False, None
+        self.last_seq = frame[0]
+        return True, frame[2]
+
+    def set(self, prop, value):
+        return True  # properties are applied by the capture process
+
+    def get(self, prop):
+        import cv2
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.ring.width)
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.ring.height)
+        return 0.0
+
+    def _stop_process(self):
+        try:
+            self.process.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+    def release(self):
+        if self.ring is None:
+            return
+        self.ring.state = STATE_STOPPED
+        self._stop_process()
+        self.ring.close()
+        self.ring = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Capture process feeding a shared-memory frame ring.")
+    parser.add_argument('source', help='Camera index, video file or stream URL')
+    parser.add_argument('--width', type=int, default=640, help='Requested width; the camera may deliver another')
+    parser.add_argument('--height', type=int, default=480, help='Requested height')
+    parser.add_argument('--fps', type=int, default=30)
+    args = parser.parse_args()
+
+    cap, first_frame = open_capture(args.source, args.width, args.height, args.fps)
+    if cap is None:
+        return 1  # the parent reports the failure when the handshake line does not arrive
+    height, width = first_frame.shape[:2]
+    print(f"{width} {height}", flush=True)
+    sys.stdout = sys.stderr  # nobody reads the pipe after the handshake
+    ring_name = sys.stdin.readline().strip()
+    if not ring_name:
+        cap.release()
+        return 1
+
+    ring = SharedFrameRing.attach(ring_name)
+    ring.header[WRITER_PID] = os.getpid()
+    try:
+        return run_capture(ring, cap, first_frame)
+    finally:
+        ring.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -554,6 +554,7 @@ function setupAdminAlertsPage() {
                         <span class="alert-time">${timestamp}</span>
                         <p><strong>Camera:</strong> ${alert.camera}</p>
                         <p><strong>Detections:</strong> ${alert.detections.join(', ')}</p>
+                        ${alert.identities && alert.identities.length ? `<p><strong>Identified:</strong> ${alert.identities.join(', ')}</p>` : ''}
                         <p><strong>Threat Level:</strong> <span class="threat-level-indicator level-${alert.threatLevel.toLowerCase()}">${alert.threatLevel}</span></p>
                         <p><strong>Status:</strong> <span class="status-badge status-${alert.status}">${alert.status.charAt(0).toUpperCase() + alert.status.slice(1)}</span></p>
                     </div>
@@ -669,6 +670,7 @@ function setupPersonnelAlertsPage() {
                             <span class="alert-time">${timestamp}</span>
                             <p><strong>Camera:</strong> ${alert.camera}</p>
                             <p><strong>Detections:</strong> ${alert.detections.join(', ')}</p>
+                            ${alert.identities && alert.identities.length ? `<p><strong>Identified:</strong> ${alert.identities.join(', ')}</p>` : ''}
                             <p><strong>Threat Level:</strong> <span class="threat-level-indicator level-${alert.threatLevel.toLowerCase()}">${alert.threatLevel}</span></p>
                             <p><strong>Status:</strong> <span class="status-badge status-${alert.status}">${alert.status.charAt(0).toUpperCase() + alert.status.slice(1)}</span></p>
                         </div>
@@ -0,0 +1,181 @@
+import time
+import threading
+import numpy as np
+
+# --- Threat Rule Defaults ---
+THREAT_LEVELS = ('Low', 'Medium', 'High')
+DEFAULT_MONITORED_OBJECTS = ['knife', 'gun', 'other_coverings']
+
+# The threat config page speaks in everyday object names; map them onto the model's classes.
+CLASS_ALIASES = {
+    'knife': ['weapon'],
+    'gun': ['weapon'],
+    'weapons': ['weapon'],
+    'nomask': ['no_mask'],
+    'medical_mask': ['mask'],
+}
+
+# Per-class rule defaults. Anything not listed falls back to DEFAULT_RULE.
+DEFAULT_CLASS_RULES = {
+    'weapon': {'threat_level': 'High'},
+    'other_coverings': {'threat_level': 'High'},
+    'no_mask': {'threat_level': 'Low'},
+    'mask': {'threat_level': 'Low'},
+}
+DEFAULT_RULE = {
+    'threat_level': 'Low',
+    'min_confidence': 0.25,  # matches the ultralytics prediction default
+    'min_box_area': 0,       # pixels
+    'dwell_seconds': 0.0,    # how long the class must stay in view before it counts
+}
+
+# A raised threat level makes the detector more sensitive: confidence thresholds are scaled down.
+LEVEL_CONFIDENCE_SCALE = {'Low': 1.0, 'Medium': 0.9, 'High': 0.8}
+
+
+def resolve_class_names(object_names, model_names):
+    """Maps config object names (and their aliases) to model class names, dropping unknown ones.
+    Unknown names are reported only against a loaded model; with no classes yet nothing can match."""
+    known = set(model_names.values())
+    resolved = []
+    for name in object_names:
+        for class_name in CLASS_ALIASES.get(name, [name]):
+            if class_name in known and class_name not in resolved:
+                resolved.append(class_name)
+            elif class_name not in known and known:
+                print(f"Threat rules: '{name}' does not match any model class, ignoring it.")
+    return resolved
+
+
+class CompiledThreatRules:
+    """Threat config compiled into per-class-ID lookup arrays and bitmasks."""
+    def __init__(self, config, model_names):
+        config = config or {}
+        num_classes = max(model_names) + 1 if model_names else 0
+        self.model_names = dict(model_names)
+        # The admin's sensitivity; the config's threat_level/level keys hold the live detected level
+        self.configured_level = config.get('sensitivity') or 'Low'
+        if self.configured_level not in THREAT_LEVELS:
+            self.configured_level = 'Low'
+        confidence_scale = LEVEL_CONFIDENCE_SCALE[self.configured_level]
+
+        self.min_confidence = np.full(num_classes, DEFAULT_RULE['min_confidence'], dtype=np.float32)
+        self.min_box_area = np.full(num_classes, DEFAULT_RULE['min_box_area'], dtype=np.float32)
+        self.dwell_seconds = np.full(num_classes, DEFAULT_RULE['dwell_seconds'], dtype=np.float64)
+        self.level_index = np.zeros(num_classes, dtype=np.int8)
+
+        # Config rules are keyed by class name or alias and override the defaults
+        overrides = {}
+        for key, rule in (config.get('rules') or {}).items():
+            for class_name in resolve_class_names([key], model_names):
+                overrides.setdefault(class_name, {}).update(rule)
+
+        for class_id, class_name in model_names.items():
+            rule = dict(DEFAULT_RULE)
+            rule.update(DEFAULT_CLASS_RULES.get(class_name, {}))
+            rule.update(overrides.get(class_name, {}))
+            self.min_confidence[class_id] = float(rule['min_confidence']) * confidence_scale
+            self.min_box_area[class_id] = float(rule['min_box_area'])
+            self.dwell_seconds[class_id] = float(rule['dwell_seconds'])
+            level = rule['threat_level'] if rule['threat_level'] in THREAT_LEVELS else 'Low'
+            self.level_index[class_id] = THREAT_LEVELS.index(level)
+
+        monitored = config.get('monitored_objects', DEFAULT_MONITORED_OBJECTS)
+        self.monitored_names = resolve_class_names(monitored, model_names)
+        name_to_id = {name: class_id for class_id, name in model_names.items()}
+        self.monitored_mask = 0
+        for class_name in self.monitored_names:
+            self.monitored_mask |= 1 << name_to_id[class_name]
+        self.num_classes = num_classes
+
+    def names_for_mask(self, mask):
+        return [self.model_names[i] for i in range(self.num_classes) if mask >> i & 1]
+
+    def threat_level_for(self, class_name):
+        for class_id, name in self.model_names.items():
+            if name == class_name:
+                return THREAT_LEVELS[self.level_index[class_id]]
+        return 'Low'
+
+
+class ThreatEvaluation:
+    """Outcome of evaluating one frame's detections against the compiled rules."""
+    def __init__(self, threat_level, qualifying, alert_mask, alert_classes, alert_confidences):
+        self.threat_level = threat_level
+        self.qualifying = qualifying                # bool per detection: passed confidence and box-area rules
+        self.alert_mask = alert_mask                # bitmask of monitored class IDs that satisfied every rule
+        self.alert_classes = alert_classes          # class names behind alert_mask
+        self.alert_confidences = alert_confidences  # class name -> best confidence this frame
+
+    def alerting(self, cls):
+        """Bool per detection: it passed the rules and its class is one alerting this frame."""
+        cls = np.asarray(cls, dtype=np.int64)
+        return self.qualifying & (np.right_shift(self.alert_mask, cls) & 1).astype(bool)
+
+
+class ThreatRulesEngine:
+    """Evaluates detections against the threat config; the compiled rules can be swapped at runtime."""
+    def __init__(self, model_names=None, config=None):
+        self._lock = threading.Lock()
+        self._model_names = dict(model_names or {})
+        self._config = config
+        self._rules = CompiledThreatRules(config, self._model_names)
+        self._first_seen = {}  # camera_id -> per-class timestamp a class was first continuously seen
+
+    @property
+    def rules(self):
+        return self._rules
+
+    def reload(self, config):
+        """Recompiles the rules from a threat config document. Takes effect on the next frame."""
+        with self._lock:
+            self._config = config
+            self._rules = CompiledThreatRules(config, self._model_names)
+            self._first_seen.clear()
+            rules = self._rules
+        print(f"Threat rules reloaded: monitoring {rules.monitored_names} at {rules.configured_level} sensitivity")
+
+    def set_model_names(self, model_names):
+        """Recompiles the current config against a model that finished loading after startup."""
+        with self._lock:
+            self._model_names = dict(model_names)
+            self._rules = CompiledThreatRules(self._config, self._model_names)
+            self._first_seen.clear()
+
+    def evaluate(self, camera_id, cls, conf, xyxy, now=None):
+        """Vectorized rule evaluation over one frame's detection arrays (cls, conf, xyxy)."""
+        rules = self._rules
+        now = time.time() if now is None else now
+        cls = np.asarray(cls, dtype=np.int64)
+
+        if cls.size:
+            area = (xyxy[:, 2] - xyxy[:, 0]) * (xyxy[:, 3] - xyxy[:, 1])
+            qualifying = (conf >= rules.min_confidence[cls]) & (area >= rules.min_box_area[cls])
+        else:
+            qualifying = np.zeros(0, dtype=bool)
+
+        present = np.zeros(rules.num_classes, dtype=bool)
+        present[cls[qualifying]] = True
+        best_confidence = np.zeros(rules.num_classes, dtype=np.float32)
+        np.maximum.at(best_confidence, cls[qualifying], np.asarray(conf)[qualifying])
+
+        # Dwell time: remember when each class was first seen, reset as soon as it disappears
+        with self._lock:
+            first_seen = self._first_seen.get(camera_id)
+            if first_seen is None or first_seen.shape[0] != rules.num_classes:
+                first_seen = np.full(rules.num_classes, np.nan)
+            first_seen = np.where(present, np.where(np.isnan(first_seen), now, first_seen), np.nan)
+            self._first_seen[camera_id] = first_seen
+        confirmed = present & (now - np.nan_to_num(first_seen, nan=now) >= rules.dwell_seconds)
+
+        confirmed_ids = np.flatnonzero(confirmed)
+        level = int(rules.level_index[confirmed_ids].max()) if confirmed_ids.size else 0
+        confirmed_mask = int(np.bitwise_or.reduce(np.left_shift(1, confirmed_ids), initial=0))
+        alert_mask = confirmed_mask & rules.monitored_mask
+
+        alert_classes = rules.names_for_mask(alert_mask)
+        alert_confidences = {
+            rules.model_names[class_id]: float(best_confidence[class_id])
+            for class_id in confirmed_ids.tolist() if alert_mask >> class_id & 1
+        }
+        return ThreatEvaluation(THREAT_LEVELS[level], qualifying, alert_mask, alert_classes, alert_confidences)
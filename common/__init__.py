@@ -0,0 +1,2 @@
+# Modules shared by both Flask apps (cloud_mall_surveillance_system and FaceRecognitionSystem).
+# Each app puts the repository root on sys.path and imports them as common.<module>.
@@ -0,0 +1,95 @@
+import math
+import cv2
+import numpy as np
+
+# Cheap checks that run before the 128D descriptor, which is by far the slowest per-face step.
+# Tiny, blurred or strongly turned faces give unreliable distances that read as "Unknown", so
+# they are not described at all; frames keep coming (from the browser in FaceRecognitionSystem,
+# from the camera in the mall app), so such a face is simply retried on a later frame once it is
+# closer, sharper or facing the camera.
+#
+# The checks are ordered by cost: box size is free, blur needs a small crop, and yaw needs the
+# 68 landmarks (which the descriptor needs anyway, so a face passing the gate pays nothing extra).
+
+# 68-point landmark indices (iBUG layout used by shape_predictor_68_face_landmarks)
+JAW_LEFT, JAW_RIGHT, NOSE_TIP = 0, 16, 30
+
+BLUR_SAMPLE_SIZE = 96  # faces are scaled to this size so the blur score does not depend on face size
+
+
+class QualityGate:
+    """Decides per face whether the descriptor is worth computing, and counts what it skipped."""
+    def __init__(self, min_face_size=60, min_sharpness=40.0, max_yaw_degrees=35.0, enabled=True):
+        self.min_face_size = min_face_size
+        self.min_sharpness = min_sharpness
+        self.max_yaw_degrees = max_yaw_degrees
+        self.enabled = enabled
+        self.checked = 0
+        self.skipped = {'small': 0, 'blurred': 0, 'turned': 0}
+
+    def check_box(self, gray_image, face_rect):
+        """Size and blur checks, before landmarks. Returns (reason or None, sharpness)."""
+        self.checked += 1
+        if not self.enabled:
+            return None, None
+        width, height = face_rect.right() - face_rect.left(), face_rect.bottom() - face_rect.top()
+        if min(width, height) < self.min_face_size:
+            return self._skip('small'), None
+
+        sharpness = laplacian_sharpness(gray_image, face_rect)
+        if sharpness is not None and sharpness < self.min_sharpness:
+            return self._skip('blurred'), sharpness
+        return None, sharpness
+
+    def check_pose(self, shape):
+        """Yaw check on the landmarks, before the descriptor. Returns (reason or None, yaw in degrees)."""
+        if not self.enabled:
+            return None, None
+        yaw = estimate_yaw(shape)
+        if abs(yaw) > self.max_yaw_degrees:
+            return self._skip('turned'), yaw
+        return None, yaw
+
+    def _skip(self, reason):
+        self.skipped[reason] += 1
+        return reason
+
+    def stats(self):
+        saved = sum(self.skipped.values())
+        return {
+            'enabled': self.enabled,
+            'faces_checked': self.checked,
+            'descriptors_saved': saved,
+            'saved_fraction': round(saved / self.checked, 3) if self.checked else 0.0,
+            'skipped': dict(self.skipped),
+            'thresholds': {
+                'min_face_size': self.min_face_size,
+                'min_sharpness': self.min_sharpness,
+                'max_yaw_degrees': self.max_yaw_degrees,
+            },
+        }
+
+
+def laplacian_sharpness(gray_image, face_rect):
+    """Variance of the Laplacian over the face, scaled to BLUR_SAMPLE_SIZE; None if the box is off-image."""
+    image_h, image_w = gray_image.shape[:2]
+    x1, y1 = max(face_rect.left(), 0), max(face_rect.top(), 0)
+    x2, y2 = min(face_rect.right(), image_w), min(face_rect.bottom(), image_h)
+    if x2 - x1 < 8 or y2 - y1 < 8:
+        return None
+    crop = cv2.resize(gray_image[y1:y2, x1:x2], (BLUR_SAMPLE_SIZE, BLUR_SAMPLE_SIZE), interpolation=cv2.INTER_AREA)
+    return float(cv2.Laplacian(crop, cv2.CV_64F).var())
+
+
+def estimate_yaw(shape):
+    """Approximate head yaw in degrees from where the nose tip sits between the jaw edges.
+
+    Facing the camera the nose is midway (ratio 0.5); turning moves it towards one edge. The
+    ratio maps to an angle through asin, which is rough but monotonic, enough for a threshold.
+    """
+    left, right, nose = shape.part(JAW_LEFT).x, shape.part(JAW_RIGHT).x, shape.part(NOSE_TIP).x
+    span = right - left
+    if span <= 0:
+        return 90.0
+    ratio = (nose - left) / span
+    return math.degrees(math.asin(float(np.clip(2 * ratio - 1, -1, 1))))
@@ -0,0 +1,128 @@
+import sys
+import time
+import heapq
+import itertools
+import threading
+from collections import Counter
+
+
+class FrameTrace:
+    """Stage timings of one traced frame or request."""
+    def __init__(self, label):
+        self.label = label
+        self.started_at = time.time()
+        self.spans = []  # [(stage, seconds)] in execution order
+        self.total = 0.0
+
+    def span(self, stage, seconds):
+        self.spans.append((stage, seconds))
+
+    def to_dict(self):
+        return {
+            'label': self.label,
+            'started_at': self.started_at,
+            'total_ms': round(self.total * 1000, 3),
+            'spans': [{'stage': stage, 'ms': round(seconds * 1000, 3)} for stage, seconds in self.spans],
+        }
+
+
+class SlowFrameTracker:
+    """Opt-in per-frame tracing that keeps the slowest `capacity` traces with their stage breakdown.
+
+    While disabled, begin() returns None and callers skip all span bookkeeping. The slowest
+    traces live in a min-heap, so keeping them costs O(log capacity) per finished frame.
+    """
+    def __init__(self, capacity=50, enabled=False):
+        self.capacity = capacity
+        self.enabled = enabled
+        self.traced = 0
+        self._heap = []
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+
+    def begin(self, label):
+        return FrameTrace(label) if self.enabled else None
+
+    def finish(self, trace, total_seconds):
+        if trace is None:
+            return
+        trace.total = total_seconds
+        entry = (total_seconds, next(self._sequence), trace)
+        with self._lock:
+            self.traced += 1
+            if len(self._heap) < self.capacity:
+                heapq.heappush(self._heap, entry)
+            elif total_seconds > self._heap[0][0]:
+                heapq.heapreplace(self._heap, entry)
+
+    def slowest(self):
+        with self._lock:
+            entries = sorted(self._heap, reverse=True)
+        return [trace.to_dict() for _, _, trace in entries]
+
+    def configure(self, enabled=None, capacity=None):
+        with self._lock:
+            if enabled is not None:
+                self.enabled = enabled
+            if capacity is not None and capacity != self.capacity:
+                self.capacity = capacity
+                self._heap = heapq.nlargest(capacity, self._heap)
+                heapq.heapify(self._heap)
+
+    def clear(self):
+        with self._lock:
+            self._heap = []
+            self.traced = 0
+
+    def stats(self):
+        with self._lock:
+            return {'enabled': self.enabled, 'capacity': self.capacity, 'traced': self.traced, 'kept': len(self._heap)}
+
+
+class SamplingProfiler:
+    """Samples every thread's Python stack at a fixed interval for a limited time.
+
+    The result is in the collapsed-stack format ('thread;outer;...;inner count' per line) read by
+    flamegraph.pl, speedscope and similar tools. Only one profile runs at a time.
+    """
+    MAX_SECONDS = 120
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _frame_name(frame):
+        # One flame graph node per function: keyed on where it is defined, not the line running now
+        code = frame.f_code
+        return f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})"
+
+    def profile(self, seconds, interval=0.005):
+        """Blocks for `seconds` while sampling; returns (collapsed stack text, sample count), or None if busy."""
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            seconds = min(max(seconds, 0.1), self.MAX_SECONDS)
+            own_thread = threading.get_ident()
+            stacks = Counter()
+            samples = 0
+            deadline = time.perf_counter() + seconds
+            while time.perf_counter() < deadline:
+                thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own_thread:
+                        continue
+                    names = []
+                    while frame is not None:
+                        names.append(self._frame_name(frame))
+                        frame = frame.f_back
+                    names.append(thread_names.get(thread_id, f"thread-{thread_id}"))
+                    stacks[';'.join(reversed(names))] += 1
+                samples += 1
+                time.sleep(interval)
+            collapsed = '\n'.join(f"{stack} {count}" for stack, count in stacks.most_common())
+            return collapsed + '\n', samples
+        finally:
+            self._lock.release()
+
+    def busy(self):
+        return self._lock.locked()
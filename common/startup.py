@@ -0,0 +1,70 @@
+import time
+import threading
+
+
+class StartupTasks:
+    """Runs slow initialization steps in background threads and tracks readiness per component.
+
+    The HTTP server can accept requests as soon as the module is imported: liveness only means
+    the process is up, while ready() turns true once every required task has succeeded.
+    """
+    def __init__(self):
+        self.started_at = time.time()
+        self._tasks = {}  # name -> task state dict
+        self._lock = threading.Lock()
+
+    def add(self, name, fn, required=True):
+        """Starts fn() in its own thread and tracks it as component `name`."""
+        task = {'state': 'loading', 'required': required, 'seconds': None, 'error': None, 'done': threading.Event()}
+        with self._lock:
+            self._tasks[name] = task
+        threading.Thread(target=self._run, args=(name, fn, task), name=f"startup-{name}", daemon=True).start()
+
+    def skip(self, name, reason):
+        """Records a component this process does not load, so status() explains its absence."""
+        done = threading.Event()
+        done.set()
+        with self._lock:
+            self._tasks[name] = {'state': 'skipped', 'required': False, 'seconds': 0, 'error': reason, 'done': done}
+
+    def _run(self, name, fn, task):
+        start = time.perf_counter()
+        try:
+            fn()
+            task['state'] = 'ready'
+        except Exception as e:
+            task['state'] = 'failed'
+            task['error'] = str(e)
+            print(f"Startup task '{name}' failed: {e}")
+        task['seconds'] = round(time.perf_counter() - start, 3)
+        task['done'].set()
+        print(f"Startup task '{name}' {task['state']} after {task['seconds']}s")
+
+    def wait(self, name, timeout=None):
+        """Blocks until component `name` has finished loading; returns whether it is ready."""
+        task = self._tasks.get(name)
+        if task is None:
+            return False
+        task['done'].wait(timeout)
+        return task['state'] == 'ready'
+
+    def is_ready(self, name):
+        task = self._tasks.get(name)
+        return task is not None and task['state'] == 'ready'
+
+    def ready(self):
+        with self._lock:
+            tasks = list(self._tasks.values())
+        return all(task['state'] == 'ready' for task in tasks if task['required'])
+
+    def status(self):
+        with self._lock:
+            tasks = dict(self._tasks)
+        return {
+            'ready': self.ready(),
+            'uptime_seconds': round(time.time() - self.started_at, 1),
+            'components': {
+                name: {key: value for key, value in task.items() if key != 'done'}
+                for name, task in tasks.items()
+            },
+        }